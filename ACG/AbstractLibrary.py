@@ -0,0 +1,249 @@
+"""
+The AbstractLibrary module stores the pins, obstructions and boundaries of every cell in a library in a compact form
+that is shared by all LayoutAbstract masters. Rectangles of the whole library are kept in a single integer coordinate
+array (in units of the grid resolution), and each cell only stores slices into that array.
+
+The parsed library is cached on disk under ACG_CACHE_DIR: the coordinate array is saved as a .npy file that is memory
+mapped when it is loaded again, and the index of cells/pins/layers is saved as JSON.
+"""
+import os
+import array
+import hashlib
+import yaml
+import numpy as np
+from typing import Dict, Optional, List, Tuple, Union, Iterable
+
+from ACG import cache
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+
+class CellAbstract:
+    """
+    Pin, obstruction and boundary information of a single cell. All rectangle arrays have shape (n, 4) and contain
+    [x0, y0, x1, y1] in units of the grid resolution
+    """
+    __slots__ = ('name', 'size', 'pins', 'obs', 'res')
+
+    def __init__(self,
+                 name: str,
+                 size: Optional[np.ndarray],
+                 pins: Dict[str, Dict[str, np.ndarray]],
+                 obs: Dict[str, np.ndarray],
+                 res: float = .001
+                 ):
+        self.name = name
+        self.size = size
+        self.pins = pins
+        self.obs = obs
+        self.res = res
+
+    def __repr__(self):
+        return 'CellAbstract(name={}, pins={})'.format(self.name, list(self.pins))
+
+    @property
+    def size_xy(self) -> Optional[List[List[float]]]:
+        """ Returns the boundary of the cell as [[x0, y0], [x1, y1]] """
+        if self.size is None:
+            return None
+        x0, y0, x1, y1 = self.to_xy(self.size.reshape(1, 4))[0]
+        return [[x0, y0], [x1, y1]]
+
+    def to_xy(self, rects: np.ndarray) -> List[Tuple[float, float, float, float]]:
+        """ Converts an (n, 4) array in resolution units to a list of (x0, y0, x1, y1) coordinates """
+        return [tuple(round(val * self.res, 3) for val in row) for row in rects.tolist()]
+
+
+class AbstractLibrary:
+    """
+    Stores all cell abstracts of a library. Libraries are shared by every master in the process, so each library is
+    only parsed once until its source is modified
+    """
+    res = .001
+    # (kind, path) -> (modification time of path, library)
+    _libraries: Dict[Tuple[str, str], Tuple[float, 'AbstractLibrary']] = {}
+
+    def __init__(self, coords: np.ndarray, index: dict, res: float = .001):
+        """
+        Parameters
+        ----------
+        coords : np.ndarray
+            (n, 4) integer array with the rectangles of all cells
+        index : dict
+            maps each cell name to {'size': [start, stop] or None, 'pins': {pin: {layer: [start, stop]}},
+            'obs': {layer: [start, stop]}}, where [start, stop] are row slices into coords
+        res : float
+            grid resolution of the coordinates
+        """
+        self.coords = coords
+        self.index = index
+        self.res = res
+        self._cells: Dict[str, CellAbstract] = {}
+
+    def __contains__(self, cellname: str) -> bool:
+        return cellname in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, cellname: str) -> CellAbstract:
+        """ Returns the abstract of the provided cell. Pin arrays are views into the library coordinate array """
+        try:
+            return self._cells[cellname]
+        except KeyError:
+            pass
+        entry = self.index[cellname]
+        size = None if entry['size'] is None else self.coords[entry['size'][0]]
+        pins = {pin: {layer: self.coords[start:stop] for layer, (start, stop) in layers.items()}
+                for pin, layers in entry['pins'].items()}
+        obs = {layer: self.coords[start:stop] for layer, (start, stop) in entry['obs'].items()}
+        cell = CellAbstract(cellname, size=size, pins=pins, obs=obs, res=self.res)
+        self._cells[cellname] = cell
+        return cell
+
+    @property
+    def cell_names(self) -> List[str]:
+        return list(self.index)
+
+    @classmethod
+    def from_cells(cls,
+                   cells: Union[Dict[str, dict], Iterable[Tuple[str, dict]]],
+                   res: float = .001
+                   ) -> 'AbstractLibrary':
+        """
+        Builds a library from parsed cell descriptions. Each description may contain 'size' ([[x0, y0], [x1, y1]]),
+        'pins' ({pin: {layer: [xy, ...]}}) and 'obs' ({layer: [xy, ...]}) in microns. Layer names are upper-cased.
+        cells may also be an iterator of (cellname, description) pairs, so that descriptions can be streamed from a
+        parser without holding all of them in memory
+        """
+        rows = array.array('i')  # Flat x0, y0, x1, y1 coordinates of every rectangle
+        index = {}
+
+        def add_rects(rect_list) -> List[int]:
+            start = len(rows) // 4
+            for (x0, y0), (x1, y1) in rect_list:
+                rows.extend((round(min(x0, x1) / res), round(min(y0, y1) / res),
+                             round(max(x0, x1) / res), round(max(y0, y1) / res)))
+            return [start, len(rows) // 4]
+
+        if isinstance(cells, dict):
+            cells = cells.items()
+        for cellname, cell in cells:
+            entry = {'size': None, 'pins': {}, 'obs': {}}
+            if cell.get('size') is not None:
+                entry['size'] = add_rects([cell['size']])
+            for pin, layers in (cell.get('pins') or {}).items():
+                entry['pins'][pin] = {layer.upper(): add_rects(rects) for layer, rects in layers.items()}
+            for layer, rects in (cell.get('obs') or {}).items():
+                entry['obs'][layer.upper()] = add_rects(rects)
+            index[cellname] = entry
+
+        coords = np.frombuffer(rows, dtype=np.int32).reshape(-1, 4)
+        return cls(coords, index, res=res)
+
+    @classmethod
+    def from_yaml_root(cls, yaml_root: str, libname: str) -> 'AbstractLibrary':
+        """
+        Returns the shared library built from all <yaml_root>/<libname>/<cell>.yaml files. The library is parsed
+        again when the modification time of the library directory changes, i.e. when cell files are added, removed
+        or replaced, and loaded from the on-disk cache if none of the yaml files changed
+
+        Parameters
+        ----------
+        yaml_root : str
+            root directory containing one directory of cell yaml files per library
+        libname : str
+            name of the library to load
+        """
+        lib_dir = os.path.abspath(os.path.join(yaml_root, libname))
+        key, mtime = ('yaml', lib_dir), os.path.getmtime(lib_dir)
+        shared = cls._libraries.get(key)
+        if shared is not None and shared[0] == mtime:
+            return shared[1]
+
+        file_names = sorted(name for name in os.listdir(lib_dir) if name.endswith('.yaml'))
+        stamps = [(name, os.path.getmtime(os.path.join(lib_dir, name))) for name in file_names]
+        cache_name = cache.hash_key(lib_dir, stamps, cls.res)
+        lib = cls.load(cache_name)
+        if lib is None:
+            cells = {}
+            for name in file_names:
+                with open(os.path.join(lib_dir, name), 'r') as f:
+                    cells[name[:-len('.yaml')]] = yaml.load(f, Loader=YamlLoader) or {}
+            lib = cls.from_cells(cells, res=cls.res)
+            lib.save(cache_name)
+        cls._libraries[key] = (mtime, lib)
+        return lib
+
+    @classmethod
+    def from_lef(cls, lef_file: str) -> 'AbstractLibrary':
+        """
+        Returns the shared library containing every MACRO of a LEF file. The file is parsed in a single streaming pass
+        when it is first used or modified, and the result is cached on disk by the hash of the file content
+
+        Parameters
+        ----------
+        lef_file : str
+            path to the LEF file
+        """
+        # Import here to avoid a circular import, LefParse builds on this module
+        from ACG.LefParse import LefParser
+
+        lef_file = os.path.abspath(lef_file)
+        key, mtime = ('lef', lef_file), os.path.getmtime(lef_file)
+        shared = cls._libraries.get(key)
+        if shared is not None and shared[0] == mtime:
+            return shared[1]
+
+        digest = hashlib.sha1()
+        with open(lef_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        cache_name = cache.hash_key('lef', digest.hexdigest(), cls.res)
+        lib = cls.load(cache_name)
+        if lib is None:
+            lib = cls.from_cells(LefParser(lef_file).iter_macros(), res=cls.res)
+            lib.save(cache_name)
+        cls._libraries[key] = (mtime, lib)
+        return lib
+
+    @staticmethod
+    def _cache_paths(cache_name: str) -> Optional[Tuple[str, str]]:
+        try:
+            cache_dir = cache.get_cache_dir('abstracts')
+        except OSError:
+            return None
+        base = os.path.join(cache_dir, cache_name)
+        return base + '.npy', base + '.json'
+
+    @classmethod
+    def load(cls, cache_name: str) -> Optional['AbstractLibrary']:
+        """ Loads a library from the on-disk cache, memory mapping its coordinates. Returns None on a cache miss """
+        paths = cls._cache_paths(cache_name)
+        if paths is None:
+            return None
+        content = cache.read_json(paths[1])
+        if content is None:
+            return None
+        try:
+            coords = np.load(paths[0], mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        return cls(coords, content['index'], res=content['res'])
+
+    def save(self, cache_name: str) -> None:
+        """ Saves the library to the on-disk cache. Failures are ignored since the cache is only an optimization """
+        paths = self._cache_paths(cache_name)
+        if paths is None:
+            return
+        try:
+            # Write the coordinates before the index, since readers treat the index as the commit marker
+            tmp_path = paths[0] + '.{}.tmp.npy'.format(os.getpid())
+            np.save(tmp_path, self.coords)
+            os.replace(tmp_path, paths[0])
+            cache.write_json(paths[1], {'res': self.res, 'index': self.index})
+        except (OSError, ValueError):
+            pass
@@ -1,10 +1,27 @@
 import os
+import time
+import hashlib
 import importlib
-from bag.io import read_yaml
-from bag.layout.routing import RoutingGrid
-from bag.layout.template import TemplateDB
-# TB imports
-from bag.data import load_sim_results, save_sim_results, load_sim_file
+import functools
+import json
+import yaml
+# ACG imports
+from ACG import Backend
+from ACG import cache
+from ACG.LayoutStats import LayoutStats
+from ACG.JobRunner import JobResult, run_jobs, run_blocking
+from ACG.CadenceImport import CadenceLayoutImporter
+from ACG.SimData import LazySimResults
+from ACG.Sweep import ParamSweep, chunked
+from ACG.Manifest import GenerationManifest, cell_digest, master_modules, module_digests
+if Backend.backend_name == 'bag':
+    from bag.io import read_yaml
+    from bag.layout.routing import RoutingGrid
+    from bag.layout.template import TemplateDB
+    # TB imports
+    from bag.data import load_sim_results, save_sim_results, load_sim_file
+else:
+    from ACG.SimData import load_sim_file
 
 
 class AyarDesignManager:
@@ -18,7 +35,15 @@ class AyarDesignManager:
         self.tdb = None  # templateDB instance for layout creation
         self.impl_lib = None  # Virtuoso library where generated cells are stored
         self.cell_name_list = None  # list of names for each created cell
-        self.specs = read_yaml(spec_file)
+        self.layout_stats = {}  # LayoutStats of each generated cell, keyed by cell name
+        self.batch_stats = LayoutStats(name='batch_layout')  # Time spent writing cells in batch_layout
+        self.sim_results = {}  # JobResult of every simulation job run by simulate
+        self._manifest = None  # GenerationManifest of impl_lib, created on first use
+        if Backend.backend_name == 'bag':
+            self.specs = read_yaml(spec_file)
+        else:
+            with open(spec_file, 'r') as f:
+                self.specs = yaml.load(f, Loader=yaml.FullLoader)
 
         # Initialize self.tdb with appropriate templateDB instance
         self.make_tdb(gds_layermap)
@@ -33,16 +58,20 @@ class AyarDesignManager:
         """
         pass
 
-    def generate_layout(self, layout_params_list=None, cell_name_list=None):
+    def generate_layout(self, layout_params_list=None, cell_name_list=None, force=False):
         """
         Generates a batch of layouts with the layout package/class in the spec file with parameters set by
         layout_params_list and names them according to cell_name_list. Each dict in the layout_params_list creates a
-        new layout
+        new layout. With incremental generation, cells that still exist in impl_lib and whose generator sources,
+        parameters, tech file and ACG version did not change since they were last written are skipped, see
+        get_manifest
 
         layout_params_list : :obj:'list' of :obj:'dict'
             list of parameter dicts to be applied to the specified layout class
         cell_name_list : :obj:'list' of :obj:'str'
             list of names to be applied to each implementation of the layout class
+        force : bool
+            if True, regenerate every cell even if it is unchanged
         """
         # If no list is provided, extract parameters from the provided spec file
         if layout_params_list is None:
@@ -59,23 +88,95 @@ class AyarDesignManager:
             cell_name_list = [cell_name_list]
 
         print('Generating Layout')
-        cls_package = self.specs['layout_package']
-        cls_name = self.specs['layout_class']
-
-        lay_module = importlib.import_module(cls_package)
-        temp_cls = getattr(lay_module, cls_name)
+        temp_cls = self.get_layout_class()
+        dirty = self._get_dirty_cells('layout', temp_cls, zip(layout_params_list, cell_name_list), force=force)
+        if not dirty:
+            return
 
         temp_list = []
-        for lay_params in layout_params_list:
+        for lay_params, cell_name, _ in dirty:
             template = self.tdb.new_template(params=lay_params, temp_cls=temp_cls, debug=False)
             temp_list.append(template)
+            self.layout_stats[cell_name] = template.stats
 
-        self.tdb.batch_layout(self.prj, temp_list, cell_name_list)
+        with self.batch_stats.timer('batch_layout'):
+            self.tdb.batch_layout(self.prj, temp_list, [cell_name for _, cell_name, _ in dirty])
+        self._record_cells('layout', dirty, temp_list)
+
+    def generate_layout_sweep(self, sweep=None, cell_name_fmt=None, chunk_size=100, progress=True, force=False):
+        """
+        Generates one layout per point of a parameter sweep. Points are produced lazily, duplicates are skipped, and
+        cells are generated and written in chunks of chunk_size so that memory does not grow with the sweep size
 
-    def generate_schematic(self, sch_params_list=None, cell_name_list=None):
+        Parameters
+        ----------
+        sweep : ParamSweep or iterable of dict
+            sweep to be generated. If None, the 'layout_sweep' spec entry is applied to the layout params
+        cell_name_fmt : str
+            format of the cell names. It is formatted with idx, the index of the unique point, and the top level
+            parameters of the point, where idx takes precedence over a parameter of the same name. Defaults to
+            '<impl_cell>_{idx}'
+        chunk_size : int
+            number of layouts passed to each batch_layout call
+        progress : bool or callable
+            if True, print progress after each chunk. A callable is called with (num_done, num_total), where
+            num_total is None for sweeps of unknown size
+        force : bool
+            if True, regenerate every cell even if it is unchanged
+
+        Returns
+        -------
+        cell_names : list
+            names of all generated cells, in sweep order
+        """
+        if sweep is None:
+            base = self.specs['layout_params'] if 'layout_params' in self.specs else self.specs['dsn_params']
+            sweep = ParamSweep.from_spec(base, self.specs['layout_sweep'])
+        elif not isinstance(sweep, ParamSweep):
+            sweep = ParamSweep.from_iter(sweep)
+        if cell_name_fmt is None:
+            cell_name_fmt = self.specs['impl_cell'] + '_{idx}'
+
+        print('Generating Layout Sweep')
+        temp_cls = self.get_layout_class()
+        cell_names = []
+        start = time.perf_counter()
+        for chunk in chunked(enumerate(sweep), chunk_size):
+            points = [(lay_params, cell_name_fmt.format_map({**lay_params, 'idx': idx})) for idx, lay_params in chunk]
+            cell_names.extend(cell_name for _, cell_name in points)
+            dirty = self._get_dirty_cells('layout', temp_cls, points, force=force)
+            temp_list = []
+            for lay_params, cell_name, _ in dirty:
+                template = self.tdb.new_template(params=lay_params, temp_cls=temp_cls, debug=False)
+                temp_list.append(template)
+                self.layout_stats[cell_name] = template.stats
+            if temp_list:
+                with self.batch_stats.timer('batch_layout'):
+                    self.tdb.batch_layout(self.prj, temp_list, [cell_name for _, cell_name, _ in dirty])
+                self._record_cells('layout', dirty, temp_list)
+
+            # Drop the master cache and the written cells of the template db so that finished masters can be freed.
+            # Cell names stay reserved, so sub-masters of later chunks never overwrite cells that were already written
+            for cache_name in ('_master_lookup', 'cells'):
+                masters = getattr(self.tdb, cache_name, None)
+                if masters is not None:
+                    masters.clear()
+            del temp_list
+
+            if callable(progress):
+                progress(len(cell_names), sweep.num_points)
+            elif progress:
+                # Duplicates are only known once they are reached, so the number of points is an upper bound
+                total = '?' if sweep.num_points is None else sweep.num_points
+                elapsed = time.perf_counter() - start
+                print('{} layouts written of at most {} ({:.1f} layouts/s)'.format(
+                    len(cell_names), total, len(cell_names) / max(elapsed, 1e-9)))
+        return cell_names
+
+    def generate_schematic(self, sch_params_list=None, cell_name_list=None, force=False):
         """
         Generates a batch of schematics specified by sch_params_list and names them according to cell_name_list.
-        Each dict in the sch_params_list creates a new schematic
+        Each dict in the sch_params_list creates a new schematic. Unchanged cells are skipped like in generate_layout
 
         Parameters
         ----------
@@ -83,6 +184,8 @@ class AyarDesignManager:
             parameter dicts to be applied to the specified layout class
         cell_name_list : :obj:'list' of :obj:'str'
             list of names to be applied to each implementation of the layout class
+        force : bool
+            if True, regenerate every cell even if it is unchanged
         """
         # If no list is provided, extract parameters from the provided spec file
         if sch_params_list is None:
@@ -102,14 +205,24 @@ class AyarDesignManager:
         sch_temp_cell = self.specs['sch_temp_cell']
         impl_lib = self.specs['impl_lib']
 
-        inst_list, name_list = [], []
+        inst_list, name_list, dirty = [], [], []
         for sch_params, cur_name in zip(sch_params_list, cell_name_list):
             dsn = self.prj.create_design_module(sch_temp_lib, sch_temp_cell)
+            cell = self._get_dirty_cells('schematic', type(dsn), [(sch_params, cur_name)], force=force,
+                                         extra=(sch_temp_lib, sch_temp_cell), report=False)
+            if not cell:
+                continue
             dsn.design(**sch_params)
             inst_list.append(dsn)
             name_list.append(cur_name)
+            dirty.extend(cell)
+        if len(dirty) < len(cell_name_list):
+            print('Skipping {} unchanged schematics'.format(len(cell_name_list) - len(dirty)))
+        if not inst_list:
+            return
 
         self.prj.batch_schematic(impl_lib, inst_list, name_list=name_list)
+        self._record_cells('schematic', dirty, inst_list)
 
     def generate_tb(self, tb_params_list=None, tb_name_list=None):
         """
@@ -145,96 +258,205 @@ class AyarDesignManager:
             tb_dsn.design(dut_lib=impl_lib, dut_cell=impl_cell, **tb_sch_params)
             tb_dsn.implement_design(impl_lib, top_cell_name=name)
 
-    def simulate(self):
+    def simulate(self, max_concurrency=None, split_envs=None):
         """
-        Runs a batch of simulations on the generated TB's. All parameters for simulation are set within the spec file
+        Runs a batch of simulations on the generated TB's. All parameters for simulation are set within the spec file.
+        Testbenches are simulated concurrently, and the results of each one are written to HDF5 as soon as it
+        finishes. A failing testbench is reported in sim_results without stopping the others
+
+        Parameters
+        ----------
+        max_concurrency : int
+            maximum number of simulations running at the same time. Defaults to the 'sim_concurrency' spec entry, or
+            to 1 to run testbenches one after another
+        split_envs : bool
+            if True, every sim_env of a testbench is simulated on its own and saved to <tb>_<env>.hdf5. The sim_envs of
+            one testbench share its cell, so they run one after another, and only different testbenches run
+            concurrently. Defaults to the 'split_envs' entry of each testbench in the spec file
+
+        Returns
+        -------
+        results_dict : dict
+            simulation results of every successful testbench. With split_envs, the results of a testbench are a dict
+            keyed by sim_env
         """
         print('Running Simulation')
-        impl_lib = self.specs['impl_lib']
-        impl_cell = self.specs['impl_cell']
+        if max_concurrency is None:
+            max_concurrency = self.specs.get('sim_concurrency', 1)
 
-        results_dict = {}
+        jobs = {}
         for tb_impl_cell, info in self.specs['tb_params'].items():
-            tb_params = info['tb_sim_params']
-            view_name = info['view_name']
-            sim_envs = info['sim_envs']
-            data_dir = info['data_dir']
+            tb_split = info.get('split_envs', False) if split_envs is None else split_envs
+            if tb_split:
+                jobs[tb_impl_cell] = functools.partial(self._simulate_tb_envs, tb_impl_cell, info)
+            else:
+                fname = os.path.join(info['data_dir'], '%s.hdf5' % tb_impl_cell)
+                jobs[tb_impl_cell] = functools.partial(self._simulate_tb, tb_impl_cell, info, info['sim_envs'], fname)
 
-            # setup testbench ADEXL state
-            print('setting up %s' % tb_impl_cell)
-            tb = self.prj.configure_testbench(impl_lib, tb_impl_cell)
-            # set testbench parameters values
-            for key, val in tb_params.items():
-                tb.set_parameter(key, val)
-            # set config view, i.e. schematic vs extracted
-            tb.set_simulation_view(impl_lib, impl_cell, view_name)
-            # set process corners
-            tb.set_simulation_environments(sim_envs)
-            # commit changes to ADEXL state back to database
-            tb.update_testbench()
-            print('running simulation')
-            tb.run_simulation()
-            print('simulation done, load results')
-            results = load_sim_results(tb.save_dir)
-            save_sim_results(results, os.path.join(data_dir, '%s.hdf5' % tb_impl_cell))
-            results_dict[tb_impl_cell] = results
+        def report(result):
+            if result.ok:
+                print('simulation of {} done in {:.1f} s'.format(result.name, result.runtime))
+            else:
+                print('simulation of {} failed:\n{}'.format(result.name, result.error))
 
+        self.sim_results = run_jobs(jobs, max_concurrency=max_concurrency, on_done=report)
+
+        results_dict = {name: result.value for name, result in self.sim_results.items() if result.ok}
+        num_failed = sum(1 for result in self.sim_results.values() if not result.ok)
+        if num_failed:
+            print('{} of {} simulations failed'.format(num_failed, len(self.sim_results)))
         print('all simulation done')
         return results_dict
 
-    def run_LVS(self, cell_name_list=None):
+    async def _simulate_tb_envs(self, tb_impl_cell, info):
+        """
+        Simulates every sim_env of a testbench one after another, saving each to <tb>_<env>.hdf5. Setting up a
+        testbench overwrites the corners of its cell, so corners of the same testbench cannot run concurrently
         """
-        Runs LVS on a batch of cells contained within the implementation library
+        results = {}
+        for env in info['sim_envs']:
+            fname = os.path.join(info['data_dir'], '%s_%s.hdf5' % (tb_impl_cell, env))
+            results[env] = await self._simulate_tb(tb_impl_cell, info, [env], fname)
+        return results
+
+    async def _simulate_tb(self, tb_impl_cell, info, sim_envs, fname):
+        """ Configures a testbench, simulates it, then loads its results and saves them to fname """
+        impl_lib = self.specs['impl_lib']
+        impl_cell = self.specs['impl_cell']
+
+        # Testbench setup goes through the SKILL interface, which only runs on the event loop thread
+        print('setting up %s' % tb_impl_cell)
+        tb = self.prj.configure_testbench(impl_lib, tb_impl_cell)
+        # set testbench parameters values
+        for key, val in info['tb_sim_params'].items():
+            tb.set_parameter(key, val)
+        # set config view, i.e. schematic vs extracted
+        tb.set_simulation_view(impl_lib, impl_cell, info['view_name'])
+        # set process corners
+        tb.set_simulation_environments(sim_envs)
+        # commit changes to ADEXL state back to database
+        tb.update_testbench()
+
+        print('running simulation of {} for {}'.format(tb_impl_cell, sim_envs))
+        if hasattr(tb, 'async_run_simulation'):
+            await tb.async_run_simulation()
+        else:
+            await run_blocking(tb.run_simulation)
+
+        def save_results():
+            results = load_sim_results(tb.save_dir)
+            save_sim_results(results, fname)
+            return results
+
+        return await run_blocking(save_results)
+
+    def run_LVS(self, cell_name_list=None, max_concurrency=None, use_cache=True):
+        """
+        Runs LVS on a batch of cells contained within the implementation library. Cells are checked concurrently, and
+        cells whose layout and schematic did not change since a passing run are skipped
 
         Parameters
         ----------
         cell_name_list : :obj:'list' of :obj:'str'
             list of strings containing the names of the cells we should run LVS on
+        max_concurrency : int
+            maximum number of LVS jobs running at the same time. Defaults to the 'verify_concurrency' spec entry, or 1
+        use_cache : bool
+            if True, skip cells with a passing LVS result for the same layout and schematic content
+
+        Returns
+        -------
+        results : dict
+            JobResult of each cell, with status 'passed', 'failed', 'cached' or 'error'
         """
         if not cell_name_list:
             cell_name_list = [self.specs['impl_cell']]
 
-        for cell_name in cell_name_list:
-            print('Running LVS on {}'.format(cell_name))
-            lvs_passed, lvs_log = self.prj.run_lvs(self.impl_lib, cell_name)
-            if lvs_passed:
-                print('\n' + 'LVS Clean :)')
-            else:
-                print('\n' + 'LVS Incorrect :(')
-                print('LVS log path: {}'.format(lvs_log))
+        async def run_lvs(cell_name):
+            if hasattr(self.prj, 'async_run_lvs'):
+                return await self.prj.async_run_lvs(self.impl_lib, cell_name)
+            return await run_blocking(self.prj.run_lvs, self.impl_lib, cell_name)
+
+        return self._run_verification('LVS', run_lvs, cell_name_list, max_concurrency, use_cache)
 
-    def run_PEX(self, cell_name_list):
+    def run_PEX(self, cell_name_list, max_concurrency=None, use_cache=True):
         """
-        Runs PEX on a batch of cells contained within the implementation library
+        Runs PEX on a batch of cells contained within the implementation library. Cells are extracted concurrently,
+        and cells whose layout and schematic did not change since a passing run are skipped
 
         Parameters
         ----------
         cell_name_list : :obj:'list' of :obj:'str'
             list of strings containing the names of the cells we should run PEX on
+        max_concurrency : int
+            maximum number of PEX jobs running at the same time. Defaults to the 'verify_concurrency' spec entry, or 1
+        use_cache : bool
+            if True, skip cells with a passing PEX result for the same layout and schematic content
+
+        Returns
+        -------
+        results : dict
+            JobResult of each cell, with status 'passed', 'failed', 'cached' or 'error'
         """
-        for cell_name in cell_name_list:
-            print('Running PEX on {}'.format(cell_name))
-            pex_passed, pex_log = self.prj.run_rcx(self.impl_lib, cell_name, create_schematic=True)
-            if pex_passed:
-                print('\n' + 'PEX Passed :)')
-            else:
-                print('\n' + 'PEX Failed :(')
-                print('PEX log path: {}'.format(pex_log))
+        async def run_pex(cell_name):
+            if hasattr(self.prj, 'async_run_rcx'):
+                return await self.prj.async_run_rcx(self.impl_lib, cell_name, create_schematic=True)
+            return await run_blocking(functools.partial(self.prj.run_rcx, create_schematic=True),
+                                      self.impl_lib, cell_name)
+
+        return self._run_verification('PEX', run_pex, cell_name_list, max_concurrency, use_cache)
 
-    def load_sim_data(self):
+    def load_sim_data(self, lazy=False):
         """
         Returns simulation data for all TBs in spec file
+
+        Parameters
+        ----------
+        lazy : bool
+            if True, return a LazySimResults handle per TB instead of loading every file. Datasets are then only read
+            when they are sliced, and contiguous datasets are memory mapped
         """
         results_dict = {}
         for name, info in self.specs['tb_params'].items():
             data_dir = info['data_dir']
             fname = os.path.join(data_dir, '%s.hdf5' % name)
+            if lazy:
+                results_dict[name] = LazySimResults(fname)
+                continue
             print('loading simulation data for %s' % name)
             results_dict[name] = load_sim_file(fname)
 
         print('finish loading data')
         return results_dict
 
+    def get_layout_stats(self) -> dict:
+        """
+        Returns the layout statistics recorded for every generated cell, the time spent in batch_layout, and the
+        aggregate of all cells
+
+        Returns
+        -------
+        stats : dict
+            dict with 'cells' mapping each cell name to its stats, 'batch_layout' and 'total'
+        """
+        return {
+            'cells': {name: cell_stats.to_dict() for name, cell_stats in self.layout_stats.items()},
+            'batch_layout': self.batch_stats.to_dict(),
+            'total': LayoutStats.aggregate(self.layout_stats.values()).to_dict()
+        }
+
+    def dump_layout_stats(self, path):
+        """
+        Writes the layout statistics of all generated cells to a JSON file
+
+        Parameters
+        ----------
+        path : str
+            path of the JSON file to be written
+        """
+        with open(path, 'w') as f:
+            json.dump(self.get_layout_stats(), f, indent=2)
+
     def import_schematic_library(self, lib_name):
         """
         Imports a Cadence library containing schematic templates for use in BAG, this must be called if
@@ -251,9 +473,161 @@ class AyarDesignManager:
     HELPER METHODS - These should not need to be called by any subclass or external routine
     """
 
+    def get_cell_hash(self, cell_name):
+        """
+        Returns a hash of the layout and schematic content of a cell in the implementation library. It covers the view
+        files of the cell and of every cell it instantiates from the same library, collected in one SKILL call
+        """
+        expr = """let((todo seen paths key cv)
+  todo = list(list("%s" "%s"))
+  while(todo
+    key = car(todo) todo = cdr(todo)
+    unless(member(key seen)
+      seen = cons(key seen)
+      paths = cons(ddGetObj(car(key) cadr(key) "layout" "layout.oa")~>readPath paths)
+      paths = cons(ddGetObj(car(key) cadr(key) "schematic" "sch.oa")~>readPath paths)
+      when(cv = dbOpenCellViewByType(car(key) cadr(key) "layout" nil "r")
+        foreach(header cv~>instHeaders
+          when(header~>libName == car(key)
+            todo = cons(list(header~>libName header~>cellName) todo)))
+        dbClose(cv))))
+  paths)""" % (self.impl_lib, cell_name)
+        paths = CadenceLayoutImporter.parse_skill_list(self.prj.impl_db._eval_skill(expr))
+        digests = []
+        for path in sorted(path for path in paths if path is not None):
+            digest = hashlib.sha1()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            digests.append((path, digest.hexdigest()))
+        if not digests:
+            raise ValueError('no layout or schematic found for {}/{}'.format(self.impl_lib, cell_name))
+        return cache.hash_key(self.impl_lib, cell_name, digests)
+
+    def _run_verification(self, kind, run, cell_name_list, max_concurrency, use_cache):
+        """
+        Runs a verification job for every cell with bounded concurrency, and records passing runs in the result store
+        under ACG_CACHE_DIR, keyed by the content hash of each cell
+        """
+        if max_concurrency is None:
+            max_concurrency = self.specs.get('verify_concurrency', 1)
+        store_dir = cache.get_cache_dir('verification')
+
+        async def job(cell_name):
+            cell_hash = None
+            if use_cache:
+                try:
+                    cell_hash = self.get_cell_hash(cell_name)
+                except Exception:
+                    # Cells that cannot be hashed are always run
+                    cell_hash = None
+            store_path = None
+            if cell_hash is not None:
+                store_path = os.path.join(store_dir, cache.hash_key(kind, cell_hash) + '.json')
+                record = cache.read_json(store_path)
+                if record is not None:
+                    return JobResult(cell_name, status='cached', log_path=record['log_path'])
+
+            print('Running {} on {}'.format(kind, cell_name))
+            start = time.perf_counter()
+            passed, log_path = await run(cell_name)
+            result = JobResult(cell_name, status='passed' if passed else 'failed', value=passed, log_path=log_path,
+                               runtime=time.perf_counter() - start)
+            if passed and store_path is not None:
+                cache.write_json(store_path, result.to_dict())
+            return result
+
+        def report(result):
+            if result.status == 'passed':
+                print('{} of {} passed :)'.format(kind, result.name))
+            elif result.status == 'cached':
+                print('{} of {} unchanged since a passing run, skipped'.format(kind, result.name))
+            elif result.status == 'failed':
+                print('{} of {} failed :('.format(kind, result.name))
+                print('{} log path: {}'.format(kind, result.log_path))
+            else:
+                print('{} of {} could not be run:\n{}'.format(kind, result.name, result.error))
+
+        jobs = {cell_name: functools.partial(job, cell_name) for cell_name in cell_name_list}
+        return run_jobs(jobs, max_concurrency=max_concurrency, on_done=report)
+
+    def get_manifest(self):
+        """
+        Returns the manifest of the cells generated into impl_lib. It is stored in the library directory when its path
+        can be found through the SKILL interface. Incremental generation is disabled by default, and is enabled with
+        the 'incremental' spec entry
+        """
+        if self._manifest is None:
+            lib_path = None
+            try:
+                lib_path = self.prj.impl_db._eval_skill('ddGetObj( "%s" )~>readPath' % self.impl_lib)
+                lib_path = lib_path.strip().strip('"') if isinstance(lib_path, str) else None
+            except Exception:
+                lib_path = None
+            self._manifest = GenerationManifest.for_library(self.impl_lib, lib_path)
+        return self._manifest
+
+    def _get_dirty_cells(self, kind, cls, cells, force=False, extra=(), report=True):
+        """
+        Returns (params, cell_name, digest) for every cell that has to be generated. The digest is None when
+        incremental generation is disabled
+        """
+        if not self.specs.get('incremental', False):
+            return [(params, cell_name, None) for params, cell_name in cells]
+        manifest = self.get_manifest()
+        cells = [(params, cell_name, cell_digest(kind, cls, params, *extra)) for params, cell_name in cells]
+        current = [] if force else [cell_name for _, cell_name, digest in cells
+                                    if manifest.is_current(kind, cell_name, digest)]
+        # Cells that were deleted from impl_lib since they were recorded are generated again
+        skipped = self._existing_cells(kind, current) if current else set()
+        dirty = [cell for cell in cells if cell[1] not in skipped]
+        num_skipped = len(cells) - len(dirty)
+        if report and num_skipped:
+            print('Skipping {} unchanged {}s'.format(num_skipped, kind))
+        return dirty
+
+    def _existing_cells(self, kind, cell_names):
+        """ Returns the names of the cells whose layout or schematic view exists in impl_lib """
+        impl_db = getattr(self.prj, 'impl_db', None)
+        if impl_db is None:
+            # Without a BAG project only the layouts of the in-memory template db exist
+            cells = getattr(self.tdb, 'cell_names', set()) if kind == 'layout' else set()
+            return {cell_name for cell_name in cell_names if cell_name in cells}
+        view = ('layout', 'layout.oa') if kind == 'layout' else ('schematic', 'sch.oa')
+        expr = 'list( {} )'.format(' '.join('ddGetObj( "%s" "%s" "%s" "%s" )~>readPath' %
+                                            ((self.impl_lib, cell_name) + view) for cell_name in cell_names))
+        try:
+            paths = CadenceLayoutImporter.parse_skill_list(impl_db._eval_skill(expr))
+        except Exception:
+            return set()
+        if len(paths) != len(cell_names):
+            return set()
+        return {cell_name for cell_name, path in zip(cell_names, paths) if path is not None}
+
+    def _record_cells(self, kind, cells, masters=None):
+        """
+        Records generated cells in the manifest once they were written, along with the digests of the source files of
+        every generator used by their masters
+        """
+        if masters is None:
+            masters = [None] * len(cells)
+        entries = {}
+        for (_, cell_name, digest), master in zip(cells, masters):
+            if digest is not None:
+                sources = module_digests(master_modules(master)) if master is not None else {}
+                entries[cell_name] = (digest, sources)
+        if entries:
+            self.get_manifest().update(kind, entries)
+
+    def get_layout_class(self):
+        """ Returns the layout generator class specified by layout_package and layout_class in the spec file """
+        lay_module = importlib.import_module(self.specs['layout_package'])
+        return getattr(lay_module, self.specs['layout_class'])
+
     def make_tdb(self, layermap=''):
         """
-        Makes a new TemplateDB object. If no routing grid parameters are sent in, dummy parameters are used.
+        Makes a new TemplateDB object. If no routing grid parameters are sent in, dummy parameters are used. When the
+        in-memory backend is selected, a MemoryTemplateDB is created instead and bprj may be None.
         """
         self.impl_lib = self.specs['impl_lib']
         if 'routing_grid' in self.specs:
@@ -268,6 +642,12 @@ class AyarDesignManager:
             widths = [0.1, 0.1, 0.1, 0.1, 0.2]
             bot_dir = 'y'
 
+        if Backend.backend_name == 'memory':
+            # Headless mode, no BAG project is required
+            routing_grid = Backend.MemoryRoutingGrid(Backend.MemoryTechInfo(), layers, spaces, widths, bot_dir)
+            self.tdb = Backend.MemoryTemplateDB(routing_grid, self.impl_lib, prj=self.prj)
+            return
+
         routing_grid = RoutingGrid(self.prj.tech_info, layers, spaces, widths, bot_dir)
         self.tdb = TemplateDB('template_libs.def',
                               routing_grid,
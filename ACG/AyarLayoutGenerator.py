@@ -5,22 +5,28 @@ to describe layout generation scripts in the Python language and automate the la
 
 # General imports
 import abc
-from typing import Union, Tuple
-import re
+from typing import Union, Tuple, List, Dict, Optional
 import yaml
-import os
-
-# BAG imports
-import bag
-from bag.layout.template import TemplateBase
+import numpy as np
 
 # ACG imports
+from ACG.Backend import TemplateBase, Backend
 from ACG.Rectangle import Rectangle
+from ACG.RectArray import RectArray
 from ACG.Track import Track, TrackManager
 from ACG.VirtualInst import VirtualInst
-from ACG.Via import ViaStack, Via
+from ACG.VirtualInstArray import VirtualInstArray
+from ACG.Via import ViaStack, Via, ViaArray
 from ACG import tech as tech_info
 from ACG.LayoutParse import CadenceLayoutParser
+from ACG.CadenceImport import CadenceLayoutImporter
+from ACG.AbstractLibrary import AbstractLibrary, CellAbstract
+from ACG.LayoutStats import LayoutStats
+from ACG.ObstacleIndex import ObstacleIndex
+from ACG.PinRegistry import PinRegistry
+from ACG.ShapeTable import ShapeTable, flatten_shapes
+from ACG.LayoutSnapshot import LayoutSnapshot
+from ACG.ShapeStore import ShapeStore
 
 
 class AyarLayoutGenerator(TemplateBase, metaclass=abc.ABCMeta):
@@ -32,11 +38,14 @@ class AyarLayoutGenerator(TemplateBase, metaclass=abc.ABCMeta):
     def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
         # Call TemplateBase's constructor
         TemplateBase.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+        self.backend = Backend(self)  # Receives all shapes when they are committed
         self.tech = self.grid.tech_info
+        self.stats = LayoutStats(name=self.__class__.__name__)  # Timings and counters recorded in draw_layout
         self._res = .001  # set basic grid size to be 1nm
         # Create a dictionary that holds all objects required to construct the layout
         self._db = {
             'rect': [],
+            'rect_array': [],
             'via': [],
             'prim_via': [],
             'instance': [],
@@ -46,6 +55,22 @@ class AyarLayoutGenerator(TemplateBase, metaclass=abc.ABCMeta):
         # Create an empty database that will store only the relevant layout objects
         self.loc = {}
 
+        # Routing blockages of this layout by layer as (n, 4) arrays of [x0, y0, x1, y1] in resolution units
+        self.obs = {}
+
+        # Out-of-core storage for drawn shapes, enabled with use_shape_store
+        self.shapes: Optional[ShapeStore] = None
+
+        # Shapes marked as final with freeze, committed in chunks of freeze_chunk_size during layout_procedure. Marked
+        # shapes stay in the db, keyed by id, until they are removed from it all at once at the next chunk boundary
+        self._frozen = {'rect': [], 'rect_array': [], 'via': [], 'prim_via': []}
+        self._freeze_marked = {}
+        self.freeze_chunk_size = 1 << 14
+
+        # Pins of this layout indexed by net and layer
+        self.pins = PinRegistry(res=self._res)
+        self._pin_registry = (None, None)  # (hierarchy key, pins merged with those of all instances)
+
         # Manage the tracks in a track manager
         self.tracks = TrackManager.from_routing_grid(self.grid)
 
@@ -81,6 +106,99 @@ class AyarLayoutGenerator(TemplateBase, metaclass=abc.ABCMeta):
         """
         return self.loc
 
+    def get_obstructions(self) -> dict:
+        """
+        Returns the routing blockages of this layout by layer, including the blockages of all instances projected
+        through their transformations. Blockages are (n, 4) arrays of [x0, y0, x1, y1] in resolution units
+        """
+        obs = {layer: [rects] for layer, rects in self.obs.items()}
+        for inst in self._db['instance']:
+            for layer, rects in inst.get_obs().items():
+                obs.setdefault(layer, []).append(rects)
+        return {layer: rects[0] if len(rects) == 1 else np.concatenate(rects) for layer, rects in obs.items()}
+
+    def get_obstacle_index(self, include_shapes: bool = True) -> ObstacleIndex:
+        """
+        Returns an index of everything a route in this layout has to avoid: the blockages of this layout and its
+        instances, and optionally all drawn rectangles. The index is a snapshot, so build a new one after adding shapes
+
+        Parameters
+        ----------
+        include_shapes : bool
+            if True, drawn (non-virtual) rectangles are added to the index
+        """
+        return ObstacleIndex.from_generator(self, include_shapes=include_shapes)
+
+    def get_pin_registry(self, hierarchical: bool = True) -> PinRegistry:
+        """
+        Returns the pins of this layout indexed by net and layer. If hierarchical is True, the pins of all instances are
+        included, transformed to their placement. Nets of instances are named '<inst_name>/<net>', so that nets with
+        the same name in different instances stay separate, and nets of array elements '<inst_name><<idx>>/<net>'.
+        Instances without a name are called X<n>, skipping names that are taken. The merged registry is cached until
+        pins are added or an instance is added, renamed or moved
+        """
+        if not hierarchical or not self._db['instance']:
+            return self.pins
+        key = (self.pins.version, tuple((inst.origin.x, inst.origin.y, inst.orient, inst.inst_name, id(inst))
+                                        for inst in self._db['instance']))
+        if self._pin_registry[0] != key:
+            registries = [self.pins]
+            for inst, name in zip(self._db['instance'], self._inst_names()):
+                registries.append(inst.get_pin_registry(prefix=name))
+            self._pin_registry = (key, PinRegistry.merge(registries, res=self._res))
+        return self._pin_registry[1]
+
+    def _inst_names(self) -> List[str]:
+        """ Returns the name of every instance, naming unnamed instances X<n> with the lowest free n """
+        taken = {inst.inst_name for inst in self._db['instance'] if inst.inst_name is not None}
+        names, count = [], 0
+        for inst in self._db['instance']:
+            name = inst.inst_name
+            if name is None:
+                while 'X{}'.format(count) in taken:
+                    count += 1
+                name = 'X{}'.format(count)
+                count += 1
+            names.append(name)
+        return names
+
+    def find_pins(self, net: str = None, layer: str = None, region=None, hierarchical: bool = True) -> np.ndarray:
+        """
+        Returns all pins matching the provided net, layer and region as an (n, 4) array of [x0, y0, x1, y1] in
+        resolution units. See PinRegistry.query_nets for the arguments
+        """
+        return self.get_pin_registry(hierarchical=hierarchical).query(net=net, layer=layer, region=region)
+
+    def export_shapes(self, flatten: bool = False, include_virtual: bool = False) -> ShapeTable:
+        """
+        Returns the shapes of this layout as a ShapeTable of per-layer coordinate arrays in resolution units, which can
+        be converted to Arrow record batches or written to Parquet
+
+        Parameters
+        ----------
+        flatten : bool
+            if True, the shapes of all instances are included, transformed to their placement in this layout
+        include_virtual : bool
+            if True, virtual rectangles are exported as well
+        """
+        if flatten:
+            return flatten_shapes(self, include_virtual=include_virtual)
+        return ShapeTable.from_generator(self, include_virtual=include_virtual)
+
+    def dump_state(self) -> bytes:
+        """
+        Returns the shapes, instances, location dict, blockages, pins and tracks of this layout in the compact binary
+        format of LayoutSnapshot. Instances refer to their masters by class and parameters
+        """
+        return LayoutSnapshot.from_generator(self).to_bytes()
+
+    def load_state(self, data, resolve_master=None) -> None:
+        """
+        Replaces the state of this layout with one returned by dump_state, so that it can be committed without running
+        layout_procedure. See LayoutSnapshot.restore for resolve_master
+        """
+        LayoutSnapshot.from_bytes(data).restore(self, resolve_master=resolve_master)
+
     @abc.abstractmethod
     def layout_procedure(self):
         """ Implement this method to describe how the layout is drawn """
@@ -117,6 +235,143 @@ class AyarLayoutGenerator(TemplateBase, metaclass=abc.ABCMeta):
         self._db['rect'].append(temp)
         return self._db['rect'][-1]
 
+    def add_rect_array(self,
+                       layer: Union[str, Tuple[str, str]],
+                       xy,
+                       nx: int = 1,
+                       ny: int = 1,
+                       spx: float = 0,
+                       spy: float = 0,
+                       virtual: bool = False
+                       ) -> RectArray:
+        """
+        Adds a rectangle repeated nx by ny times with pitch spx and spy. The array is committed as a single shape, so
+        use it instead of many add_rect calls for regular structures
+
+        Args:
+            layer (str):
+                layer that the rectangles should be drawn on
+            xy (Tuple[[float, float], [float, float]]):
+                lower left and upper right corner of the first rectangle
+            nx (int):
+                number of columns
+            ny (int):
+                number of rows
+            spx (float):
+                column pitch
+            spy (float):
+                row pitch
+            virtual (bool):
+                If true, the array will not be drawn in the final layout
+        Returns:
+            (RectArray):
+                the created rectangle array
+        """
+        temp = RectArray(xy, layer, nx=nx, ny=ny, spx=spx, spy=spy, virtual=virtual)
+        self._db['rect_array'].append(temp)
+        return temp
+
+    def use_shape_store(self, directory: Optional[str] = None, chunk_size: int = 1 << 16) -> ShapeStore:
+        """
+        Enables out-of-core storage of drawn shapes for this layout. Shapes added with add_rects and add_vias are kept
+        in memory-mapped files instead of Python objects, and are streamed to the backend when the layout is committed
+
+        Args:
+            directory (str):
+                local directory receiving the backing files. Defaults to the system temporary directory
+            chunk_size (int):
+                number of shapes read at once when committing or exporting
+        Returns:
+            (ShapeStore):
+                the shape store of this layout
+        """
+        if self.shapes is None:
+            self.shapes = ShapeStore(directory=directory, res=self._res, chunk_size=chunk_size)
+        return self.shapes
+
+    def add_rects(self, layer: Union[str, Tuple[str, str]], coords: np.ndarray) -> None:
+        """
+        Adds many drawn rectangles to the shape store without creating Rectangle objects. Enables the shape store with
+        default settings if needed
+
+        Args:
+            layer (Union[str, Tuple[str, str]]):
+                layer or layer purpose pair of all rectangles
+            coords (np.ndarray):
+                (n, 4) array of [x0, y0, x1, y1] in resolution units
+        """
+        self.use_shape_store().add_rects(layer, coords)
+
+    def add_vias(self, bot_layer: str, top_layer: str, coords: np.ndarray, extend: bool = False) -> None:
+        """
+        Adds many vias between two adjacent metal layers to the shape store without creating via objects. Enables the
+        shape store with default settings if needed
+
+        Args:
+            bot_layer (str):
+                bottom metal layer
+            top_layer (str):
+                top metal layer, which must be the layer the bottom layer connects to
+            coords (np.ndarray):
+                (n, 4) array of the via regions as [x0, y0, x1, y1] in resolution units
+            extend (bool):
+                if True, the via regions can be extended to meet the enclosure rules
+        """
+        metal_tech = tech_info.tech_info['metal_tech']
+        if metal_tech['metals'][bot_layer].get('connect_to') != top_layer:
+            raise ValueError('{} does not connect to {} with a single via'.format(bot_layer, top_layer))
+        bot_dir = metal_tech['dir'][metal_tech['routing'].index(bot_layer)]
+        self.use_shape_store().add_vias(bot_layer, top_layer, bot_dir, extend, coords)
+
+    def freeze(self, shapes=None) -> int:
+        """
+        Marks rectangles and vias as final. Frozen shapes are removed from the shape database and committed in chunks
+        while layout_procedure is still running: to the shape store if one is enabled, otherwise directly to the
+        backend. Rectangle arrays and primitive vias are always committed directly to the backend. Their Python
+        objects are freed unless they are still referenced, e.g. from the location dict. Frozen shapes must not be
+        modified anymore. Shapes that are not in the shape database are ignored
+
+        Without a shape store, frozen shapes are gone from this generator once their chunk is committed: they no
+        longer appear in export_shapes, get_obstacle_index or DensityFill. With a shape store, frozen rectangles and
+        via stacks are still exported from the store, but rectangle arrays and primitive vias are not
+
+        Args:
+            shapes (Iterable):
+                rectangles, rectangle arrays, via stacks and vias to freeze. If None, all shapes added so far are frozen
+        Returns:
+            (int):
+                the number of shapes that were frozen or marked to be frozen
+        """
+        if shapes is None:
+            self._compact_frozen()
+            num = 0
+            for key in self._frozen:
+                num += len(self._db[key])
+                self._frozen[key].extend(self._db[key])
+                self._db[key] = []
+        else:
+            num = len(self._freeze_marked)
+            # Removing each shape from the db would be quadratic, so shapes are only marked here. Shapes are kept
+            # referenced so that their ids cannot be reused before they are removed
+            self._freeze_marked.update((id(shape), shape) for shape in shapes)
+            num = len(self._freeze_marked) - num
+        if len(self._freeze_marked) + sum(len(pending) for pending in self._frozen.values()) >= self.freeze_chunk_size:
+            self._commit_frozen()
+        return num
+
+    def _compact_frozen(self) -> None:
+        """ Moves the shapes marked by freeze from the db to the frozen lists in a single pass over the db """
+        if not self._freeze_marked:
+            return
+        marked = self._freeze_marked
+        self._freeze_marked = {}
+        for key in self._frozen:
+            shapes = self._db[key]
+            frozen = [shape for shape in shapes if id(shape) in marked]
+            if frozen:
+                self._frozen[key].extend(frozen)
+                self._db[key] = [shape for shape in shapes if id(shape) not in marked]
+
     def copy_rect(self, rect,  # type: Rectangle
                   layer=None,  # type: Union[str, [str, str]]
                   virtual=False  # type: bool
@@ -181,8 +436,7 @@ class AyarLayoutGenerator(TemplateBase, metaclass=abc.ABCMeta):
             debug (bool):
                 True to print debug messages
         """
-        return TemplateBase.new_template(self,
-                                         params=params,
+        return self.backend.new_template(params=params,
                                          temp_cls=temp_cls,
                                          debug=debug, **kwargs)
 
@@ -197,8 +451,11 @@ class AyarLayoutGenerator(TemplateBase, metaclass=abc.ABCMeta):
                      spy=0,
                      unit_mode=False
                      ) -> VirtualInst:
-        """ Adds a single instance from a provided template master """
-        temp = VirtualInst(master, inst_name=inst_name)
+        """ Adds a single instance from a provided template master, or an instance array if nx or ny is above 1 """
+        if nx > 1 or ny > 1:
+            temp = VirtualInstArray(master, inst_name=inst_name, nx=nx, ny=ny, spx=spx, spy=spy)
+        else:
+            temp = VirtualInst(master, inst_name=inst_name)
         temp.shift_origin(loc, orient=orient)  # Move virtual instance to desired location/orientation
         self._db['instance'].append(temp)  # Add the instance to the list
         return temp
@@ -207,7 +464,8 @@ class AyarLayoutGenerator(TemplateBase, metaclass=abc.ABCMeta):
                       libname: str,
                       cellname: str,
                       yaml_root: str = None,
-                      export_pins: bool = True
+                      export_pins: bool = True,
+                      lef_file: str = None
                       ) -> 'LayoutAbstract':
         """
         Creates an abstract layout master from the provided virtuoso libname and cellname. Adds pin shapes
@@ -223,6 +481,8 @@ class AyarLayoutGenerator(TemplateBase, metaclass=abc.ABCMeta):
             path to yaml file containing pin shapes. These shapes will be added to the location dictionary
         export_pins : bool
             if True, will draw all pin shapes provided in yaml root
+        lef_file : str
+            path to a LEF file containing the cell MACRO. If provided, pin shapes are read from it instead of yaml_root
 
         Returns
         -------
@@ -233,7 +493,8 @@ class AyarLayoutGenerator(TemplateBase, metaclass=abc.ABCMeta):
             'libname': libname,
             'cellname': cellname,
             'yaml_root': yaml_root,
-            'export_pins': export_pins
+            'export_pins': export_pins,
+            'lef_file': lef_file
         }
         abstract_temp = self.new_template(params=params, temp_cls=LayoutAbstract)
         return abstract_temp
@@ -245,7 +506,8 @@ class AyarLayoutGenerator(TemplateBase, metaclass=abc.ABCMeta):
         """
         This method will extract the layout specified by libname, cellname from Cadence, and return a new
         LayoutAbstract master that can be placed in the current db. This method will also analyze the layout for
-        its pins and automatically add them to the location dictionary.
+        its pins and automatically add them to the location dictionary. The raw layout data is cached, so importing
+        an unchanged cell again does not require another SKILL round-trip.
 
         Parameters
         ----------
@@ -260,14 +522,7 @@ class AyarLayoutGenerator(TemplateBase, metaclass=abc.ABCMeta):
             Newly created master that will contain the imported layout and pin information
         """
         # Grab layout information from Cadence through SKILL interface
-        temp_file_name = 'test.yaml'
-        expr = 'parse_cad_layout( "%s" "%s" "%s" )' % (libname, cellname, temp_file_name)
-        self.template_db._prj.impl_db._eval_skill(expr)
-
-        # Grab the raw layout data, then delete the temp file afterward
-        with open(temp_file_name, 'r') as f:
-            data = yaml.load(f)
-        os.remove(temp_file_name)
+        data = CadenceLayoutImporter(self.backend.eval_skill).import_layout(libname, cellname)
 
         # Create the new master
         return self.new_template(params={'libname': libname,
@@ -275,6 +530,37 @@ class AyarLayoutGenerator(TemplateBase, metaclass=abc.ABCMeta):
                                          'data': data},
                                  temp_cls=CadenceLayout)
 
+    def import_cadence_layouts(self,
+                               cells: List[Tuple[str, str]],
+                               max_workers: Optional[int] = None,
+                               use_processes: bool = False
+                               ) -> Dict[Tuple[str, str], 'CadenceLayout']:
+        """
+        Imports many layouts from Cadence at once. All cells that are not already cached are extracted with a single
+        SKILL evaluation and parsed concurrently, which is much faster than calling import_cadence_layout in a loop
+
+        Parameters
+        ----------
+        cells : List[Tuple[str, str]]
+            list of (libname, cellname) pairs to be imported
+        max_workers : Optional[int]
+            maximum number of parallel parsers
+        use_processes : bool
+            if True, parse the layouts in a process pool instead of a thread pool
+
+        Returns
+        -------
+        masters : Dict[Tuple[str, str], CadenceLayout]
+            Newly created masters keyed by their (libname, cellname) pair
+        """
+        importer = CadenceLayoutImporter(self.backend.eval_skill)
+        data_dict = importer.import_layouts(cells, max_workers=max_workers, use_processes=use_processes)
+        return {(libname, cellname): self.new_template(params={'libname': libname,
+                                                               'cellname': cellname,
+                                                               'data': data},
+                                                       temp_cls=CadenceLayout)
+                for (libname, cellname), data in data_dict.items()}
+
     def connect_wires(self,
                       rect1: Rectangle,
                       rect2: Rectangle,
@@ -332,44 +618,100 @@ class AyarLayoutGenerator(TemplateBase, metaclass=abc.ABCMeta):
         self._db['prim_via'].append(temp)
         return temp
 
+    def add_pin(self, net: str, rect: Rectangle) -> Rectangle:
+        """ Registers a rectangle as a pin of the provided net, so that it can be found with find_pins """
+        self.pins.add_rect(net, rect)
+        return rect
+
     def create_label(self, label, rect, purpose=None, show=True):
         if purpose is not None:
             self.add_rect([rect.layer, purpose], rect.xy)
         if show is True:
-            TemplateBase.add_label(self, label, rect.layer, rect.to_bbox())
-        TemplateBase.add_pin_primitive(self, net_name=label, layer=rect.layer, bbox=rect.to_bbox(), show=False)
+            self.backend.add_label(label, rect.layer, rect)
+        self.backend.add_pin(net_name=label, layer=rect.layer, rect=rect, show=False)
+        self.pins.add_rect(label, rect)
 
     """ INTERNAL METHODS """
     """ DO NOT CALL OR OVERRIDE """
 
     def draw_layout(self) -> None:
         """ Called by higher level BAG functions to create layout """
-        self.layout_procedure()  # Perform the user determined layout process
+        with self.stats.timer('layout_procedure'), self.stats.track_objects('layout_procedure'):
+            self.layout_procedure()  # Perform the user determined layout process
         self._commit_shapes()  # Take all of the created shapes and actually push them to the bag db
 
     def parse_yaml(self, pathname) -> dict:
-        """ returns the parsed yaml file TODO: change the reference function to something not in bag.core """
-        return bag.core._parse_yaml_file(pathname)
+        """ returns the parsed yaml file """
+        with open(pathname, 'r') as f:
+            return yaml.load(f, Loader=yaml.FullLoader)
 
     def _commit_shapes(self) -> None:
         """ Takes all shapes in local db and creates standard BAG equivalents """
-        self._commit_rect()
-        self._commit_inst()
-        self._commit_via()
+        self._commit_frozen()
+        with self.stats.timer('commit_rect'):
+            self._commit_rect()
+        with self.stats.timer('commit_inst'):
+            self._commit_inst()
+        with self.stats.timer('commit_via'):
+            self._commit_via()
 
         # Set the properties required for BAG primitive black boxing
         self.prim_bound_box = self.temp_boundary.to_bbox()
-        self.prim_top_layer = self.grid.tech_info.get_layer_id(self.temp_boundary.layer)
+        self.prim_top_layer = self.backend.get_layer_id(self.temp_boundary.layer)
 
         # for layer_num in range(1, self.prim_top_layer + 1):
         #     self.mark_bbox_used(layer_num, self.prim_bound_box)
 
-    def _commit_rect(self) -> None:
-        """ Takes in all rectangles in the db and creates standard BAG equivalents """
-        for shape in self._db['rect']:
+    def _commit_frozen(self) -> None:
+        """ Commits the shapes that were frozen since the last call, and releases them """
+        self._compact_frozen()
+        frozen = self._frozen
+        self._frozen = {key: [] for key in frozen}
+        with self.stats.timer('commit_frozen'):
+            if self.shapes is None:
+                self._commit_rect(frozen['rect'], frozen['rect_array'])
+                self._commit_via(frozen['via'], frozen['prim_via'])
+                return
+            # Drawn shapes are moved to the shape store, which is committed with the rest of the layout
+            num_virtual = 0
+            for shape in frozen['rect']:
+                if shape.virtual is False:
+                    self.shapes.add_rect(shape)
+                else:
+                    self.temp_boundary = self.temp_boundary.get_enclosure(shape)
+                    num_virtual += 1
+            for via in frozen['via']:
+                self.shapes.add_via(via)
+            self.stats.count('virtual_rect', num_virtual)
+            # Rectangle arrays are already compact, so they are committed as arrays instead of one rectangle each
+            self._commit_rect([], frozen['rect_array'])
+            self._commit_via([], frozen['prim_via'])
+
+    def _commit_rect(self, rects: Optional[list] = None, rect_arrays: Optional[list] = None) -> None:
+        """
+        Takes in all rectangles in the db and creates standard BAG equivalents. If rects or rect_arrays are provided,
+        only those are committed
+        """
+        final = rects is None and rect_arrays is None
+        rects = self._db['rect'] if rects is None else rects
+        rect_arrays = self._db['rect_array'] if rect_arrays is None else rect_arrays
+        num_drawn = 0
+        for shape in rects:
             self.temp_boundary = self.temp_boundary.get_enclosure(shape)
             if shape.virtual is False:
-                TemplateBase.add_rect(self, shape.lpp, shape.to_bbox())
+                self.backend.add_rect(shape.lpp, shape)
+                num_drawn += 1
+        for shape in rect_arrays:
+            self.temp_boundary = self.temp_boundary.get_enclosure(shape.get_bound())
+            if shape.virtual is False:
+                self.backend.add_rect(shape.lpp, shape, nx=shape.nx, ny=shape.ny, spx=shape.spx, spy=shape.spy)
+                num_drawn += 1
+        self.stats.count('virtual_rect', len(rects) + len(rect_arrays) - num_drawn)
+        if final and self.shapes is not None and len(self.shapes):
+            # Stored shapes are streamed to the backend chunk by chunk
+            self.temp_boundary = self.temp_boundary.get_enclosure(self.shapes.get_bound())
+            num_drawn += self.shapes.commit_rects(self.backend)
+        self.stats.count('rect', num_drawn)
 
     def _commit_inst(self) -> None:
         """ Takes in all inst in the db and creates standard BAG equivalents """
@@ -380,26 +722,45 @@ class AyarLayoutGenerator(TemplateBase, metaclass=abc.ABCMeta):
             except AttributeError:
                 # TODO: Get the size properly
                 bound = Rectangle(xy=[[0, 0], [.1, .1]], layer='M1', virtual=True)
+            if isinstance(inst, VirtualInstArray):
+                bound = inst.get_bound(bound)
+                self.temp_boundary = self.temp_boundary.get_enclosure(bound)
+                self.backend.add_instance(inst.master,
+                                          inst_name=inst.inst_name,
+                                          loc=inst.origin,
+                                          orient=inst.orient,
+                                          nx=inst.nx,
+                                          ny=inst.ny,
+                                          spx=inst.spx,
+                                          spy=inst.spy)
+                continue
             self.temp_boundary = self.temp_boundary.get_enclosure(bound)
-            TemplateBase.add_instance(self,
-                                      inst.master,
+            self.backend.add_instance(inst.master,
                                       inst_name=inst.inst_name,
                                       loc=inst.origin,
                                       orient=inst.orient)
+        self.stats.count('instance', len(self._db['instance']))
 
-    def _commit_via(self) -> None:
-        """ Takes in all vias in the db and creates standard BAG equivalents """
-        for via in self._db['via']:
+    def _commit_via(self, vias: Optional[list] = None, prim_vias: Optional[list] = None) -> None:
+        """
+        Takes in all vias in the db and creates standard BAG equivalents. If vias or prim_vias are provided, only those
+        are committed
+        """
+        final = vias is None and prim_vias is None
+        vias = self._db['via'] if vias is None else vias
+        prim_vias = self._db['prim_via'] if prim_vias is None else prim_vias
+        for via in vias:
+            # Via arrays are committed as one BAG via array per metal pair
+            array = dict(nx=via.nx, ny=via.ny, spx=via.spx, spy=via.spy) if isinstance(via, ViaArray) else {}
             for connection in via.metal_pairs:
-                TemplateBase.add_via(self,
-                                     bbox=via.loc['overlap'].to_bbox(),
+                self.backend.add_via(rect=via.loc['overlap'],
                                      bot_layer=connection[0],
                                      top_layer=connection[1],
                                      bot_dir=via.bot_dir,
-                                     extend=via.extend)
-        for via in self._db['prim_via']:
-            TemplateBase.add_via_primitive(self,
-                                           via_type=via.via_id,
+                                     extend=via.extend,
+                                     **array)
+        for via in prim_vias:
+            self.backend.add_via_primitive(via_type=via.via_id,
                                            loc=via.location,
                                            num_rows=via.num_rows,
                                            num_cols=via.num_cols,
@@ -408,6 +769,9 @@ class AyarLayoutGenerator(TemplateBase, metaclass=abc.ABCMeta):
                                            enc1=via.enc_bot,
                                            enc2=via.enc_top,
                                            orient=via.orient)
+        num_stored = self.shapes.commit_vias(self.backend) if final and self.shapes is not None else 0
+        self.stats.count('via', len(vias) + num_stored)
+        self.stats.count('prim_via', len(prim_vias))
 
 
 class LayoutAbstract(AyarLayoutGenerator):
@@ -421,8 +785,13 @@ class LayoutAbstract(AyarLayoutGenerator):
 
         self.loc = {}
         self.cell_dict = None
+        self.abstract: CellAbstract = None  # Pins/obs/boundary of this cell from the shared abstract library
         self.yaml_root = self.params['yaml_root']
-        self.cell_yaml = self.yaml_root + self.params['libname'] + '/' + self.params['cellname'] + '.yaml'
+        self.lef_file = self.params['lef_file']
+        if self.yaml_root is not None:
+            self.cell_yaml = self.yaml_root + self.params['libname'] + '/' + self.params['cellname'] + '.yaml'
+        else:
+            self.cell_yaml = None
         self.tech_layers = []
         self.pin_list = []
 
@@ -431,7 +800,15 @@ class LayoutAbstract(AyarLayoutGenerator):
         return dict(
             libname='Name of the library to instantiate the cell from',
             cellname='Name of the cell to instantiate',
-            yaml_root='Root directory path for yaml files'
+            yaml_root='Root directory path for yaml files',
+            lef_file='LEF file to read the cell abstract from directly. Used instead of yaml_root if provided'
+        )
+
+    @classmethod
+    def get_default_param_values(cls) -> dict:
+        return dict(
+            yaml_root=None,
+            lef_file=None
         )
 
     def get_pins(self):
@@ -442,7 +819,7 @@ class LayoutAbstract(AyarLayoutGenerator):
         self.get_tech_params()
         self.get_cell_params()
         self.calculate_pins()
-        # self.calculate_obs() # Can be enabled later if needed!!!
+        self.calculate_obs()
         self.calculate_boundary()
         self.instantiate_layout()
 
@@ -450,12 +827,18 @@ class LayoutAbstract(AyarLayoutGenerator):
         """We instantiate the layout as a primitive here based on the cell_name read"""
         """Adding mapping since the stupid lef layout library name is different than the cds.lib name"""
 
-        self.add_instance_primitive(lib_name=self.params['libname'], cell_name=self.params['cellname'], loc=(0, 0))
+        self.backend.add_instance_primitive(lib_name=self.params['libname'], cell_name=self.params['cellname'],
+                                            loc=(0, 0))
 
     def get_cell_params(self):
-        """Read cell parameters from specific Yaml"""
-        pathname = open(self.cell_yaml, mode='r')
-        self.cell_dict = yaml.load(pathname)
+        """Read cell parameters from the abstract library, which parses the LEF or cell yamls of the library only once"""
+        if self.lef_file is not None:
+            library = AbstractLibrary.from_lef(self.lef_file)
+        elif self.yaml_root is not None:
+            library = AbstractLibrary.from_yaml_root(self.yaml_root, self.params['libname'])
+        else:
+            raise ValueError('LayoutAbstract requires either lef_file or yaml_root')
+        self.abstract = library[self.params['cellname']]
         print("{} instantiated".format(self.params['cellname']))
 
     def get_tech_params(self):
@@ -464,35 +847,29 @@ class LayoutAbstract(AyarLayoutGenerator):
 
     def calculate_pins(self):
         """Calculates the pins on the stdcell/macro and pushes them to loc dict"""
-        for keys in self.cell_dict:
-            if re.match('pins', keys):
-                for pins in self.cell_dict['pins']:
-                    pins_dict = {pins: []}
-                    for layers in self.cell_dict['pins'][pins]:
-                        if layers.upper() in self.tech_layers:
-                            for rects in self.cell_dict['pins'][pins][layers]:
-                                shape = self.add_rect(layers.upper(), rects, virtual=True)
-                                pins_dict[pins].append(shape)
-                    self.loc.update(pins_dict)
-                    self.pin_list.append(pins)
+        for pin, layers in self.abstract.pins.items():
+            shapes = []
+            for layer, rects in layers.items():
+                if layer in self.tech_layers:
+                    self.pins.add(pin, layer, rects)
+                    for x0, y0, x1, y1 in self.abstract.to_xy(rects):
+                        shapes.append(self.add_rect(layer, [[x0, y0], [x1, y1]], virtual=True))
+            self.loc[pin] = shapes
+            self.pin_list.append(pin)
 
     #                    self.copy_rect(shape,layer=(layers.upper(), 'label'))
     #                    self.create_label(pins,shape)
 
     def calculate_boundary(self):
         """Calulates the boundary from lef file"""
-        for keys in self.cell_dict:
-            if re.match('size', keys):
-                bnd = self.add_rect('OUTLINE', self.cell_dict['size'], virtual=True)
-                bnd_dict = {'bnd': bnd}
-                self.loc.update(bnd_dict)
+        if self.abstract.size is not None:
+            self.loc['bnd'] = self.add_rect('OUTLINE', self.abstract.size_xy, virtual=True)
 
     def calculate_obs(self):
-        """Calulates obstructions in the lef (Can be pushed to ACG/BAG ), cant see a reason for it yet"""
-        for keys in self.cell_dict:
-            if re.match('obs', keys):
-                for layers in self.cell_dict['obs']:
-                    pass
+        """Stores the obstructions in the lef as blockage arrays, so that instances can project them for routing"""
+        for layer, rects in self.abstract.obs.items():
+            if layer in self.tech_layers and len(rects) > 0:
+                self.obs[layer] = rects
 
 
 class CadenceLayout(AyarLayoutGenerator):
@@ -515,8 +892,13 @@ class CadenceLayout(AyarLayoutGenerator):
     def layout_procedure(self):
         parser = CadenceLayoutParser(raw_content=self.params['data'])
         self.loc = parser.generate_loc_dict()
+        for name, value in self.loc.items():
+            if name != 'bnd':
+                for rect in value if isinstance(value, list) else [value]:
+                    self.pins.add_rect(name, rect)
         self.instantiate_layout()
 
     def instantiate_layout(self):
         """We instantiate the layout as a primitive here based on the cell_name read"""
-        self.add_instance_primitive(lib_name=self.params['libname'], cell_name=self.params['cellname'], loc=(0, 0))
+        self.backend.add_instance_primitive(lib_name=self.params['libname'], cell_name=self.params['cellname'],
+                                            loc=(0, 0))
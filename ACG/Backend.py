@@ -0,0 +1,428 @@
+"""
+The Backend module decouples ACG from the database that finally receives the generated shapes. Every
+AyarLayoutGenerator commits its rectangles, instances, vias and pins through a LayoutBackend instance, and masters are
+created through a template database that either comes from BAG or from the lightweight in-memory implementation in
+this module.
+
+The backend is selected with the 'ACG_BACKEND' environment variable, similar to how the tech file is selected with
+'ACG_TECH':
+
+- 'bag' (default): use BAG's TemplateBase/TemplateDB. If BAG cannot be imported, ACG falls back to 'memory'
+- 'memory': use the in-memory TemplateBase/TemplateDB below. No BAG project or Virtuoso connection is required,
+  which makes it suitable for headless worker processes and CI
+"""
+import abc
+import os
+import warnings
+from typing import Tuple, Optional, List, Dict, Set, Any, TYPE_CHECKING
+
+from ACG import tech as tech_info
+
+if TYPE_CHECKING:
+    from ACG.Rectangle import Rectangle
+
+
+class MemoryBBox:
+    """
+    Minimal stand-in for bag.layout.util.BBox, storing the bounds of a rectangle in resolution units
+    """
+
+    def __init__(self, left, bottom, right, top, resolution, unit_mode=False):
+        self._res = resolution
+        if unit_mode:
+            self._left, self._bottom, self._right, self._top = int(left), int(bottom), int(right), int(top)
+        else:
+            self._left = int(round(left / resolution))
+            self._bottom = int(round(bottom / resolution))
+            self._right = int(round(right / resolution))
+            self._top = int(round(top / resolution))
+
+    def __repr__(self):
+        return 'BBox({}, {}, {}, {})'.format(self.left, self.bottom, self.right, self.top)
+
+    @property
+    def resolution(self) -> float:
+        return self._res
+
+    @property
+    def left(self) -> float:
+        return round(self._left * self._res, 3)
+
+    @property
+    def bottom(self) -> float:
+        return round(self._bottom * self._res, 3)
+
+    @property
+    def right(self) -> float:
+        return round(self._right * self._res, 3)
+
+    @property
+    def top(self) -> float:
+        return round(self._top * self._res, 3)
+
+    def get_bounds(self, unit_mode=False):
+        if unit_mode:
+            return self._left, self._bottom, self._right, self._top
+        return self.left, self.bottom, self.right, self.top
+
+
+class MemoryTechInfo:
+    """
+    Provides the subset of BAG's TechInfo used by ACG, built from the ACG tech file
+    """
+
+    def __init__(self, tech_dict: dict = None):
+        if tech_dict is None:
+            tech_dict = tech_info.tech_info
+        self.tech_dict = tech_dict
+        metals = tech_dict['metal_tech']['metals']
+        self._layer_id = {name: prop['index'] for name, prop in metals.items()}
+        self._layer_name = {index: name for name, index in self._layer_id.items()}
+
+    def get_layer_id(self, layer_name: str) -> int:
+        try:
+            return self._layer_id[layer_name]
+        except KeyError:
+            raise ValueError(f"{layer_name} is not a routing layer in the ACG tech file")
+
+    def get_layer_name(self, layer_id: int) -> str:
+        try:
+            return self._layer_name[layer_id]
+        except KeyError:
+            raise ValueError(f"{layer_id} is not a routing layer id in the ACG tech file")
+
+
+class MemoryRoutingGrid:
+    """
+    Provides the subset of BAG's RoutingGrid used by ACG. Track pitch and direction are computed the same way
+    AyarDesignManager passes them to BAG: pitch = width + space, and directions alternate starting from bot_dir
+    """
+
+    def __init__(self,
+                 tech: MemoryTechInfo,
+                 layers: List[int],
+                 spaces: List[float],
+                 widths: List[float],
+                 bot_dir: str,
+                 resolution: float = .001
+                 ):
+        self.tech_info = tech
+        self.resolution = resolution
+        self.sp_tracks: Dict[int, int] = {}
+        self.w_tracks: Dict[int, int] = {}
+        self.dir_tracks: Dict[int, str] = {}
+
+        direction = bot_dir
+        for layer_id, space, width in zip(layers, spaces, widths):
+            self.w_tracks[layer_id] = int(round(width / resolution))
+            self.sp_tracks[layer_id] = int(round((width + space) / resolution))
+            self.dir_tracks[layer_id] = direction
+            direction = 'y' if direction == 'x' else 'x'
+
+
+class MemoryTemplateBase:
+    """
+    In-memory replacement for bag.layout.template.TemplateBase. Only stores the information needed to cache
+    masters and draw their layout; all shapes are committed through MemoryBackend
+    """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        self._temp_db = temp_db
+        self._lib_name = lib_name
+        self._used_names = used_names
+        self.params = dict(params) if params is not None else {}
+        self._finalized = False
+
+    @property
+    def template_db(self) -> 'MemoryTemplateDB':
+        return self._temp_db
+
+    @property
+    def grid(self) -> MemoryRoutingGrid:
+        return self._temp_db.grid
+
+    @property
+    def finalized(self) -> bool:
+        return self._finalized
+
+    @property
+    def key(self) -> tuple:
+        """ Unique key used to cache masters with identical classes and parameters """
+        return self.__class__.__module__, self.__class__.__qualname__, freeze_params(self.params)
+
+    def draw_layout(self):
+        raise NotImplementedError
+
+    def finalize(self):
+        """ Draws the layout of this master. Matches BAG, which draws layouts when masters are finalized """
+        self.draw_layout()
+        self._finalized = True
+
+    def new_template(self, params=None, temp_cls=None, debug=False, **kwargs):
+        return self._temp_db.new_template(params=params, temp_cls=temp_cls, debug=debug, **kwargs)
+
+
+class MemoryTemplateDB:
+    """
+    In-memory replacement for bag.layout.template.TemplateDB. Caches masters by class and parameters and records
+    the masters passed to batch_layout instead of writing them to Virtuoso. The names of all cells ever written are
+    kept in cell_names, so cells can be dropped to free their masters without losing track of what was written
+    """
+
+    def __init__(self, grid: MemoryRoutingGrid, lib_name: str, prj=None):
+        self.grid = grid
+        self._lib_name = lib_name
+        self._prj = prj  # Optional project providing a SKILL interface through prj.impl_db._eval_skill
+        self._used_cell_names = set()
+        self._master_lookup: Dict[tuple, Any] = {}
+        self.cells: Dict[str, Any] = {}
+        self.cell_names: Set[str] = set()
+
+    @property
+    def lib_name(self) -> str:
+        return self._lib_name
+
+    def new_template(self, params=None, temp_cls=None, debug=False, **kwargs):
+        """ Creates a new master, or returns the cached master if an identical one was already created """
+        if params is None:
+            params = {}
+        master = temp_cls(self, self._lib_name, params, self._used_cell_names, **kwargs)
+        key = master.key
+        if key in self._master_lookup:
+            if debug:
+                print('master cached')
+            return self._master_lookup[key]
+        if debug:
+            print('finalizing master')
+        master.finalize()
+        self._master_lookup[key] = master
+        return master
+
+    def batch_layout(self, prj, template_list, name_list=None, lib_name='', debug=False):
+        """ Records the generated masters under their cell names """
+        if name_list is None:
+            name_list = [None] * len(template_list)
+        for idx, (master, name) in enumerate(zip(template_list, name_list)):
+            if name is None:
+                name = '{}_{}'.format(master.__class__.__name__, idx)
+            self.cells[name] = master
+            self.cell_names.add(name)
+
+
+def freeze_params(value):
+    """ Recursively converts a parameter structure into a hashable object """
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze_params(val)) for key, val in value.items()))
+    elif isinstance(value, (list, tuple)):
+        return tuple(freeze_params(val) for val in value)
+    elif isinstance(value, set):
+        return frozenset(freeze_params(val) for val in value)
+    return value
+
+
+class LayoutBackend(metaclass=abc.ABCMeta):
+    """
+    Interface that AyarLayoutGenerator uses to commit its shapes. One backend object is bound to each template
+    """
+
+    def __init__(self, template):
+        self.template = template
+
+    @abc.abstractmethod
+    def add_rect(self, lpp: Tuple[str, str], rect: 'Rectangle',
+                 nx: int = 1, ny: int = 1, spx: float = 0, spy: float = 0) -> None:
+        """ Commits a drawn rectangle on the provided layer purpose pair, arrayed nx by ny times with pitch spx/spy """
+        pass
+
+    @abc.abstractmethod
+    def add_instance(self, master, inst_name: Optional[str], loc, orient: str,
+                     nx: int = 1, ny: int = 1, spx: float = 0, spy: float = 0) -> None:
+        """ Commits an instance of the provided master, arrayed nx by ny times with pitch spx/spy """
+        pass
+
+    @abc.abstractmethod
+    def add_instance_primitive(self, lib_name: str, cell_name: str, loc) -> None:
+        """ Commits an instance of an existing library cell """
+        pass
+
+    @abc.abstractmethod
+    def add_via(self, rect: 'Rectangle', bot_layer: str, top_layer: str, bot_dir: str, extend: bool,
+                nx: int = 1, ny: int = 1, spx: float = 0, spy: float = 0) -> None:
+        """
+        Commits a via filling the provided rectangle between bot_layer and top_layer, arrayed nx by ny times with pitch
+        spx/spy
+        """
+        pass
+
+    @abc.abstractmethod
+    def add_via_primitive(self, via_type, loc, num_rows, num_cols, sp_rows, sp_cols, enc1, enc2, orient) -> None:
+        """ Commits a primitive via array """
+        pass
+
+    @abc.abstractmethod
+    def add_label(self, label: str, layer: str, rect: 'Rectangle') -> None:
+        """ Commits a label on the provided layer """
+        pass
+
+    @abc.abstractmethod
+    def add_pin(self, net_name: str, layer: str, rect: 'Rectangle', show: bool = False) -> None:
+        """ Commits a pin for the provided net """
+        pass
+
+    def add_rects(self, lpp: Tuple[str, str], coords, res: float) -> None:
+        """ Commits an (n, 4) array of [x0, y0, x1, y1] rectangles in resolution units on one layer purpose pair """
+        from ACG.Rectangle import Rectangle
+        for x0, y0, x1, y1 in (coords * res).round(3).tolist():
+            self.add_rect(lpp, Rectangle([[x0, y0], [x1, y1]], lpp, virtual=True))
+
+    def add_vias(self, bot_layer: str, top_layer: str, bot_dir: str, extend: bool, rows, res: float) -> None:
+        """
+        Commits an (n, 8) array of vias between two adjacent metal layers. Each row contains the via region
+        [x0, y0, x1, y1] followed by the array size and pitch [nx, ny, spx, spy], all in resolution units
+        """
+        from ACG.Rectangle import Rectangle
+        for x0, y0, x1, y1, nx, ny, spx, spy in rows.tolist():
+            rect = Rectangle([[round(x0 * res, 3), round(y0 * res, 3)], [round(x1 * res, 3), round(y1 * res, 3)]],
+                             bot_layer, virtual=True)
+            self.add_via(rect, bot_layer, top_layer, bot_dir, extend, nx=nx, ny=ny, spx=round(spx * res, 3),
+                         spy=round(spy * res, 3))
+
+    def get_layer_id(self, layer: str) -> int:
+        return self.template.grid.tech_info.get_layer_id(layer)
+
+    def new_template(self, params=None, temp_cls=None, debug=False, **kwargs):
+        return self.template.template_db.new_template(params=params, temp_cls=temp_cls, debug=debug, **kwargs)
+
+    def eval_skill(self, expr: str):
+        """ Evaluates a SKILL expression through the project attached to the template db """
+        prj = getattr(self.template.template_db, '_prj', None)
+        if prj is None:
+            raise ValueError('A SKILL interface is required to evaluate: {}'.format(expr))
+        return prj.impl_db._eval_skill(expr)
+
+
+class BagBackend(LayoutBackend):
+    """
+    Commits shapes to BAG by calling the TemplateBase methods of the bound template
+    """
+
+    def add_rect(self, lpp, rect, nx=1, ny=1, spx=0, spy=0):
+        TemplateBase.add_rect(self.template, lpp, rect.to_bbox(), nx=nx, ny=ny, spx=spx, spy=spy)
+
+    def add_rects(self, lpp, coords, res):
+        for x0, y0, x1, y1 in coords.tolist():
+            TemplateBase.add_rect(self.template, lpp, BBox(x0, y0, x1, y1, res, unit_mode=True))
+
+    def add_instance(self, master, inst_name, loc, orient, nx=1, ny=1, spx=0, spy=0):
+        TemplateBase.add_instance(self.template, master, inst_name=inst_name, loc=loc, orient=orient,
+                                  nx=nx, ny=ny, spx=spx, spy=spy)
+
+    def add_instance_primitive(self, lib_name, cell_name, loc):
+        TemplateBase.add_instance_primitive(self.template, lib_name=lib_name, cell_name=cell_name, loc=loc)
+
+    def add_via(self, rect, bot_layer, top_layer, bot_dir, extend, nx=1, ny=1, spx=0, spy=0):
+        TemplateBase.add_via(self.template,
+                             bbox=rect.to_bbox(),
+                             bot_layer=bot_layer,
+                             top_layer=top_layer,
+                             bot_dir=bot_dir,
+                             nx=nx,
+                             ny=ny,
+                             spx=spx,
+                             spy=spy,
+                             extend=extend)
+
+    def add_via_primitive(self, via_type, loc, num_rows, num_cols, sp_rows, sp_cols, enc1, enc2, orient):
+        TemplateBase.add_via_primitive(self.template,
+                                       via_type=via_type,
+                                       loc=loc,
+                                       num_rows=num_rows,
+                                       num_cols=num_cols,
+                                       sp_rows=sp_rows,
+                                       sp_cols=sp_cols,
+                                       enc1=enc1,
+                                       enc2=enc2,
+                                       orient=orient)
+
+    def add_label(self, label, layer, rect):
+        TemplateBase.add_label(self.template, label, layer, rect.to_bbox())
+
+    def add_pin(self, net_name, layer, rect, show=False):
+        TemplateBase.add_pin_primitive(self.template, net_name=net_name, layer=layer, bbox=rect.to_bbox(), show=show)
+
+
+class MemoryBackend(LayoutBackend):
+    """
+    Stores committed shapes as plain tuples, so that the resulting layout can be inspected without BAG
+    """
+
+    def __init__(self, template):
+        LayoutBackend.__init__(self, template)
+        self.db = {
+            'rect': [],
+            'instance': [],
+            'prim_instance': [],
+            'via': [],
+            'prim_via': [],
+            'label': [],
+            'pin': []
+        }
+
+    def add_rect(self, lpp, rect, nx=1, ny=1, spx=0, spy=0):
+        if nx == 1 and ny == 1:
+            self.db['rect'].append((lpp, rect.ll.x, rect.ll.y, rect.ur.x, rect.ur.y))
+        else:
+            # Rectangle arrays also record their size and pitch
+            self.db['rect'].append((lpp, rect.ll.x, rect.ll.y, rect.ur.x, rect.ur.y, nx, ny, spx, spy))
+
+    def add_rects(self, lpp, coords, res):
+        self.db['rect'].extend((lpp, x0, y0, x1, y1) for x0, y0, x1, y1 in (coords * res).round(3).tolist())
+
+    def add_instance(self, master, inst_name, loc, orient, nx=1, ny=1, spx=0, spy=0):
+        if nx == 1 and ny == 1:
+            self.db['instance'].append((master, inst_name, (loc[0], loc[1]), orient))
+        else:
+            # Instance arrays also record their size and pitch
+            self.db['instance'].append((master, inst_name, (loc[0], loc[1]), orient, nx, ny, spx, spy))
+
+    def add_instance_primitive(self, lib_name, cell_name, loc):
+        self.db['prim_instance'].append((lib_name, cell_name, (loc[0], loc[1])))
+
+    def add_via(self, rect, bot_layer, top_layer, bot_dir, extend, nx=1, ny=1, spx=0, spy=0):
+        if nx == 1 and ny == 1:
+            self.db['via'].append((bot_layer, top_layer, rect.ll.x, rect.ll.y, rect.ur.x, rect.ur.y, bot_dir, extend))
+        else:
+            # Via arrays also record their size and pitch
+            self.db['via'].append((bot_layer, top_layer, rect.ll.x, rect.ll.y, rect.ur.x, rect.ur.y, bot_dir, extend,
+                                   nx, ny, spx, spy))
+
+    def add_via_primitive(self, via_type, loc, num_rows, num_cols, sp_rows, sp_cols, enc1, enc2, orient):
+        self.db['prim_via'].append((via_type, (loc[0], loc[1]), num_rows, num_cols, sp_rows, sp_cols,
+                                    tuple(enc1), tuple(enc2), orient))
+
+    def add_label(self, label, layer, rect):
+        self.db['label'].append((label, layer, rect.ll.x, rect.ll.y, rect.ur.x, rect.ur.y))
+
+    def add_pin(self, net_name, layer, rect, show=False):
+        self.db['pin'].append((net_name, layer, rect.ll.x, rect.ll.y, rect.ur.x, rect.ur.y, show))
+
+
+# Select the backend implementation
+backend_name = os.environ.get('ACG_BACKEND', 'bag')
+if backend_name == 'bag':
+    try:
+        from bag.layout.template import TemplateBase
+        from bag.layout.util import BBox
+    except ImportError:
+        warnings.warn('BAG could not be imported, falling back to the in-memory ACG backend. Set ACG_BACKEND=memory '
+                      'to select it explicitly')
+        backend_name = 'memory'
+elif backend_name != 'memory':
+    raise ValueError(f"ACG_BACKEND must be 'bag' or 'memory', not {backend_name}")
+
+if backend_name == 'memory':
+    TemplateBase = MemoryTemplateBase
+    BBox = MemoryBBox
+    Backend = MemoryBackend
+else:
+    Backend = BagBackend
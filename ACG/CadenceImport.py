@@ -0,0 +1,258 @@
+"""
+The CadenceImport module transfers raw layout data from Cadence into Python through the SKILL interface. Every
+import writes to its own temporary file so that concurrent imports cannot collide, and parsed results are cached
+by (libname, cellname, modification stamp) in memory and on disk so that repeated imports of an unchanged cell
+don't need a SKILL round-trip. Many cells can be imported at once with import_layouts, which dumps all uncached cells
+in a single SKILL evaluation.
+"""
+import os
+import re
+import tempfile
+import yaml
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Optional, Dict, Tuple, Any, List, Iterable
+
+from ACG import cache
+
+# Use the libyaml based loader when it is available, it is much faster than the pure Python one
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+
+class CadenceLayoutImporter:
+    """
+    Retrieves the raw layout content of Cadence cells, as consumed by CadenceLayoutParser
+    """
+    # Parsed layouts shared by all importers in this process, keyed by (libname, cellname, mod stamp)
+    _mem_cache: Dict[Tuple[str, str, float], dict] = {}
+    # Paths of the layout views on disk, so that checking the stamp of a known cell needs no SKILL round-trip
+    _path_cache: Dict[Tuple[str, str], str] = {}
+    # Version of the on-disk cache files, entries written in another format are ignored
+    _cache_format = 2
+
+    def __init__(self, eval_skill: Callable[[str], Any], use_disk_cache: bool = True):
+        """
+        Parameters
+        ----------
+        eval_skill : Callable[[str], Any]
+            function that evaluates a SKILL expression and returns its result
+        use_disk_cache : bool
+            if True, parsed layouts are also cached on disk so that they can be reused across runs
+        """
+        self.eval_skill = eval_skill
+        self.use_disk_cache = use_disk_cache
+
+    @staticmethod
+    def load_yaml(path: str) -> dict:
+        """ Parses a layout file written by the SKILL interface """
+        with open(path, 'r') as f:
+            return yaml.load(f, Loader=YamlLoader)
+
+    @staticmethod
+    def parse_skill_list(result) -> List[Optional[str]]:
+        """ Splits the string representation of a SKILL list of strings, mapping nil entries to None """
+        if not isinstance(result, str):
+            return []
+        return [None if nil else string
+                for string, nil in re.findall(r'"((?:[^"\\]|\\.)*)"|(nil)', result.strip()[1:-1])]
+
+    def resolve_paths(self, cells: Iterable[Tuple[str, str]]) -> None:
+        """ Looks up the layout view paths of all unknown cells in a single SKILL round-trip """
+        unknown = [cell for cell in cells if cell not in self._path_cache]
+        if not unknown:
+            return
+        expr = 'list( {} )'.format(' '.join('ddGetObj( "%s" "%s" "layout" "layout.oa" )~>readPath' % cell
+                                            for cell in unknown))
+        try:
+            paths = self.parse_skill_list(self.eval_skill(expr))
+        except Exception:
+            return
+        if len(paths) != len(unknown):
+            return
+        for cell, path in zip(unknown, paths):
+            if path is not None:
+                self._path_cache[cell] = path
+
+    def get_mod_stamp(self, libname: str, cellname: str) -> Optional[float]:
+        """
+        Returns the modification time of the layout view of the provided cell, or None if it cannot be determined.
+        Layouts without a modification stamp are never cached
+        """
+        path = self._path_cache.get((libname, cellname))
+        if path is None:
+            expr = 'ddGetObj( "%s" "%s" "layout" "layout.oa" )~>readPath' % (libname, cellname)
+            try:
+                path = self.eval_skill(expr)
+            except Exception:
+                return None
+            if not isinstance(path, str):
+                return None
+            path = path.strip().strip('"')
+            self._path_cache[(libname, cellname)] = path
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+
+    def import_layout(self, libname: str, cellname: str) -> dict:
+        """
+        Returns the raw layout content of the provided cell, using the cache when the layout has not changed
+
+        Parameters
+        ----------
+        libname : str
+            Cadence library name where the cell will be located
+        cellname : str
+            Cadence cell name of the layout to be imported
+
+        Returns
+        -------
+        data : dict
+            raw layout content with rects and labels
+        """
+        stamp = self.get_mod_stamp(libname, cellname)
+        if stamp is not None:
+            data = self._read_cache(libname, cellname, stamp)
+            if data is not None:
+                return data
+
+        data = self._transfer(libname, cellname)
+
+        if stamp is not None:
+            self._write_cache(libname, cellname, stamp, data)
+        return data
+
+    def import_layouts(self,
+                       cells: Iterable[Tuple[str, str]],
+                       max_workers: Optional[int] = None,
+                       use_processes: bool = False
+                       ) -> Dict[Tuple[str, str], dict]:
+        """
+        Returns the raw layout content of many cells. All cells that are not cached are dumped in a single SKILL
+        evaluation, and the resulting files are parsed concurrently
+
+        Parameters
+        ----------
+        cells : Iterable[Tuple[str, str]]
+            (libname, cellname) pairs to be imported
+        max_workers : Optional[int]
+            maximum number of parallel parsers. Uses the executor default if None
+        use_processes : bool
+            if True, parse in a process pool instead of a thread pool. This avoids the GIL for large layouts
+
+        Returns
+        -------
+        data : Dict[Tuple[str, str], dict]
+            raw layout content of each (libname, cellname) pair
+        """
+        cells = list(dict.fromkeys(cells))  # Drop duplicates while preserving order
+        self.resolve_paths(cells)
+
+        results = {}
+        stamps = {}
+        pending = []
+        for libname, cellname in cells:
+            stamp = self.get_mod_stamp(libname, cellname)
+            data = self._read_cache(libname, cellname, stamp) if stamp is not None else None
+            if data is None:
+                stamps[(libname, cellname)] = stamp
+                pending.append((libname, cellname))
+            else:
+                results[(libname, cellname)] = data
+        if not pending:
+            return results
+
+        # Dump all remaining cells with a single SKILL evaluation
+        temp_files = []
+        try:
+            for libname, cellname in pending:
+                fd, temp_file_name = tempfile.mkstemp(prefix='acg_{}_'.format(cellname), suffix='.yaml',
+                                                      dir=os.getcwd())
+                os.close(fd)
+                temp_files.append(temp_file_name)
+            expr = 'progn( {} )'.format(' '.join('parse_cad_layout( "%s" "%s" "%s" )' % (libname, cellname, name)
+                                                 for (libname, cellname), name in zip(pending, temp_files)))
+            self.eval_skill(expr)
+
+            # Parse the dumped files concurrently
+            executor_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+            with executor_cls(max_workers=max_workers) as executor:
+                parsed = list(executor.map(self.load_yaml, temp_files))
+        finally:
+            for temp_file_name in temp_files:
+                if os.path.exists(temp_file_name):
+                    os.remove(temp_file_name)
+
+        for cell, data in zip(pending, parsed):
+            results[cell] = data
+            if stamps[cell] is not None:
+                self._write_cache(cell[0], cell[1], stamps[cell], data)
+        return {cell: results[cell] for cell in cells}
+
+    def _transfer(self, libname: str, cellname: str) -> dict:
+        """ Asks SKILL to dump the layout to a unique temp file, then parses and removes it """
+        fd, temp_file_name = tempfile.mkstemp(prefix='acg_{}_'.format(cellname), suffix='.yaml', dir=os.getcwd())
+        os.close(fd)
+        try:
+            expr = 'parse_cad_layout( "%s" "%s" "%s" )' % (libname, cellname, temp_file_name)
+            self.eval_skill(expr)
+            return self.load_yaml(temp_file_name)
+        finally:
+            if os.path.exists(temp_file_name):
+                os.remove(temp_file_name)
+
+    def _cache_path(self, libname: str, cellname: str, stamp: float) -> Optional[str]:
+        if not self.use_disk_cache:
+            return None
+        try:
+            cache_dir = cache.get_cache_dir('cadence_layout')
+        except OSError:
+            return None
+        return os.path.join(cache_dir, cache.hash_key(libname, cellname, stamp, self._cache_format) + '.json')
+
+    @classmethod
+    def _to_json(cls, data):
+        """ JSON only has string keys, so dicts with other keys (like the indices of rects) are stored as pairs """
+        if isinstance(data, dict):
+            if all(isinstance(key, str) for key in data):
+                return {key: cls._to_json(val) for key, val in data.items()}
+            return {'__items__': [[key, cls._to_json(val)] for key, val in data.items()]}
+        elif isinstance(data, (list, tuple)):
+            return [cls._to_json(val) for val in data]
+        return data
+
+    @classmethod
+    def _from_json(cls, data):
+        """ Reverts _to_json """
+        if isinstance(data, dict):
+            if len(data) == 1 and '__items__' in data:
+                return {key: cls._from_json(val) for key, val in data['__items__']}
+            return {key: cls._from_json(val) for key, val in data.items()}
+        elif isinstance(data, list):
+            return [cls._from_json(val) for val in data]
+        return data
+
+    def _read_cache(self, libname: str, cellname: str, stamp: float) -> Optional[dict]:
+        key = (libname, cellname, stamp)
+        if key in self._mem_cache:
+            return self._mem_cache[key]
+        path = self._cache_path(libname, cellname, stamp)
+        if path is None:
+            return None
+        data = cache.read_json(path)
+        if data is not None:
+            data = self._from_json(data)
+            self._mem_cache[key] = data
+        return data
+
+    def _write_cache(self, libname: str, cellname: str, stamp: float, data: dict) -> None:
+        self._mem_cache[(libname, cellname, stamp)] = data
+        path = self._cache_path(libname, cellname, stamp)
+        if path is not None:
+            try:
+                cache.write_json(path, self._to_json(data))
+            except (OSError, TypeError, ValueError):
+                # The on-disk cache is an optimization, never fail an import because of it
+                pass
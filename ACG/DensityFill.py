@@ -0,0 +1,341 @@
+"""
+The DensityFill module checks and fixes metal density. Coverage of a layer is rasterized on a grid of square pixels,
+and the density of every (possibly overlapping) window is read from a summed-area table in constant time. Dummy fill
+is placed on a regular lattice: lattice sites closer than the required spacing to any obstacle in the generator's
+ObstacleIndex are removed, and under-dense windows receive enough of the remaining sites to reach the target density.
+Selected sites are emitted as RectArrays, so fill only adds a handful of shapes to the database.
+
+Fill rules are read from the optional 'fill' section of the metal_tech in the ACG tech file, e.g.
+
+    fill:
+      M1: {min_density: .2, window: 10, step: 5, fill_size: .5, fill_space: .2, spacing: .2}
+
+and can be overridden by the arguments of DensityFill.
+"""
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from ACG import tech as tech_info
+from ACG.RectArray import RectArray
+from ACG.Rectangle import Rectangle
+
+# Used for the rules that are neither provided nor found in the tech file
+default_rules = {
+    'min_density': .2,
+    'window': 10,
+    'step': None,  # Defaults to half of the window
+    'fill_size': .5,
+    'fill_space': .2,
+    'spacing': .2,
+}
+
+
+def _ceil_div(num: np.ndarray, den: int) -> np.ndarray:
+    return -((-num) // den)
+
+
+class DensityMap:
+    """
+    Coverage of one layer on a pixel grid. A pixel is covered if its center is inside any of the rectangles, so
+    overlapping shapes are not counted twice
+    """
+
+    def __init__(self, rects: np.ndarray, region: Tuple[int, int, int, int], pixel: int):
+        """
+        Parameters
+        ----------
+        rects : np.ndarray
+            (n, 4) array of [x0, y0, x1, y1] shapes in resolution units
+        region : Tuple[int, int, int, int]
+            analyzed region in resolution units
+        pixel : int
+            pixel size in resolution units
+        """
+        self.region = tuple(int(val) for val in region)
+        self.pixel = int(pixel)
+        x0, y0, x1, y1 = self.region
+        self.shape = (max(int(_ceil_div(y1 - y0, pixel)), 1), max(int(_ceil_div(x1 - x0, pixel)), 1))
+        self.coverage = self._rasterize(np.asarray(rects, dtype=np.int64).reshape(-1, 4))
+        # Summed-area table with a leading row and column of zeros
+        self.sat = np.zeros((self.shape[0] + 1, self.shape[1] + 1), dtype=np.int64)
+        self.sat[1:, 1:] = self.coverage.cumsum(axis=0).cumsum(axis=1)
+
+    def __repr__(self):
+        return 'DensityMap(region={}, pixel={}, density={:.3f})'.format(self.region, self.pixel, self.density)
+
+    def _pixel_range(self, lo: np.ndarray, hi: np.ndarray, start: int, num: int) -> Tuple[np.ndarray, np.ndarray]:
+        """ Returns the [first, last) pixels whose centers lie in [lo, hi) """
+        pixel = self.pixel
+        first = _ceil_div(2 * (lo - start) - pixel, 2 * pixel)
+        last = _ceil_div(2 * (hi - start) - pixel, 2 * pixel)
+        return np.clip(first, 0, num), np.clip(last, 0, num)
+
+    def _rasterize(self, rects: np.ndarray) -> np.ndarray:
+        num_y, num_x = self.shape
+        i0, i1 = self._pixel_range(rects[:, 0], rects[:, 2], self.region[0], num_x)
+        j0, j1 = self._pixel_range(rects[:, 1], rects[:, 3], self.region[1], num_y)
+        keep = (i1 > i0) & (j1 > j0)
+        i0, i1, j0, j1 = i0[keep], i1[keep], j0[keep], j1[keep]
+        # Mark the corners of every rectangle in a difference array, then integrate it to count the covering shapes
+        diff = np.zeros((num_y + 1, num_x + 1), dtype=np.int32)
+        np.add.at(diff, (j0, i0), 1)
+        np.add.at(diff, (j0, i1), -1)
+        np.add.at(diff, (j1, i0), -1)
+        np.add.at(diff, (j1, i1), 1)
+        return (diff.cumsum(axis=0).cumsum(axis=1)[:num_y, :num_x] > 0).astype(np.uint8)
+
+    @classmethod
+    def from_generator(cls, gen, layer: str, region=None, pixel: float = .05) -> 'DensityMap':
+        """ Builds the density map of a layer from the obstacle index of a generator """
+        index = gen.get_obstacle_index()
+        if region is None:
+            region = get_region(gen, index)
+        elif not isinstance(region, tuple):
+            region = _to_units(region, gen._res)
+        return cls(index[layer], region, round(pixel / gen._res))
+
+    @property
+    def density(self) -> float:
+        """ Density of the whole region """
+        return float(self.sat[-1, -1]) / self.coverage.size
+
+    def window_sums(self, window: int, step: int, image_sat: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Returns the sums of a summed-area table over all windows of window by window pixels placed every step pixels.
+        Windows are clipped to the map if it is smaller than a window
+        """
+        sat = self.sat if image_sat is None else image_sat
+        num_y, num_x = self.shape
+        win_x, win_y = min(window, num_x), min(window, num_y)
+        xs = np.arange(0, num_x - win_x + 1, step)
+        ys = np.arange(0, num_y - win_y + 1, step)
+        return (sat[ys[:, None] + win_y, xs[None, :] + win_x] - sat[ys[:, None], xs[None, :] + win_x]
+                - sat[ys[:, None] + win_y, xs[None, :]] + sat[ys[:, None], xs[None, :]])
+
+    def window_density(self, window: int, step: int) -> np.ndarray:
+        """ Returns the density of all windows of window by window pixels, placed every step pixels """
+        num_y, num_x = self.shape
+        return self.window_sums(window, step) / float(min(window, num_x) * min(window, num_y))
+
+
+def _to_units(rect, res: float) -> Tuple[int, int, int, int]:
+    if isinstance(rect, Rectangle):
+        coords = (rect.ll.x, rect.ll.y, rect.ur.x, rect.ur.y)
+    else:
+        (x0, y0), (x1, y1) = rect
+        coords = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+    return tuple(int(val) for val in np.rint(np.asarray(coords) / res))
+
+
+def get_region(gen, index) -> Tuple[int, int, int, int]:
+    """ Returns the boundary of a generator in resolution units, or the extent of all of its obstacles """
+    bnd = gen.loc.get('bnd') if isinstance(gen.loc, dict) else None
+    if isinstance(bnd, Rectangle):
+        return _to_units(bnd, gen._res)
+    arrays = [index[layer] for layer in index.layers]
+    if not arrays:
+        raise ValueError('Cannot determine the fill region of an empty layout, provide a region')
+    rects = np.concatenate(arrays)
+    return int(rects[:, 0].min()), int(rects[:, 1].min()), int(rects[:, 2].max()), int(rects[:, 3].max())
+
+
+class DensityFill:
+    """
+    Inserts dummy fill on one layer of a generator so that every window reaches the minimum density
+    """
+
+    def __init__(self, gen, layer: str, region=None, pixel: float = .05, **rules):
+        """
+        Parameters
+        ----------
+        gen : AyarLayoutGenerator
+            layout generator that receives the fill
+        layer : str
+            layer to be filled
+        region : Optional[Union[Rectangle, List[List[float]]]]
+            region to be filled. Defaults to the 'bnd' location of the generator, or the extent of its obstacles
+        pixel : float
+            pixel size of the density maps
+        rules
+            min_density, window, step, fill_size, fill_space and spacing, overriding the tech file
+        """
+        self.gen = gen
+        self.layer = layer
+        self.res = gen._res
+        self.region = region
+        self.pixel = round(pixel / self.res)
+        tech_rules = tech_info.tech_info['metal_tech'].get('fill', {}).get(layer, {})
+        self.rules = {key: rules.get(key, tech_rules.get(key, default)) for key, default in default_rules.items()}
+        if self.rules['step'] is None:
+            self.rules['step'] = self.rules['window'] / 2
+        self.before: Optional[DensityMap] = None  # Density maps before and after the last fill
+        self.after: Optional[DensityMap] = None
+
+    def __repr__(self):
+        return 'DensityFill(layer={}, rules={})'.format(self.layer, self.rules)
+
+    def _pixels(self, value: float) -> int:
+        return max(round(value / self.res / self.pixel), 1)
+
+    def get_low_windows(self, dmap: DensityMap) -> np.ndarray:
+        """ Returns an (n, 4) array of the windows below the minimum density, in resolution units """
+        window, step = self._pixels(self.rules['window']), self._pixels(self.rules['step'])
+        density = dmap.window_density(window, step)
+        ys, xs = np.nonzero(density < self.rules['min_density'])
+        x0, y0 = dmap.region[0] + xs * step * dmap.pixel, dmap.region[1] + ys * step * dmap.pixel
+        size = window * dmap.pixel
+        return np.stack([x0, y0, np.minimum(x0 + size, dmap.region[2]), np.minimum(y0 + size, dmap.region[3])],
+                        axis=1)
+
+    def _free_sites(self, obstacles: np.ndarray, origin: Tuple[int, int], pitch: int, size: int,
+                    shape: Tuple[int, int]) -> np.ndarray:
+        """ Returns a (rows, cols) mask of the lattice sites that are at least spacing away from every obstacle """
+        space = round(self.rules['spacing'] / self.res)
+        blocked = np.zeros((shape[0] + 1, shape[1] + 1), dtype=np.int32)
+        if len(obstacles):
+            # Site k spans [origin + k * pitch, origin + k * pitch + size), and overlaps a bloated obstacle [lo, hi)
+            # for k in [floor((lo - size - origin) / pitch) + 1, ceil((hi - origin) / pitch))
+            lo_x, lo_y = obstacles[:, 0] - space, obstacles[:, 1] - space
+            hi_x, hi_y = obstacles[:, 2] + space, obstacles[:, 3] + space
+            c0 = np.clip((lo_x - size - origin[0]) // pitch + 1, 0, shape[1])
+            c1 = np.clip(_ceil_div(hi_x - origin[0], pitch), 0, shape[1])
+            r0 = np.clip((lo_y - size - origin[1]) // pitch + 1, 0, shape[0])
+            r1 = np.clip(_ceil_div(hi_y - origin[1], pitch), 0, shape[0])
+            keep = (c1 > c0) & (r1 > r0)
+            c0, c1, r0, r1 = c0[keep], c1[keep], r0[keep], r1[keep]
+            np.add.at(blocked, (r0, c0), 1)
+            np.add.at(blocked, (r0, c1), -1)
+            np.add.at(blocked, (r1, c0), -1)
+            np.add.at(blocked, (r1, c1), 1)
+        return blocked.cumsum(axis=0).cumsum(axis=1)[:shape[0], :shape[1]] == 0
+
+    def _site_ratios(self, dmap: DensityMap, free: np.ndarray, centers_x: np.ndarray, centers_y: np.ndarray,
+                     site_area: int) -> np.ndarray:
+        """
+        Returns the fraction of the free sites each site needs to be filled with: for every window, the missing
+        area divided by the area of its free sites, and for every site the maximum over the windows containing it
+        """
+        window, step = self._pixels(self.rules['window']), self._pixels(self.rules['step'])
+        num_y, num_x = dmap.shape
+        # Pixel of every site center, and a summed-area table of the free site centers
+        px = np.clip((centers_x - dmap.region[0]) // dmap.pixel, 0, num_x - 1)
+        py = np.clip((centers_y - dmap.region[1]) // dmap.pixel, 0, num_y - 1)
+        image = np.zeros(dmap.shape, dtype=np.int64)
+        rows, cols = np.nonzero(free)
+        np.add.at(image, (py[rows], px[cols]), 1)
+        image_sat = np.zeros((num_y + 1, num_x + 1), dtype=np.int64)
+        image_sat[1:, 1:] = image.cumsum(axis=0).cumsum(axis=1)
+
+        win_x, win_y = min(window, num_x), min(window, num_y)
+        missing = (self.rules['min_density'] * win_x * win_y - dmap.window_sums(window, step)) * dmap.pixel ** 2
+        available = dmap.window_sums(window, step, image_sat) * site_area
+        ratio = np.where(missing > 0, np.minimum(missing / np.maximum(available, 1), 1), 0)
+
+        # Windows k contain pixel p if k * step <= p < k * step + window
+        def window_range(pix, count, win):
+            first = np.maximum(_ceil_div(pix - win + 1, step), 0)
+            last = np.minimum(pix // step, count - 1)
+            return first, last
+
+        ky0, ky1 = window_range(py, ratio.shape[0], win_y)
+        kx0, kx1 = window_range(px, ratio.shape[1], win_x)
+        site_ratio = np.zeros(free.shape)
+        span = _ceil_div(window, step) + 1
+        for dy in range(span):
+            ky = ky0 + dy
+            valid_y = ky <= ky1
+            for dx in range(span):
+                kx = kx0 + dx
+                valid = valid_y[:, None] & (kx <= kx1)[None, :]
+                values = ratio[np.minimum(ky, ratio.shape[0] - 1)[:, None], np.minimum(kx, ratio.shape[1] - 1)[None, :]]
+                site_ratio = np.maximum(site_ratio, np.where(valid, values, 0))
+        return site_ratio
+
+    def generate(self, passes: int = 2) -> List[RectArray]:
+        """
+        Inserts the fill and returns the created rectangle arrays
+
+        Parameters
+        ----------
+        passes : int
+            number of fill passes. Windows that are still under-dense after a pass receive all of their free sites in
+            the next one
+
+        Returns
+        -------
+        fill : List[RectArray]
+            the created fill arrays
+        """
+        index = self.gen.get_obstacle_index()
+        region = get_region(self.gen, index) if self.region is None else _to_units(self.region, self.res)
+        obstacles = index[self.layer]
+        self.before = DensityMap(obstacles, region, self.pixel)
+
+        size = round(self.rules['fill_size'] / self.res)
+        pitch = size + round(self.rules['fill_space'] / self.res)
+        # Center the fill lattice in the region
+        shape = (max((region[3] - region[1] - size) // pitch + 1, 0), max((region[2] - region[0] - size) // pitch + 1, 0))
+        if shape[0] == 0 or shape[1] == 0:
+            self.after = self.before
+            return []
+        origin = (region[0] + (region[2] - region[0] - size - (shape[1] - 1) * pitch) // 2,
+                  region[1] + (region[3] - region[1] - size - (shape[0] - 1) * pitch) // 2)
+        free = self._free_sites(obstacles, origin, pitch, size, shape)
+        centers_x = origin[0] + np.arange(shape[1]) * pitch + size // 2
+        centers_y = origin[1] + np.arange(shape[0]) * pitch + size // 2
+
+        # Whole lattice rows are selected with a low discrepancy sequence, so that fill stays in long arrays
+        row_threshold = (np.arange(shape[0]) * 0.6180339887498949) % 1
+        selected = np.zeros(shape, dtype=bool)
+        dmap = self.before
+        for num_pass in range(passes):
+            candidates = free & ~selected
+            ratio = self._site_ratios(dmap, candidates, centers_x, centers_y, size * size)
+            if num_pass == 0:
+                new = candidates & (row_threshold[:, None] < ratio)
+            else:
+                new = candidates & (ratio > 0)
+            if not new.any():
+                break
+            selected |= new
+            dmap = DensityMap(np.concatenate([obstacles, self._sites_to_rects(selected, origin, pitch, size)]),
+                              region, self.pixel)
+            if not len(self.get_low_windows(dmap)):
+                break
+        self.after = dmap
+        return self._emit(selected, origin, pitch, size)
+
+    @staticmethod
+    def _sites_to_rects(selected: np.ndarray, origin: Tuple[int, int], pitch: int, size: int) -> np.ndarray:
+        rows, cols = np.nonzero(selected)
+        x0, y0 = origin[0] + cols * pitch, origin[1] + rows * pitch
+        return np.stack([x0, y0, x0 + size, y0 + size], axis=1).astype(np.int64)
+
+    def _emit(self, selected: np.ndarray, origin: Tuple[int, int], pitch: int, size: int) -> List[RectArray]:
+        """ Adds the selected sites as rectangle arrays, merging identical runs of consecutive rows """
+        # Runs of selected sites along each row, found from the edges of the padded mask
+        padded = np.zeros((selected.shape[0], selected.shape[1] + 2), dtype=np.int8)
+        padded[:, 1:-1] = selected
+        edges = np.diff(padded, axis=1)
+        start_rows, start_cols = np.nonzero(edges == 1)
+        _, stop_cols = np.nonzero(edges == -1)
+        runs: Dict[Tuple[int, int], List[int]] = {}  # (first col, length) -> [first row, number of rows]
+        arrays = []
+        for row, col, length in zip(start_rows.tolist(), start_cols.tolist(), (stop_cols - start_cols).tolist()):
+            run = runs.get((col, length))
+            if run is not None and run[0] + run[1] == row:
+                run[1] += 1
+                continue
+            if run is not None:
+                arrays.append((col, length, run[0], run[1]))
+            runs[(col, length)] = [row, 1]
+        arrays.extend((col, length, row, num_rows) for (col, length), (row, num_rows) in runs.items())
+
+        res = self.res
+        fill = []
+        for col, length, row, num_rows in arrays:
+            x0, y0 = origin[0] + col * pitch, origin[1] + row * pitch
+            fill.append(self.gen.add_rect_array(self.layer,
+                                                [[x0 * res, y0 * res], [(x0 + size) * res, (y0 + size) * res]],
+                                                nx=length, ny=num_rows, spx=pitch * res, spy=pitch * res))
+        return fill
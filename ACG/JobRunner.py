@@ -0,0 +1,124 @@
+"""
+The JobRunner module runs independent flow jobs such as simulations concurrently on an asyncio event loop. The number
+of jobs in flight is bounded by a semaphore, and every job reports its own status, runtime and error so that one failing
+job does not abort the others.
+"""
+import time
+import asyncio
+import traceback
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class JobResult:
+    """
+    Outcome of a single job. The status is 'done' when the job returned normally and 'error' when it raised, unless
+    the job returns a JobResult itself to report a more specific status such as 'passed' or 'failed'
+    """
+
+    def __init__(self,
+                 name: Hashable,
+                 status: str = 'done',
+                 value: Any = None,
+                 log_path: Optional[str] = None,
+                 runtime: float = 0.0,
+                 error: Optional[str] = None
+                 ):
+        self.name = name
+        self.status = status
+        self.value = value
+        self.log_path = log_path
+        self.runtime = runtime
+        self.error = error
+
+    def __repr__(self):
+        return 'JobResult(name={}, status={}, runtime={:.3f})'.format(self.name, self.status, self.runtime)
+
+    @property
+    def ok(self) -> bool:
+        return self.status not in ('error', 'failed')
+
+    def to_dict(self) -> dict:
+        """ Returns the result without its value, e.g. to be stored as JSON """
+        return {
+            'name': self.name,
+            'status': self.status,
+            'log_path': self.log_path,
+            'runtime': self.runtime,
+            'error': self.error
+        }
+
+
+async def gather_jobs(jobs: Dict[Hashable, Callable[[], Awaitable]],
+                      max_concurrency: Optional[int] = None,
+                      on_done: Optional[Callable[[JobResult], None]] = None
+                      ) -> Dict[Hashable, JobResult]:
+    """
+    Runs all jobs concurrently with at most max_concurrency of them in flight
+
+    Parameters
+    ----------
+    jobs : Dict[Hashable, Callable[[], Awaitable]]
+        maps each job name to a function that creates the job coroutine. Coroutines are only created once a slot is
+        free, so that setup code at the start of a job also respects the concurrency limit
+    max_concurrency : Optional[int]
+        maximum number of jobs that run at the same time. All jobs are started at once if None
+    on_done : Optional[Callable[[JobResult], None]]
+        called with the result of each job as soon as it finishes
+
+    Returns
+    -------
+    results : Dict[Hashable, JobResult]
+        result of every job, in the order of jobs
+    """
+    semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+    async def run_job(name, job):
+        if semaphore is not None:
+            await semaphore.acquire()
+        start = time.perf_counter()
+        try:
+            value = await job()
+            if isinstance(value, JobResult):
+                result = value
+                result.name = name
+            else:
+                result = JobResult(name, value=value)
+        except Exception:
+            result = JobResult(name, status='error', error=traceback.format_exc())
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+        result.runtime = time.perf_counter() - start
+        if on_done is not None:
+            on_done(result)
+        return result
+
+    results = await asyncio.gather(*(run_job(name, job) for name, job in jobs.items()))
+    return {result.name: result for result in results}
+
+
+def run_coroutine(coro: Awaitable):
+    """ Runs a coroutine to completion on the current thread's event loop, creating one if needed """
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+    if loop.is_closed():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+    return loop.run_until_complete(coro)
+
+
+def run_jobs(jobs: Dict[Hashable, Callable[[], Awaitable]],
+             max_concurrency: Optional[int] = None,
+             on_done: Optional[Callable[[JobResult], None]] = None
+             ) -> Dict[Hashable, JobResult]:
+    """ Blocking version of gather_jobs """
+    return run_coroutine(gather_jobs(jobs, max_concurrency=max_concurrency, on_done=on_done))
+
+
+async def run_blocking(func: Callable, *args):
+    """ Awaits a blocking function by running it in the default thread pool executor """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, func, *args)
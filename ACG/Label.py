@@ -14,6 +14,7 @@ class Label(VirtualObj):
     Primitive class to describe a label on xy plane and various associated utility functions
     Keeps all coordinates on the grid
     """
+    __slots__ = ('_res', '_xy', '_name', '_layer')
 
     def __init__(self,
                  name,
@@ -22,7 +23,7 @@ class Label(VirtualObj):
                  res=.001  # type: float
                  ):
 
-        VirtualObj.__init__(self)
+        # Label does not store a location dictionary, so VirtualObj's constructor is not called
         # Set the resolution of the grid
         self._res = res
         self._xy = XY(xy)
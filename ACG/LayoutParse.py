@@ -1,4 +1,4 @@
-from ACG.Rectangle import Rectangle
+from ACG.Rectangle import Rectangle, intern_lpp
 from ACG.Label import Label
 from typing import Dict
 
@@ -107,4 +107,4 @@ class CadenceLayoutParser:
         layer : tuple[str, str]
             Layer purpose pair
         """
-        return tuple(layer_str.split())
+        return intern_lpp(*layer_str.split())
@@ -0,0 +1,527 @@
+"""
+The LayoutSnapshot module serializes the state of a generated layout (its shape database, location dict, blockages,
+pins and tracks) into a compact versioned binary format, e.g. to send results between worker processes or to cache
+templates on disk. Instead of pickling the graph of Rectangle and XY objects, all coordinates are stored as integer
+columns in units of the grid resolution, layer purpose pairs and other strings are interned, instances refer to their
+master by class and parameters, and objects in the location dict are stored as indices into the shape tables.
+
+A snapshot consists of an 8 byte magic string, the format version and the length of a JSON header, followed by the
+header and the raw column buffers, each aligned to 8 bytes. Columns are decoded as views into the buffer without copies.
+"""
+import os
+import json
+import struct
+import tempfile
+import importlib
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ACG.XY import XY
+from ACG.Rectangle import Rectangle, intern_lpp
+from ACG.RectArray import RectArray
+from ACG.Via import ViaStack, ViaArray, Via
+from ACG.VirtualInst import VirtualInst
+from ACG.VirtualInstArray import VirtualInstArray
+from ACG.Track import Track
+
+MAGIC = b'ACGSNAP\x00'
+FORMAT_VERSION = 1
+_prefix = struct.Struct('<8sIQ')  # magic, format version, header length
+
+# Flags stored for every rectangle
+_VIRTUAL = 1
+_IN_DB = 2
+
+
+class LayoutSnapshot:
+    """
+    Columnar representation of the state of an AyarLayoutGenerator. Create it with from_generator or from_bytes, and
+    apply it to a generator with restore
+    """
+
+    def __init__(self, header: dict, arrays: Dict[str, np.ndarray]):
+        """
+        Parameters
+        ----------
+        header : dict
+            JSON compatible description of the layout, referring to the arrays by name
+        arrays : Dict[str, np.ndarray]
+            column arrays of the snapshot
+        """
+        self.header = header
+        self.arrays = arrays
+
+    def __repr__(self):
+        return 'LayoutSnapshot(cls={}, rects={}, vias={}, instances={})'.format(
+            '.'.join(self.header['cls']), len(self.arrays['rect']), len(self.arrays['via']),
+            len(self.arrays['inst']))
+
+    """ Encoding """
+
+    @classmethod
+    def from_generator(cls, gen) -> 'LayoutSnapshot':
+        """ Captures the current state of a generator """
+        return _Encoder(gen).encode()
+
+    def to_bytes(self) -> bytes:
+        """ Returns the binary representation of the snapshot """
+        header = dict(self.header)
+        layout = {}
+        buffers = []
+        offset = 0
+        for name, arr in self.arrays.items():
+            arr = np.ascontiguousarray(arr)
+            layout[name] = [offset, arr.dtype.str, list(arr.shape)]
+            buffers.append(arr.tobytes())
+            pad = -arr.nbytes % 8
+            if pad:
+                buffers.append(b'\x00' * pad)
+            offset += arr.nbytes + pad
+        header['arrays'] = layout
+        header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        header_bytes += b' ' * (-(_prefix.size + len(header_bytes)) % 8)
+        return b''.join([_prefix.pack(MAGIC, FORMAT_VERSION, len(header_bytes)), header_bytes] + buffers)
+
+    def save(self, path: str) -> None:
+        """ Atomically writes the snapshot to a file, so that concurrent readers never see a partial snapshot """
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.to_bytes())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    """ Decoding """
+
+    @classmethod
+    def from_bytes(cls, data) -> 'LayoutSnapshot':
+        """ Reads a snapshot from a bytes-like object. Arrays are views into data """
+        buf = memoryview(data)
+        if len(buf) < _prefix.size:
+            raise ValueError('Data is too short to be a layout snapshot')
+        magic, version, header_len = _prefix.unpack_from(buf)
+        if magic != MAGIC:
+            raise ValueError('Data is not a layout snapshot')
+        if version > FORMAT_VERSION:
+            raise ValueError('Layout snapshot format {} is newer than the supported format {}'.format(
+                version, FORMAT_VERSION))
+        start = _prefix.size + header_len
+        header = json.loads(bytes(buf[_prefix.size:start]).decode('utf-8'))
+        arrays = {}
+        for name, (offset, dtype, shape) in header.pop('arrays').items():
+            count = int(np.prod(shape))
+            arrays[name] = np.frombuffer(buf, dtype=dtype, count=count, offset=start + offset).reshape(shape)
+        return cls(header, arrays)
+
+    @classmethod
+    def load(cls, path: str) -> 'LayoutSnapshot':
+        """ Reads a snapshot from a file, memory mapping its content """
+        return cls.from_bytes(np.memmap(path, dtype=np.uint8, mode='r'))
+
+    def restore(self, gen, resolve_master: Optional[Callable] = None) -> None:
+        """
+        Replaces the shapes, location dict, blockages, pins and tracks of a generator with the content of the snapshot.
+        The generator can then be committed without running its layout_procedure
+
+        Parameters
+        ----------
+        gen : AyarLayoutGenerator
+            generator receiving the state. It is usually a new, not yet drawn, instance of the class that was saved
+        resolve_master : Optional[Callable]
+            called as resolve_master(module, qualname, params) with the module and qualified name of the master class
+            to obtain the master of instances. Defaults to importing the class and calling gen.new_template, which
+            returns cached masters when they already exist. Provide it for master classes that cannot be imported by
+            name, such as classes defined in __main__ or created at runtime
+        """
+        _Decoder(self, gen, resolve_master).decode()
+
+
+class _Encoder:
+    """ Flattens the objects of a generator into the columns of a snapshot """
+
+    def __init__(self, gen):
+        self.gen = gen
+        self.res = gen._res
+        self.strings: Dict[str, int] = {}
+        self.lpps: Dict[Tuple[str, str], int] = {}
+        self.rects: List[Rectangle] = []
+        self.rect_ids: Dict[int, int] = {}
+        self.rect_flags: List[int] = []
+        self.rect_arrays: Dict[int, int] = {}
+        self.vias: Dict[int, int] = {}
+        self.prim_vias: Dict[int, int] = {}
+        self.insts: List[VirtualInst] = []
+        self.inst_ids: Dict[int, int] = {}
+        self.inst_in_db: List[int] = []
+        self.masters: List[list] = []
+        self.master_ids: Dict[int, int] = {}
+        self.tracks: List[list] = []
+        self.track_ids: Dict[int, int] = {}
+        self.extra: List[np.ndarray] = []
+
+    def string(self, value: Optional[str]) -> int:
+        """ Returns the index of an interned string. None is stored as -1 """
+        if value is None:
+            return -1
+        return self.strings.setdefault(value, len(self.strings))
+
+    def lpp(self, lpp: Tuple[str, str]) -> int:
+        return self.lpps.setdefault(lpp, len(self.lpps))
+
+    def rect(self, rect: Rectangle, in_db: bool = False) -> int:
+        """ Returns the index of a rectangle in the rectangle table, adding it if needed """
+        key = id(rect)
+        idx = self.rect_ids.get(key)
+        if idx is None:
+            idx = self.rect_ids[key] = len(self.rects)
+            self.rects.append(rect)
+            self.rect_flags.append(_VIRTUAL if rect.virtual else 0)
+        if in_db:
+            self.rect_flags[idx] |= _IN_DB
+        return idx
+
+    def master(self, master) -> int:
+        key = id(master)
+        idx = self.master_ids.get(key)
+        if idx is None:
+            params = getattr(master, 'params', None) or {}
+            try:
+                params = json.loads(json.dumps(params, default=_to_json))
+            except TypeError as e:
+                raise TypeError('Parameters of master {} cannot be serialized: {}'.format(
+                    master.__class__.__name__, e))
+            idx = self.master_ids[key] = len(self.masters)
+            self.masters.append([master.__class__.__module__, master.__class__.__qualname__, params])
+        return idx
+
+    def inst(self, inst: VirtualInst, in_db: bool = False) -> int:
+        key = id(inst)
+        idx = self.inst_ids.get(key)
+        if idx is None:
+            idx = self.inst_ids[key] = len(self.insts)
+            self.insts.append(inst)
+            self.inst_in_db.append(0)
+        if in_db:
+            self.inst_in_db[idx] = 1
+        return idx
+
+    def track(self, track: Track, name: Optional[str] = None) -> int:
+        key = id(track)
+        idx = self.track_ids.get(key)
+        if idx is None:
+            idx = self.track_ids[key] = len(self.tracks)
+            self.tracks.append([name, track.dim, track._spacing, track._origin])
+        return idx
+
+    def value(self, obj) -> Any:
+        """ Encodes a location dict entry as a JSON compatible value """
+        if obj is None or isinstance(obj, (bool, int, float, str)):
+            return obj
+        if isinstance(obj, RectArray):
+            if id(obj) not in self.rect_arrays:
+                raise TypeError('Rectangle arrays in the location dict must be added to the generator')
+            return {'$': 'a', 'i': self.rect_arrays[id(obj)]}
+        if isinstance(obj, Rectangle):
+            return {'$': 'r', 'i': self.rect(obj)}
+        if isinstance(obj, XY):
+            return {'$': 'xy', 'v': [obj._x, obj._y]}
+        if isinstance(obj, ViaStack):
+            if id(obj) not in self.vias:
+                raise TypeError('Via stacks in the location dict must be added to the generator')
+            return {'$': 'v', 'i': self.vias[id(obj)]}
+        if isinstance(obj, Via):
+            if id(obj) not in self.prim_vias:
+                raise TypeError('Vias in the location dict must be added to the generator')
+            return {'$': 'p', 'i': self.prim_vias[id(obj)]}
+        if isinstance(obj, VirtualInst):
+            return {'$': 'i', 'i': self.inst(obj)}
+        if isinstance(obj, Track):
+            return {'$': 'k', 'i': self.track(obj)}
+        if isinstance(obj, np.ndarray):
+            self.extra.append(obj)
+            return {'$': 'n', 'i': len(self.extra) - 1}
+        if isinstance(obj, np.generic):
+            return obj.item()
+        if isinstance(obj, list):
+            return [self.value(item) for item in obj]
+        if isinstance(obj, tuple):
+            return {'$': 't', 'v': [self.value(item) for item in obj]}
+        if isinstance(obj, dict):
+            if all(isinstance(key, str) for key in obj) and '$' not in obj:
+                return {key: self.value(item) for key, item in obj.items()}
+            return {'$': 'd', 'v': [[self.value(key), self.value(item)] for key, item in obj.items()]}
+        raise TypeError('{} in the location dict cannot be serialized'.format(type(obj).__name__))
+
+    def encode(self) -> LayoutSnapshot:
+        gen = self.gen
+        res = self.res
+        db = gen._db
+        for rect in db['rect']:
+            self.rect(rect, in_db=True)
+        for name, track in gen.tracks.tracks.items():
+            self.track(track, name)
+
+        # Rectangle arrays
+        rect_array = np.zeros((len(db['rect_array']), 10), dtype=np.int64)
+        for idx, arr in enumerate(db['rect_array']):
+            self.rect_arrays[id(arr)] = idx
+            rect_array[idx] = (arr.ll._x, arr.ll._y, arr.ur._x, arr.ur._y, arr.nx, arr.ny, round(arr.spx / res),
+                               round(arr.spy / res), self.lpp(arr.lpp), arr.virtual)
+
+        # Via stacks: [rect1, rect2, overlap, size x, size y, bottom is rect1, extend, bot_dir, pairs, nx, ny, spx, spy]
+        pairs: Dict[tuple, int] = {}
+        via = np.zeros((len(db['via']), 13), dtype=np.int64)
+        for idx, stack in enumerate(db['via']):
+            self.vias[id(stack)] = idx
+            size = [-1 if val is None else val for val in stack.size]
+            array = (stack.nx, stack.ny, round(stack.spx / res), round(stack.spy / res)) \
+                if isinstance(stack, ViaArray) else (0, 0, 0, 0)
+            key = tuple(stack.metal_pairs)
+            via[idx] = (self.rect(stack.rect1), self.rect(stack.rect2), self.rect(stack.loc['overlap']),
+                        size[0], size[1], stack.loc['bottom'] is stack.rect1, stack.extend,
+                        self.string(stack.bot_dir), pairs.setdefault(key, len(pairs))) + array
+
+        # Primitive vias: [via_id, bbox, size x, size y, orient] and [sp_rows, sp_cols, enc_bot, enc_top]
+        prim_via = np.zeros((len(db['prim_via']), 5), dtype=np.int64)
+        prim_via_float = np.zeros((len(db['prim_via']), 10), dtype=np.float64)
+        for idx, prim in enumerate(db['prim_via']):
+            self.prim_vias[id(prim)] = idx
+            size = [-1 if val is None else val for val in prim.size]
+            prim_via[idx] = (self.string(prim.via_id), self.rect(prim.loc['overlap']), size[0], size[1],
+                             self.string(prim.orient))
+            prim_via_float[idx] = [prim.sp_rows, prim.sp_cols] + list(prim.enc_bot) + list(prim.enc_top)
+
+        for inst in db['instance']:
+            self.inst(inst, in_db=True)
+        loc = self.value(gen.loc)
+        boundary = self.rect(gen.temp_boundary)
+
+        # Instances: [master, x, y, orient, name, in db, nx, ny, spx, spy]. Instances referenced from the location
+        # dict are added while it is encoded, so the table is built last
+        inst = np.zeros((len(self.insts), 10), dtype=np.int64)
+        for idx, obj in enumerate(self.insts):
+            array = (obj.nx, obj.ny, round(obj.spx / res), round(obj.spy / res)) \
+                if isinstance(obj, VirtualInstArray) else (0, 0, 0, 0)
+            inst[idx] = (self.master(obj.master), obj.origin._x, obj.origin._y, self.string(obj.orient),
+                         self.string(obj.inst_name), self.inst_in_db[idx]) + array
+
+        # Rectangles: [x0, y0, x1, y1, cx, cy, lpp, flags]
+        rect = np.zeros((len(self.rects), 8), dtype=np.int64)
+        for idx, (obj, flags) in enumerate(zip(self.rects, self.rect_flags)):
+            ll, ur, center = obj.ll, obj.ur, obj.loc['c']
+            rect[idx] = (ll._x, ll._y, ur._x, ur._y, center._x, center._y, self.lpp(obj.lpp), flags)
+
+        arrays = {'rect': rect, 'rect_array': rect_array, 'via': via, 'prim_via': prim_via,
+                  'prim_via_float': prim_via_float, 'inst': inst}
+        obs = {}
+        for layer, rects in gen.obs.items():
+            obs[layer] = 'obs{}'.format(len(obs))
+            arrays[obs[layer]] = np.asarray(rects, dtype=np.int64).reshape(-1, 4)
+        pins = []
+        pin_rects = []
+        for net, layer, rects in gen.pins.items():
+            pins.append([net, layer, len(rects)])
+            pin_rects.append(rects)
+        arrays['pins'] = np.concatenate(pin_rects) if pin_rects else np.zeros((0, 4), dtype=np.int64)
+        for idx, arr in enumerate(self.extra):
+            arrays['extra{}'.format(idx)] = arr
+        store = None
+        if getattr(gen, 'shapes', None) is not None:
+            arrays['store_rect'] = gen.shapes.rects.view()
+            arrays['store_via'] = gen.shapes.vias.view()
+            store = {'lpps': [list(lpp) for lpp in gen.shapes.lpps],
+                     'via_types': [list(via_type) for via_type in gen.shapes.via_types]}
+
+        header = {
+            'cls': [gen.__class__.__module__, gen.__class__.__qualname__],
+            'res': res,
+            'strings': list(self.strings),
+            'lpps': [list(lpp) for lpp in self.lpps],
+            'metal_pairs': [[list(pair) for pair in key] for key in pairs],
+            'masters': self.masters,
+            'tracks': self.tracks,
+            'obs': obs,
+            'pins': pins,
+            'boundary': boundary,
+            'loc': loc,
+            'store': store,
+        }
+        return LayoutSnapshot(header, arrays)
+
+
+class _Decoder:
+    """ Rebuilds the objects of a generator from the columns of a snapshot """
+
+    def __init__(self, snapshot: LayoutSnapshot, gen, resolve_master: Optional[Callable]):
+        self.header = snapshot.header
+        self.arrays = snapshot.arrays
+        self.gen = gen
+        self.res = self.header['res']
+        self.resolve_master = resolve_master if resolve_master is not None else self._new_template
+        self.strings = self.header['strings']
+
+    def _new_template(self, module: str, qualname: str, params: dict):
+        temp_cls = importlib.import_module(module)
+        for attr in qualname.split('.'):
+            temp_cls = getattr(temp_cls, attr)
+        return self.gen.new_template(params=params, temp_cls=temp_cls)
+
+    def string(self, idx: int) -> Optional[str]:
+        return None if idx < 0 else self.strings[idx]
+
+    def decode(self) -> None:
+        header, arrays, gen, res = self.header, self.arrays, self.gen, self.res
+        lpps = [intern_lpp(layer, purpose) for layer, purpose in header['lpps']]
+
+        # Rectangles are created directly from grid units, without re-conditioning every coordinate
+        rects = []
+        in_db = []
+        from_units = XY.from_units
+        for x0, y0, x1, y1, cx, cy, lpp, flags in arrays['rect'].tolist():
+            rect = Rectangle.__new__(Rectangle)
+            Rectangle._num_created += 1
+            rect._ll = from_units(x0, y0, res)
+            rect._ur = from_units(x1, y1, res)
+            rect._lpp = lpps[lpp]
+            rect.virtual = bool(flags & _VIRTUAL)
+            rect.set_units(x0, y0, x1, y1, cx, cy)
+            rects.append(rect)
+            if flags & _IN_DB:
+                in_db.append(rect)
+        self.rects = rects
+
+        self.rect_arrays = []
+        for x0, y0, x1, y1, nx, ny, spx, spy, lpp, virtual in arrays['rect_array'].tolist():
+            self.rect_arrays.append(RectArray([[x0 * res, y0 * res], [x1 * res, y1 * res]], lpps[lpp], nx=nx, ny=ny,
+                                              spx=spx * res, spy=spy * res, virtual=bool(virtual)))
+
+        # Via stacks are restored without recomputing them from the technology
+        metal_pairs = [[tuple(pair) for pair in key] for key in header['metal_pairs']]
+        self.vias = []
+        for r1, r2, overlap, sx, sy, bottom_first, extend, bot_dir, pairs, nx, ny, spx, spy in arrays['via'].tolist():
+            if nx:
+                stack = ViaArray.__new__(ViaArray)
+                stack.nx, stack.ny, stack.spx, stack.spy = nx, ny, round(spx * res, 3), round(spy * res, 3)
+            else:
+                stack = ViaStack.__new__(ViaStack)
+            stack.rect1, stack.rect2 = rects[r1], rects[r2]
+            stack.size = (None if sx < 0 else sx, None if sy < 0 else sy)
+            stack.extend = bool(extend)
+            stack.bot_dir = self.string(bot_dir)
+            stack.metal_pairs = list(metal_pairs[pairs])
+            bottom, top = (stack.rect1, stack.rect2) if bottom_first else (stack.rect2, stack.rect1)
+            stack.loc = {'top': top, 'bottom': bottom, 'overlap': rects[overlap], 'rect_list': []}
+            self.vias.append(stack)
+
+        self.prim_vias = []
+        for (via_id, bbox, sx, sy, orient), values in zip(arrays['prim_via'].tolist(),
+                                                          arrays['prim_via_float'].tolist()):
+            prim = Via(self.string(via_id), rects[bbox], size=(None if sx < 0 else sx, None if sy < 0 else sy))
+            prim.sp_rows, prim.sp_cols = values[0], values[1]
+            prim.enc_bot, prim.enc_top = values[2:6], values[6:10]
+            prim.orient = self.string(orient)
+            self.prim_vias.append(prim)
+
+        masters = {}
+        self.insts = []
+        inst_in_db = []
+        for master, x, y, orient, name, db_flag, nx, ny, spx, spy in arrays['inst'].tolist():
+            if master not in masters:
+                module, qualname, params = header['masters'][master]
+                masters[master] = self.resolve_master(module, qualname, params)
+            origin = from_units(x, y, res)
+            if nx:
+                inst = VirtualInstArray(masters[master], origin=origin, orient=self.string(orient),
+                                        inst_name=self.string(name), nx=nx, ny=ny, spx=round(spx * res, 3),
+                                        spy=round(spy * res, 3))
+            else:
+                inst = VirtualInst(masters[master], origin=origin, orient=self.string(orient),
+                                   inst_name=self.string(name))
+            self.insts.append(inst)
+            if db_flag:
+                inst_in_db.append(inst)
+
+        self.tracks = []
+        for name, dim, spacing, origin in header['tracks']:
+            track = Track.__new__(Track)
+            track._res = res
+            track._dim, track._spacing, track._origin = dim, spacing, origin
+            self.tracks.append(track)
+            if name is not None:
+                gen.tracks.tracks[name] = track
+
+        gen._db['rect'] = in_db
+        gen._db['rect_array'] = self.rect_arrays
+        gen._db['via'] = self.vias
+        gen._db['prim_via'] = self.prim_vias
+        gen._db['instance'] = inst_in_db
+        gen.loc = self.value(header['loc'])
+        gen.temp_boundary = rects[header['boundary']]
+        gen.obs = {layer: arrays[name] for layer, name in header['obs'].items()}
+        start = 0
+        for net, layer, count in header['pins']:
+            gen.pins.add(net, layer, arrays['pins'][start:start + count])
+            start += count
+        if header.get('store') is not None:
+            self.restore_store(header['store'])
+
+    def restore_store(self, info: dict) -> None:
+        """ Appends the shapes of the out-of-core store to the shape store of the generator """
+        store = self.gen.use_shape_store()
+        lpp_ids = np.array([store.lpp_id(tuple(lpp)) for lpp in info['lpps']] or [0], dtype=np.int64)
+        via_ids = np.array([store.via_type_id(*via_type) for via_type in info['via_types']] or [0], dtype=np.int64)
+        rects = np.array(self.arrays['store_rect'])
+        rects[:, 4] = lpp_ids[rects[:, 4]]
+        store.rects.extend(rects)
+        vias = np.array(self.arrays['store_via'])
+        vias[:, 4] = via_ids[vias[:, 4]]
+        store.vias.extend(vias)
+        store._update_bounds_array(rects[:, :4])
+        # Via arrays extend beyond their first element
+        extent = (vias[:, 5:7] - 1) * vias[:, 7:9]
+        store._update_bounds_array(np.concatenate([vias[:, :2], vias[:, 2:4] + extent], axis=1))
+
+    def value(self, obj) -> Any:
+        """ Decodes a location dict entry """
+        if isinstance(obj, list):
+            return [self.value(item) for item in obj]
+        if not isinstance(obj, dict):
+            return obj
+        tag = obj.get('$')
+        if tag is None:
+            return {key: self.value(item) for key, item in obj.items()}
+        if tag == 'r':
+            return self.rects[obj['i']]
+        if tag == 'a':
+            return self.rect_arrays[obj['i']]
+        if tag == 'xy':
+            return XY.from_units(obj['v'][0], obj['v'][1], self.res)
+        if tag == 'v':
+            return self.vias[obj['i']]
+        if tag == 'p':
+            return self.prim_vias[obj['i']]
+        if tag == 'i':
+            return self.insts[obj['i']]
+        if tag == 'k':
+            return self.tracks[obj['i']]
+        if tag == 'n':
+            return self.arrays['extra{}'.format(obj['i'])]
+        if tag == 't':
+            return tuple(self.value(item) for item in obj['v'])
+        if tag == 'd':
+            return {self.value(key): self.value(item) for key, item in obj['v']}
+        raise ValueError('Unknown entry {} in layout snapshot'.format(tag))
+
+
+def _to_json(value):
+    """ Converts numpy values in master parameters to JSON compatible values """
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError('{} is not JSON serializable'.format(type(value).__name__))
@@ -0,0 +1,119 @@
+"""
+The LayoutStats module implements a lightweight profiler that records how long each phase of draw_layout takes and how
+many shapes and primitive objects a layout generator creates.
+
+Allocation tracking with tracemalloc is expensive, so it is only enabled when the 'ACG_TRACK_ALLOC' environment
+variable is set to a non-zero value, or when LayoutStats.track_alloc is set to True.
+"""
+import os
+import time
+import json
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+
+class LayoutStats:
+    """
+    Stores per-phase wall time, shape counts, primitive object counts and optional allocation sizes for a single
+    template. Timings and object counts are inclusive: masters created inside layout_procedure are counted in their
+    parent as well as in their own stats
+    """
+    track_alloc = os.environ.get('ACG_TRACK_ALLOC', '0') not in ('', '0')
+
+    # Classes whose constructor increments a _num_created counter. Registered by the classes themselves
+    counted_classes = []
+
+    def __init__(self, name: str = ''):
+        self.name = name
+        self.times: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.objects: Dict[str, int] = {}
+        self.alloc: Dict[str, int] = {}
+
+    def __repr__(self):
+        return 'LayoutStats(name={}, total_time={:.6f})'.format(self.name, self.total_time)
+
+    @classmethod
+    def register(cls, obj_cls):
+        """ Class decorator that adds a primitive class to the list of counted object types """
+        obj_cls._num_created = 0
+        cls.counted_classes.append(obj_cls)
+        return obj_cls
+
+    @property
+    def total_time(self) -> float:
+        return sum(self.times.values())
+
+    @contextmanager
+    def timer(self, phase: str):
+        """ Adds the wall time spent inside the context to the provided phase """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[phase] = self.times.get(phase, 0) + time.perf_counter() - start
+
+    @contextmanager
+    def track_objects(self, phase: str):
+        """ Records the number of primitive objects, and optionally bytes allocated, inside the context """
+        before = {obj_cls.__name__: obj_cls._num_created for obj_cls in self.counted_classes}
+        started = False
+        if self.track_alloc:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started = True
+            mem_before = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            for obj_cls in self.counted_classes:
+                name = obj_cls.__name__
+                self.objects[name] = self.objects.get(name, 0) + obj_cls._num_created - before[name]
+            if self.track_alloc:
+                current, peak = tracemalloc.get_traced_memory()
+                self.alloc[phase + '_net'] = self.alloc.get(phase + '_net', 0) + current - mem_before
+                if started:
+                    self.alloc[phase + '_peak'] = max(self.alloc.get(phase + '_peak', 0), peak - mem_before)
+                    tracemalloc.stop()
+
+    def count(self, key: str, num: int = 1) -> None:
+        """ Increments the shape counter of the provided key """
+        self.counts[key] = self.counts.get(key, 0) + num
+
+    def merge(self, other: 'LayoutStats') -> 'LayoutStats':
+        """ Adds the timings and counts of another stats object to this one """
+        for attr in ('times', 'counts', 'objects', 'alloc'):
+            mine = getattr(self, attr)
+            for key, val in getattr(other, attr).items():
+                if key.endswith('_peak'):
+                    mine[key] = max(mine.get(key, 0), val)
+                else:
+                    mine[key] = mine.get(key, 0) + val
+        return self
+
+    @classmethod
+    def aggregate(cls, stats_list: Iterable['LayoutStats'], name: str = 'total') -> 'LayoutStats':
+        """ Returns a new stats object containing the sum of all provided stats """
+        total = cls(name=name)
+        for stats in stats_list:
+            total.merge(stats)
+        return total
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'total_time': self.total_time,
+            'times': dict(self.times),
+            'counts': dict(self.counts),
+            'objects': dict(self.objects),
+            'alloc': dict(self.alloc)
+        }
+
+    def dump(self, path: Optional[str] = None) -> str:
+        """ Returns the stats as a JSON string, and writes it to path if provided """
+        content = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(content)
+        return content
@@ -0,0 +1,189 @@
+"""
+The LefParse module reads MACRO definitions from LEF files without any external conversion step. Files are tokenized
+line by line and macros are yielded one at a time, so arbitrarily large LEFs are read in a single pass while only
+holding the macro currently being parsed in memory.
+"""
+from typing import Iterator, Tuple, Dict, List, Optional
+
+# Top level LEF sections that contain nothing needed for abstracts. Named sections are closed with 'END <name>',
+# keyword sections with 'END <keyword>'
+_NAMED_BLOCKS = {'LAYER', 'VIA', 'VIARULE', 'SITE', 'NONDEFAULTRULE', 'ARRAY'}
+_KEYWORD_BLOCKS = {'UNITS', 'PROPERTYDEFINITIONS', 'SPACING', 'NOISETABLE', 'CORRECTIONTABLE', 'IRDROP',
+                   'DIELECTRIC'}
+
+
+class LefParser:
+    """
+    Streaming reader for the MACRO section of LEF files. Each macro is converted to the cell description used by
+    AbstractLibrary.from_cells: {'size': [[x0, y0], [x1, y1]], 'pins': {pin: {layer: [xy, ...]}},
+    'obs': {layer: [xy, ...]}}, with all coordinates in microns and shifted by the macro ORIGIN
+    """
+
+    def __init__(self, lef_file: str):
+        """
+        Parameters
+        ----------
+        lef_file : str
+            path to the LEF file to be read
+        """
+        self.lef_file = lef_file
+
+    def tokens(self) -> Iterator[str]:
+        """ Yields every token of the file. Comments are dropped and quoted strings are returned as single tokens """
+        with open(self.lef_file, 'r') as f:
+            quoted: Optional[List[str]] = None  # Pieces of a quoted string that spans multiple lines
+            for line in f:
+                if quoted is None and '"' not in line and '#' not in line:
+                    # Fast path for the vast majority of lines
+                    for token in line.split():
+                        if len(token) > 1 and token.endswith(';'):
+                            yield token[:-1]
+                            yield ';'
+                        else:
+                            yield token
+                    continue
+                pos = 0
+                while pos < len(line):
+                    if quoted is not None:
+                        end = line.find('"', pos)
+                        if end < 0:
+                            quoted.append(line[pos:])
+                            break
+                        quoted.append(line[pos:end + 1])
+                        yield ''.join(quoted)
+                        quoted = None
+                        pos = end + 1
+                        continue
+                    char = line[pos]
+                    if char.isspace():
+                        pos += 1
+                    elif char == '#':
+                        break
+                    elif char == '"':
+                        quoted = ['"']
+                        pos += 1
+                    else:
+                        end = pos
+                        while end < len(line) and not line[end].isspace() and line[end] not in '"#':
+                            end += 1
+                        token = line[pos:end]
+                        if len(token) > 1 and token.endswith(';'):
+                            yield token[:-1]
+                            yield ';'
+                        else:
+                            yield token
+                        pos = end
+
+    def iter_macros(self) -> Iterator[Tuple[str, dict]]:
+        """ Yields (macro name, cell description) for every MACRO in the file, in file order """
+        tokens = self.tokens()
+        for token in tokens:
+            if token == 'MACRO':
+                name = next(tokens)
+                yield name, self._parse_macro(name, tokens)
+            elif token in _NAMED_BLOCKS:
+                self._skip_block(next(tokens), tokens)
+            elif token in _KEYWORD_BLOCKS:
+                self._skip_block(token, tokens)
+            elif token == 'BEGINEXT':
+                self._skip_until(tokens, 'ENDEXT')
+            elif token == 'END':
+                if next(tokens, 'LIBRARY') == 'LIBRARY':
+                    return
+            else:
+                self._skip_until(tokens, ';')
+
+    @staticmethod
+    def _skip_until(tokens: Iterator[str], stop: str) -> None:
+        for token in tokens:
+            if token == stop:
+                return
+
+    @staticmethod
+    def _skip_block(name: str, tokens: Iterator[str]) -> None:
+        """ Skips a section that is closed with 'END <name>' """
+        for token in tokens:
+            if token == 'END' and next(tokens, name) == name:
+                return
+
+    def _parse_macro(self, name: str, tokens: Iterator[str]) -> dict:
+        size = None
+        origin = (0.0, 0.0)
+        pins: Dict[str, Dict[str, list]] = {}
+        obs: Dict[str, list] = {}
+        for token in tokens:
+            if token == 'END':
+                if next(tokens) == name:
+                    break
+            elif token == 'SIZE':
+                width = float(next(tokens))
+                next(tokens)  # BY
+                height = float(next(tokens))
+                size = [[0.0, 0.0], [width, height]]
+                self._skip_until(tokens, ';')
+            elif token == 'ORIGIN':
+                origin = (float(next(tokens)), float(next(tokens)))
+                self._skip_until(tokens, ';')
+            elif token == 'PIN':
+                pin_name = next(tokens)
+                self._parse_pin(pin_name, tokens, pins.setdefault(pin_name, {}))
+            elif token == 'OBS':
+                self._parse_geometry(tokens, obs)
+            elif token == 'DENSITY':
+                self._skip_until(tokens, 'END')
+            else:
+                self._skip_until(tokens, ';')
+
+        if origin != (0.0, 0.0):
+            dx, dy = origin
+            for layers in list(pins.values()) + [obs]:
+                for rects in layers.values():
+                    rects[:] = [[[x0 + dx, y0 + dy], [x1 + dx, y1 + dy]] for (x0, y0), (x1, y1) in rects]
+        return {'size': size, 'pins': pins, 'obs': obs}
+
+    def _parse_pin(self, name: str, tokens: Iterator[str], layers: Dict[str, list]) -> None:
+        for token in tokens:
+            if token == 'END':
+                if next(tokens) == name:
+                    return
+            elif token == 'PORT':
+                self._parse_geometry(tokens, layers)
+            else:
+                self._skip_until(tokens, ';')
+
+    def _parse_geometry(self, tokens: Iterator[str], layers: Dict[str, list]) -> None:
+        """
+        Adds the rectangles of a PORT or OBS section to layers until its closing END. Polygons are added as their
+        bounding box, ITERATE arrays are expanded, and paths and vias are ignored
+        """
+        rects = None
+        for token in tokens:
+            if token == 'END':
+                return
+            elif token == 'LAYER':
+                rects = layers.setdefault(next(tokens), [])
+                self._skip_until(tokens, ';')
+            elif token in ('RECT', 'POLYGON'):
+                values = []
+                for value in tokens:
+                    if value == ';':
+                        break
+                    values.append(value)
+                if values and values[0] == 'MASK':
+                    values = values[2:]
+                steps = [(0.0, 0.0)]
+                if values and values[0] == 'ITERATE':
+                    # ITERATE <coords> DO nx BY ny STEP dx dy
+                    do = values.index('DO')
+                    num_x, num_y = int(values[do + 1]), int(values[do + 3])
+                    dx, dy = float(values[do + 5]), float(values[do + 6])
+                    steps = [(i * dx, j * dy) for i in range(num_x) for j in range(num_y)]
+                    values = values[1:do]
+                coords = [float(value) for value in values]
+                if rects is not None and len(coords) >= 4:
+                    xs, ys = coords[0::2], coords[1::2]
+                    x0, y0, x1, y1 = min(xs), min(ys), max(xs), max(ys)
+                    for dx, dy in steps:
+                        rects.append([[x0 + dx, y0 + dy], [x1 + dx, y1 + dy]])
+            else:
+                self._skip_until(tokens, ';')
@@ -0,0 +1,148 @@
+"""
+The Manifest module records what was generated into an implementation library, so that cells whose inputs did not
+change can be skipped on the next run. Each cell is stored with a digest of everything that determines its content: the
+source code of its generator, its parameters, the ACG tech file and the ACG version. The digests of the source files of
+every generator used below the cell are recorded once it is generated, and are checked again before it is skipped.
+"""
+import os
+import sys
+import hashlib
+import importlib.util
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from ACG import cache
+from ACG.Backend import freeze_params
+
+# Digests of source files keyed by (path, mtime), so that each file is read at most once per change
+_file_digests: Dict[Tuple[str, float], str] = {}
+
+
+def file_digest(path: str) -> str:
+    """ Returns the SHA-1 digest of a file's content """
+    key = (path, os.path.getmtime(path))
+    try:
+        return _file_digests[key]
+    except KeyError:
+        pass
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    _file_digests[key] = digest.hexdigest()
+    return _file_digests[key]
+
+
+def source_digest(cls: type) -> str:
+    """
+    Returns a digest of the source files of every module that defines a class in the MRO of cls. Generators used as
+    sub-masters from other modules are not included
+    """
+    digests = []
+    for base in cls.__mro__:
+        module = sys.modules.get(base.__module__)
+        path = getattr(module, '__file__', None)
+        if path is not None and os.path.isfile(path):
+            digests.append((base.__module__, file_digest(path)))
+    return cache.hash_key(sorted(set(digests)))
+
+
+def _module_path(name: str) -> Optional[str]:
+    """ Returns the source file of a module, without importing it if it was not imported yet """
+    module = sys.modules.get(name)
+    if module is not None:
+        path = getattr(module, '__file__', None)
+    else:
+        try:
+            spec = importlib.util.find_spec(name)
+        except (ImportError, ValueError):
+            return None
+        path = spec.origin if spec is not None else None
+    return path if path is not None and os.path.isfile(path) else None
+
+
+def module_digests(modules: Iterable[str]) -> Dict[str, Optional[str]]:
+    """ Returns the digest of the source file of every module, or None for modules without a source file """
+    digests = {}
+    for name in modules:
+        path = _module_path(name)
+        digests[name] = file_digest(path) if path is not None else None
+    return digests
+
+
+def master_modules(master) -> Set[str]:
+    """
+    Returns the modules defining the classes of a master and of every master instantiated below it, along with all
+    loaded ACG modules. Masters that are not ACG generators only contribute their own classes
+    """
+    modules = {name for name in sys.modules if name == 'ACG' or name.startswith('ACG.')}
+    stack, seen = [master], set()
+    while stack:
+        cur = stack.pop()
+        if id(cur) in seen:
+            continue
+        seen.add(id(cur))
+        modules.update(base.__module__ for base in type(cur).__mro__)
+        for inst in getattr(cur, '_db', {}).get('instance', ()):
+            stack.append(inst.master)
+    return {name for name in modules if _module_path(name) is not None}
+
+
+def cell_digest(kind: str, cls: type, params: dict, *extra) -> str:
+    """ Returns the digest of a generated cell from its generator class, parameters, tech file and ACG version """
+    # Import here since ACG/__init__ imports this module through AyarDesignManager before defining __version__
+    import ACG
+    tech_path = os.environ.get('ACG_TECH')
+    tech = file_digest(tech_path) if tech_path and os.path.isfile(tech_path) else None
+    return cache.hash_key(kind, source_digest(cls), freeze_params(params), tech, ACG.__version__, *extra)
+
+
+class GenerationManifest:
+    """
+    Digests of the layouts and schematics generated into one library, stored as JSON. The manifest is written next to
+    the library when its path is known, and in the ACG cache directory otherwise
+    """
+    file_name = '.acg_manifest.json'
+
+    def __init__(self, path: str):
+        """
+        Parameters
+        ----------
+        path : str
+            path of the manifest JSON file
+        """
+        self.path = path
+        content = cache.read_json(path) or {}
+        # Every cell maps to {'digest': cell digest, 'sources': {module: digest of its source file}}
+        self.cells: Dict[str, Dict[str, dict]] = {kind: dict(content.get(kind, {}))
+                                                  for kind in ('layout', 'schematic')}
+
+    def __repr__(self):
+        return 'GenerationManifest(path={})'.format(self.path)
+
+    @classmethod
+    def for_library(cls, lib_name: str, lib_path: Optional[str] = None) -> 'GenerationManifest':
+        """ Returns the manifest of a library, stored in lib_path if provided """
+        if lib_path is not None and os.path.isdir(lib_path):
+            return cls(os.path.join(lib_path, cls.file_name))
+        return cls(os.path.join(cache.get_cache_dir('manifests'), cache.hash_key(lib_name) + '.json'))
+
+    def is_current(self, kind: str, cell_name: str, digest: str) -> bool:
+        """
+        Returns True if the cell was generated from inputs with the provided digest, and none of the source files used
+        to generate it changed since
+        """
+        entry = self.cells[kind].get(cell_name)
+        if not isinstance(entry, dict) or entry.get('digest') != digest:
+            return False
+        sources = entry.get('sources', {})
+        return module_digests(sources) == sources
+
+    def update(self, kind: str, entries: Dict[str, Tuple[str, Dict[str, Optional[str]]]]) -> None:
+        """ Records the digest and the source digests of newly generated cells, and saves the manifest """
+        for cell_name, (digest, sources) in entries.items():
+            self.cells[kind][cell_name] = {'digest': digest, 'sources': sources}
+        try:
+            cache.write_json(self.path, self.cells)
+        except OSError:
+            # Without a manifest cells are regenerated on the next run, which is slower but correct
+            pass
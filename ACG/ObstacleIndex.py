@@ -0,0 +1,130 @@
+"""
+The ObstacleIndex module implements a per-layer index of blocked regions in a layout. Blockages are stored as integer
+(n, 4) arrays of [x0, y0, x1, y1] in units of the grid resolution, sorted by x0 so that region queries only have to test
+the rectangles whose x range can overlap the query.
+"""
+import numpy as np
+from typing import Dict, Iterable, List, Union
+
+from ACG.Rectangle import Rectangle
+
+rect_type = Union[Rectangle, List[List[float]]]
+
+
+class ObstacleIndex:
+    """
+    Stores blockages of a layout by layer and answers overlap queries. Layer names are upper-cased
+    """
+
+    def __init__(self, layers: Dict[str, Iterable[np.ndarray]], res: float = .001):
+        """
+        Parameters
+        ----------
+        layers : Dict[str, Iterable[np.ndarray]]
+            for each layer, (n, 4) arrays of blockages in resolution units. All arrays of a layer are concatenated
+        res : float
+            grid resolution of the coordinates
+        """
+        self.res = res
+        self._rects: Dict[str, np.ndarray] = {}
+        self._max_width: Dict[str, int] = {}
+        grouped: Dict[str, list] = {}
+        for layer, arrays in layers.items():
+            grouped.setdefault(layer.upper(), []).extend(np.asarray(arr, dtype=np.int64).reshape(-1, 4)
+                                                         for arr in arrays)
+        for layer, arrays in grouped.items():
+            rects = np.concatenate(arrays) if arrays else np.zeros((0, 4), dtype=np.int64)
+            if len(rects) == 0:
+                continue
+            self._rects[layer] = rects[np.argsort(rects[:, 0], kind='stable')]
+            self._max_width[layer] = int((rects[:, 2] - rects[:, 0]).max())
+
+    def __repr__(self):
+        return 'ObstacleIndex({})'.format({layer: len(rects) for layer, rects in self._rects.items()})
+
+    def __contains__(self, layer: str) -> bool:
+        return layer.upper() in self._rects
+
+    def __getitem__(self, layer: str) -> np.ndarray:
+        """ Returns all blockages on the provided layer """
+        return self._rects.get(layer.upper(), np.zeros((0, 4), dtype=np.int64))
+
+    @property
+    def layers(self) -> List[str]:
+        return list(self._rects)
+
+    @classmethod
+    def from_generator(cls, gen, include_shapes: bool = True) -> 'ObstacleIndex':
+        """
+        Builds the obstacle index of a layout generator. It contains the blockages of the generator itself, the
+        blockages of all of its instances projected through their transformations, and optionally its drawn
+        (non-virtual) rectangles
+
+        Parameters
+        ----------
+        gen : AyarLayoutGenerator
+            layout generator whose obstacles should be indexed
+        include_shapes : bool
+            if True, drawn rectangles and rectangle arrays of the generator are added as obstacles on their layer
+        """
+        layers: Dict[str, list] = {}
+        for layer, rects in gen.get_obstructions().items():
+            layers.setdefault(layer, []).append(rects)
+        if include_shapes:
+            shapes: Dict[str, list] = {}
+            for rect in gen._db['rect']:
+                if rect.virtual is False:
+                    shapes.setdefault(rect.layer, []).append((rect.ll.x, rect.ll.y, rect.ur.x, rect.ur.y))
+            for layer, coords in shapes.items():
+                layers.setdefault(layer, []).append(np.rint(np.asarray(coords) / gen._res).astype(np.int64))
+            for rect_array in gen._db['rect_array']:
+                if rect_array.virtual is False:
+                    layers.setdefault(rect_array.layer, []).append(rect_array.to_array())
+            if getattr(gen, 'shapes', None) is not None:
+                for lpp, coords in gen.shapes.iter_rects():
+                    layers.setdefault(lpp[0], []).append(np.array(coords))
+        return cls(layers, res=gen._res)
+
+    def _to_units(self, rect: rect_type) -> np.ndarray:
+        if isinstance(rect, Rectangle):
+            coords = (rect.ll.x, rect.ll.y, rect.ur.x, rect.ur.y)
+        else:
+            (x0, y0), (x1, y1) = rect
+            coords = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+        return np.rint(np.asarray(coords) / self.res).astype(np.int64)
+
+    def query(self, layer: str, rect: rect_type, spacing: float = 0) -> np.ndarray:
+        """
+        Returns all blockages on a layer that overlap the provided region, or that are closer than spacing to it.
+        Blockages that only touch the region are not considered overlapping
+
+        Parameters
+        ----------
+        layer : str
+            layer to be searched
+        rect : rect_type
+            Rectangle or [[x0, y0], [x1, y1]] coordinates of the query region
+        spacing : float
+            minimum distance required between the region and any blockage
+
+        Returns
+        -------
+        rects : np.ndarray
+            (n, 4) array of the overlapping blockages in resolution units
+        """
+        rects = self[layer]
+        if len(rects) == 0:
+            return rects
+        x0, y0, x1, y1 = self._to_units(rect)
+        space = round(spacing / self.res)
+        x0, y0, x1, y1 = x0 - space, y0 - space, x1 + space, y1 + space
+        # Only rectangles starting in [x0 - max_width, x1) can overlap the region in x
+        start = np.searchsorted(rects[:, 0], x0 - self._max_width[layer.upper()], side='left')
+        stop = np.searchsorted(rects[:, 0], x1, side='left')
+        cand = rects[start:stop]
+        mask = (cand[:, 2] > x0) & (cand[:, 1] < y1) & (cand[:, 3] > y0)
+        return cand[mask]
+
+    def is_blocked(self, layer: str, rect: rect_type, spacing: float = 0) -> bool:
+        """ Returns True if the provided region overlaps, or is closer than spacing to, any blockage on the layer """
+        return len(self.query(layer, rect, spacing=spacing)) > 0
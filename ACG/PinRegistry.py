@@ -0,0 +1,229 @@
+"""
+The PinRegistry module indexes the pins of a layout by net, layer and bounding box. Pins are stored as integer (n, 4)
+arrays of [x0, y0, x1, y1] in units of the grid resolution, one array per (net, layer) pair sorted by x0, so that
+queries such as "all M2 pins of net VDD in this region" return arrays without scanning location dicts. Instances
+transform the registry of their master lazily, with the same vectorized transformation used for blockages.
+"""
+import itertools
+import numpy as np
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from ACG.Rectangle import Rectangle
+from ACG.VirtualInst import transform_rect_array
+
+pin_type = Union[Rectangle, Iterable[Rectangle], List[List[float]], np.ndarray]
+
+# Registry versions are unique across all registries, so that a version identifies the content of a registry
+_versions = itertools.count(1)
+
+
+class PinRegistry:
+    """
+    Pins of a layout indexed by net and layer. Layer names are upper-cased. Pins can be added at any time; the index
+    is rebuilt on the next query
+    """
+
+    def __init__(self, res: float = .001):
+        """
+        Parameters
+        ----------
+        res : float
+            grid resolution of the pin coordinates
+        """
+        self.res = res
+        self._pending: List[Tuple[str, str, np.ndarray]] = []
+        self._groups: Dict[Tuple[str, str], np.ndarray] = {}  # (net, layer) -> pins sorted by x0
+        self._max_width: Dict[Tuple[str, str], int] = {}
+        self.version = next(_versions)  # Changes every time pins are added
+
+    def __repr__(self):
+        return 'PinRegistry(nets={}, pins={})'.format(self.nets, len(self))
+
+    def __len__(self):
+        self._build()
+        return sum(len(rects) for rects in self._groups.values())
+
+    def __contains__(self, net: str) -> bool:
+        self._build()
+        return any(key[0] == net for key in self._groups)
+
+    @property
+    def nets(self) -> List[str]:
+        self._build()
+        return sorted({net for net, _ in self._groups})
+
+    @property
+    def layers(self) -> List[str]:
+        self._build()
+        return sorted({layer for _, layer in self._groups})
+
+    def items(self) -> Iterator[Tuple[str, str, np.ndarray]]:
+        """ Yields (net, layer, pins) for every indexed (net, layer) pair """
+        self._build()
+        for (net, layer), rects in self._groups.items():
+            yield net, layer, rects
+
+    """ Adding pins """
+
+    def add(self, net: str, layer: str, pins: pin_type) -> None:
+        """
+        Adds pins of a net on a layer
+
+        Parameters
+        ----------
+        net : str
+            name of the net
+        layer : str
+            layer of the pins
+        pins : pin_type
+            a Rectangle, a list of Rectangles, [[x0, y0], [x1, y1]] coordinates in microns, or an (n, 4) integer array
+            of [x0, y0, x1, y1] in resolution units
+        """
+        if isinstance(pins, Rectangle):
+            pins = [pins]
+        if not isinstance(pins, np.ndarray) and len(pins) == 0:
+            return
+        if isinstance(pins, np.ndarray):
+            rects = pins.astype(np.int64).reshape(-1, 4)
+        elif pins and isinstance(pins[0], Rectangle):
+            coords = [(rect.ll.x, rect.ll.y, rect.ur.x, rect.ur.y) for rect in pins]
+            rects = np.rint(np.asarray(coords) / self.res).astype(np.int64)
+        else:
+            (x0, y0), (x1, y1) = pins
+            coords = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+            rects = np.rint(np.asarray(coords) / self.res).astype(np.int64).reshape(-1, 4)
+        if len(rects) > 0:
+            self._pending.append((net, layer.upper(), rects))
+            self.version = next(_versions)
+
+    def add_rect(self, net: str, rect: Rectangle) -> None:
+        """ Adds a rectangle as a pin of net on the rectangle's own layer """
+        self.add(net, rect.layer, rect)
+
+    def _build(self) -> None:
+        """ Merges pending pins into the per (net, layer) arrays """
+        if not self._pending:
+            return
+        grouped: Dict[Tuple[str, str], List[np.ndarray]] = {}
+        for net, layer, rects in self._pending:
+            grouped.setdefault((net, layer), []).append(rects)
+        self._pending = []
+        for key, arrays in grouped.items():
+            if key in self._groups:
+                arrays.insert(0, self._groups[key])
+            self._set_group(key, np.concatenate(arrays) if len(arrays) > 1 else arrays[0])
+
+    def _set_group(self, key: Tuple[str, str], rects: np.ndarray) -> None:
+        self._groups[key] = rects[np.argsort(rects[:, 0], kind='stable')]
+        self._max_width[key] = int((rects[:, 2] - rects[:, 0]).max())
+
+    """ Queries """
+
+    def _to_units(self, region) -> Tuple[int, int, int, int]:
+        if isinstance(region, Rectangle):
+            coords = (region.ll.x, region.ll.y, region.ur.x, region.ur.y)
+        else:
+            (x0, y0), (x1, y1) = region
+            coords = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+        return tuple(int(val) for val in np.rint(np.asarray(coords) / self.res))
+
+    def _in_region(self, key: Tuple[str, str], region: Tuple[int, int, int, int]) -> np.ndarray:
+        """ Returns the pins of a group that overlap or touch the region """
+        rects = self._groups[key]
+        x0, y0, x1, y1 = region
+        # Only pins starting in [x0 - max_width, x1] can reach the region in x
+        start = np.searchsorted(rects[:, 0], x0 - self._max_width[key], side='left')
+        stop = np.searchsorted(rects[:, 0], x1, side='right')
+        cand = rects[start:stop]
+        return cand[(cand[:, 2] >= x0) & (cand[:, 1] <= y1) & (cand[:, 3] >= y0)]
+
+    def query_nets(self,
+                   net: Optional[str] = None,
+                   layer: Optional[str] = None,
+                   region=None
+                   ) -> Dict[str, np.ndarray]:
+        """
+        Returns the matching pins grouped by net
+
+        Parameters
+        ----------
+        net : Optional[str]
+            only return pins of this net
+        layer : Optional[str]
+            only return pins on this layer
+        region : Optional[Union[Rectangle, List[List[float]]]]
+            only return pins that overlap or touch this region
+
+        Returns
+        -------
+        pins : Dict[str, np.ndarray]
+            (n, 4) arrays of [x0, y0, x1, y1] in resolution units for every net with matching pins
+        """
+        self._build()
+        layer = layer.upper() if layer is not None else None
+        region = self._to_units(region) if region is not None else None
+        found: Dict[str, List[np.ndarray]] = {}
+        for key, rects in self._groups.items():
+            if (net is not None and key[0] != net) or (layer is not None and key[1] != layer):
+                continue
+            if region is not None:
+                rects = self._in_region(key, region)
+            if len(rects) > 0:
+                found.setdefault(key[0], []).append(rects)
+        return {name: arrays[0] if len(arrays) == 1 else np.concatenate(arrays) for name, arrays in found.items()}
+
+    def query(self, net: Optional[str] = None, layer: Optional[str] = None, region=None) -> np.ndarray:
+        """ Returns all matching pins as a single (n, 4) array in resolution units. See query_nets for the arguments """
+        found = list(self.query_nets(net=net, layer=layer, region=region).values())
+        if not found:
+            return np.zeros((0, 4), dtype=np.int64)
+        return found[0] if len(found) == 1 else np.concatenate(found)
+
+    def to_xy(self, rects: np.ndarray) -> List[List[List[float]]]:
+        """ Converts a pin array to [[x0, y0], [x1, y1]] coordinates in microns """
+        coords = np.round(rects * self.res, 3).tolist()
+        return [[[x0, y0], [x1, y1]] for x0, y0, x1, y1 in coords]
+
+    """ Hierarchy """
+
+    def transform(self, origin: Tuple[int, int], orient: str) -> 'PinRegistry':
+        """ Returns a new registry with all pins moved by an instance transformation given in resolution units """
+        self._build()
+        new = PinRegistry(res=self.res)
+        for key, rects in self._groups.items():
+            new._set_group(key, transform_rect_array(rects, origin, orient))
+        return new
+
+    def tile(self, offsets: np.ndarray) -> 'PinRegistry':
+        """ Returns a new registry with a copy of every pin shifted by each (dx, dy) offset in resolution units """
+        self._build()
+        offsets = np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+        shift = np.concatenate([offsets, offsets], axis=1)[:, None, :]
+        new = PinRegistry(res=self.res)
+        for key, rects in self._groups.items():
+            new._set_group(key, (rects[None, :, :] + shift).reshape(-1, 4))
+        return new
+
+    def prefix(self, prefix: str) -> 'PinRegistry':
+        """ Returns a new registry with every net renamed to prefix + net. Pin arrays are shared, not copied """
+        self._build()
+        new = PinRegistry(res=self.res)
+        for (net, layer), rects in self._groups.items():
+            new._groups[(prefix + net, layer)] = rects
+            new._max_width[(prefix + net, layer)] = self._max_width[(net, layer)]
+        return new
+
+    @classmethod
+    def merge(cls, registries: Iterable['PinRegistry'], res: float = .001) -> 'PinRegistry':
+        """
+        Returns a new registry containing the pins of all provided registries. Pins of nets with the same name are
+        merged into one net, so prefix the registries of different instances first
+        """
+        new = cls(res=res)
+        for registry in registries:
+            if registry is None:
+                continue
+            for net, layer, rects in registry.items():
+                new._pending.append((net, layer, rects))
+        new._build()
+        return new
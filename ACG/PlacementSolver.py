@@ -0,0 +1,378 @@
+"""
+The PlacementSolver module places rectangles and instances from declarative constraints instead of a chain of
+align/stretch calls. Constraints are collected first and solved all at once, separately in x and y, over the integer
+translation of every object in units of the grid resolution:
+
+- equalities (align, abut, symmetric) are merged into classes of objects whose translations are fixed relative to
+  each other, with a sign to support mirror symmetry
+- inequalities (spacing) become difference constraints between those classes. Upper bounds relative to the anchored
+  objects are found with a shortest path pass, then a longest path pass moves every object as little as possible
+  from its current location, left or down only where an anchored object requires it
+- anchored objects never move
+
+Objects are only moved once, when the solution is applied.
+"""
+from collections import deque
+from typing import Dict, List, Optional, Tuple, Union
+
+from ACG.Rectangle import Rectangle
+from ACG.VirtualInst import VirtualInst
+from ACG.XY import XY
+
+obj_type = Union[Rectangle, VirtualInst]
+
+_dims = {'x': 0, 'y': 1}
+# Direction of abut/spacing constraints: (dim, edge of the placed object, edge of the reference, sign)
+_directions = {
+    'right': ('x', 'l', 'r', 1),
+    'left': ('x', 'r', 'l', -1),
+    'top': ('y', 'b', 't', 1),
+    'bottom': ('y', 't', 'b', -1),
+}
+
+
+class _ConstraintSystem:
+    """
+    Constraints in a single dimension. Every variable is expressed relative to the root of its class as
+    value = sign * root + offset. The special root 0 is the origin, whose value is always 0
+    """
+
+    def __init__(self):
+        self.parent: List[int] = [0]
+        self.sign: List[int] = [1]
+        self.offset: List[int] = [0]
+        # Inequalities value[j] >= value[i] + weight between variables, stored as (i, j, weight)
+        self.lower: List[Tuple[int, int, int]] = []
+
+    def new_var(self) -> int:
+        self.parent.append(len(self.parent))
+        self.sign.append(1)
+        self.offset.append(0)
+        return len(self.parent) - 1
+
+    def find(self, var: int) -> Tuple[int, int, int]:
+        """ Returns (root, sign, offset) with value[var] = sign * value[root] + offset, compressing the path """
+        path = []
+        while self.parent[var] != var:
+            path.append(var)
+            var = self.parent[var]
+        root = var
+        # Walk back down to re-express every variable on the path directly relative to the root
+        sign, offset = 1, 0
+        for node in reversed(path):
+            sign, offset = self.sign[node] * sign, self.sign[node] * offset + self.offset[node]
+            self.parent[node] = root
+            self.sign[node] = sign
+            self.offset[node] = offset
+        return (root, self.sign[path[0]], self.offset[path[0]]) if path else (root, 1, 0)
+
+    def equal(self, var_a: int, var_b: int, sign: int, const: int) -> None:
+        """ Adds the constraint value[a] = sign * value[b] + const """
+        root_a, sign_a, off_a = self.find(var_a)
+        root_b, sign_b, off_b = self.find(var_b)
+        # root_a = new_sign * root_b + new_off
+        new_sign = sign_a * sign * sign_b
+        new_off = sign_a * (sign * off_b + const - off_a)
+        if root_a == root_b:
+            if new_sign == 1:
+                if new_off != 0:
+                    raise ValueError('Conflicting placement constraints')
+                return
+            # root = -root + new_off, so the class is fixed at new_off / 2
+            if new_off % 2:
+                raise ValueError('Symmetry constraint requires a position off the grid')
+            self._link(root_a, 0, 1, new_off // 2)
+            return
+        if root_a == 0:
+            # Keep the origin as root
+            self._link(root_b, root_a, new_sign, -new_sign * new_off)
+        else:
+            self._link(root_a, root_b, new_sign, new_off)
+
+    def _link(self, root: int, new_root: int, sign: int, offset: int) -> None:
+        """ Attaches root to new_root with value[root] = sign * value[new_root] + offset """
+        if root == new_root:
+            if sign != 1 or offset != 0:
+                raise ValueError('Conflicting placement constraints')
+            return
+        self.parent[root] = new_root
+        self.sign[root] = sign
+        self.offset[root] = offset
+
+    def at_least(self, var_a: int, var_b: int, const: int) -> None:
+        """ Adds the constraint value[a] >= value[b] + const """
+        self.lower.append((var_b, var_a, const))
+
+    def solve(self) -> List[int]:
+        """ Returns the value of every variable """
+        num = len(self.parent)
+        roots = [self.find(var) for var in range(num)]
+        # Convert all inequalities into edges between roots: value[j] >= value[i] + weight
+        edges: Dict[int, List[Tuple[int, int]]] = {}
+        for var_i, var_j, weight in self.lower:
+            root_i, sign_i, off_i = roots[var_i]
+            root_j, sign_j, off_j = roots[var_j]
+            # sign_j * Rj - sign_i * Ri >= const, where the origin R0 is always 0
+            const = off_i + weight - off_j
+            if root_i == root_j and (root_i == 0 or sign_i == sign_j):
+                if const > 0:
+                    raise ValueError('Placement constraints are infeasible')
+                continue
+            elif root_i == 0:
+                edge = (0, root_j, const) if sign_j == 1 else (root_j, 0, const)
+            elif root_j == 0:
+                edge = (root_i, 0, const) if sign_i == 1 else (0, root_i, const)
+            elif sign_i == sign_j:
+                edge = (root_i, root_j, const) if sign_j == 1 else (root_j, root_i, const)
+            else:
+                raise ValueError('Spacing constraints between mirrored objects are not supported')
+            edges.setdefault(edge[0], []).append((edge[1], edge[2]))
+
+        nodes = {root for root, _, _ in roots}
+        # Objects start at their current location, and are only moved down as far as the anchors require
+        upper = self._upper_bounds(nodes, edges)
+        value = {node: min(0, upper[node]) if upper[node] is not None else 0 for node in nodes}
+        order = self._topological_order(value, edges)
+        if order is not None:
+            for node in order:
+                for succ, weight in edges.get(node, ()):
+                    if value[node] + weight > value[succ]:
+                        value[succ] = value[node] + weight
+        else:
+            self._relax(value, edges)
+        if value[0] != 0:
+            raise ValueError('Placement constraints conflict with anchored objects')
+        return [sign * value[root] + offset for root, sign, offset in roots]
+
+    @staticmethod
+    def _upper_bounds(nodes, edges: Dict[int, List[Tuple[int, int]]]) -> Dict[int, Optional[int]]:
+        """
+        Returns the largest value every node can take with the origin fixed at 0, or None if it is not bounded by the
+        origin. Raises if the constraints through the origin form a positive cycle
+        """
+        # value[j] >= value[i] + weight bounds i from above by value[j] - weight, so walk the edges backwards
+        preds: Dict[int, List[Tuple[int, int]]] = {}
+        for node, succs in edges.items():
+            for succ, weight in succs:
+                preds.setdefault(succ, []).append((node, weight))
+        upper: Dict[int, Optional[int]] = {node: None for node in nodes}
+        upper[0] = 0
+        queue = deque([0])
+        queued = {0}
+        count = {node: 0 for node in nodes}
+        while queue:
+            node = queue.popleft()
+            queued.discard(node)
+            for pred, weight in preds.get(node, ()):
+                bound = upper[node] - weight
+                if upper[pred] is None or bound < upper[pred]:
+                    upper[pred] = bound
+                    count[pred] += 1
+                    if count[pred] > len(nodes) or pred == 0:
+                        raise ValueError('Placement constraints conflict with anchored objects')
+                    if pred not in queued:
+                        queue.append(pred)
+                        queued.add(pred)
+        return upper
+
+    @staticmethod
+    def _topological_order(nodes: Dict[int, int], edges: Dict[int, List[Tuple[int, int]]]) -> Optional[List[int]]:
+        """ Returns the nodes in topological order, or None if the constraint graph has a cycle """
+        in_degree = {node: 0 for node in nodes}
+        for succs in edges.values():
+            for succ, _ in succs:
+                in_degree[succ] += 1
+        queue = deque(node for node, deg in in_degree.items() if deg == 0)
+        order = []
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for succ, _ in edges.get(node, ()):
+                in_degree[succ] -= 1
+                if in_degree[succ] == 0:
+                    queue.append(succ)
+        return order if len(order) == len(nodes) else None
+
+    @staticmethod
+    def _relax(value: Dict[int, int], edges: Dict[int, List[Tuple[int, int]]]) -> None:
+        """ Longest path relaxation for cyclic constraint graphs. Raises if the constraints are infeasible """
+        queue = deque(value)
+        queued = set(queue)
+        count = {node: 0 for node in value}
+        while queue:
+            node = queue.popleft()
+            queued.discard(node)
+            for succ, weight in edges.get(node, ()):
+                if value[node] + weight > value[succ]:
+                    value[succ] = value[node] + weight
+                    count[succ] += 1
+                    if count[succ] > len(value):
+                        raise ValueError('Placement constraints are infeasible')
+                    if succ not in queued:
+                        queue.append(succ)
+                        queued.add(succ)
+
+
+class PlacementSolver:
+    """
+    Collects placement constraints between rectangles and instances and solves them all at once. Instances are
+    constrained through their 'bnd' location. Objects only move, they are never resized
+    """
+
+    def __init__(self, res: float = .001):
+        self.res = res
+        self._systems = (_ConstraintSystem(), _ConstraintSystem())
+        self._vars: Dict[int, Tuple[obj_type, int, int]] = {}  # id(obj) -> (obj, x var, y var)
+        self._bounds: Dict[int, Tuple[int, int, int, int]] = {}  # id(obj) -> initial bounds in resolution units
+
+    def __len__(self):
+        return len(self._vars)
+
+    """ Object bookkeeping """
+
+    def _get_var(self, obj: obj_type, dim: str) -> int:
+        key = id(obj)
+        if key not in self._vars:
+            self._vars[key] = (obj, self._systems[0].new_var(), self._systems[1].new_var())
+            self._bounds[key] = self._get_bounds(obj)
+        return self._vars[key][1 + _dims[dim]]
+
+    def _get_bounds(self, obj: obj_type) -> Tuple[int, int, int, int]:
+        rect = obj.loc['bnd'] if isinstance(obj, VirtualInst) else obj
+        return (round(rect.ll.x / self.res), round(rect.ll.y / self.res),
+                round(rect.ur.x / self.res), round(rect.ur.y / self.res))
+
+    def _handle2(self, obj: obj_type, handle: str, dim: str) -> int:
+        """ Returns twice the initial coordinate of a handle, so that centers stay integers """
+        x0, y0, x1, y1 = self._bounds[id(obj)]
+        lo, hi = (x0, x1) if dim == 'x' else (y0, y1)
+        if dim == 'x':
+            side = 'l' if handle in ('ll', 'ul', 'cl', 'l') else 'r' if handle in ('lr', 'ur', 'cr', 'r') else 'c'
+        else:
+            side = 'b' if handle in ('ll', 'lr', 'cb', 'b') else 't' if handle in ('ul', 'ur', 'ct', 't') else 'c'
+        if side in ('l', 'b'):
+            return 2 * lo
+        elif side in ('r', 't'):
+            return 2 * hi
+        return lo + hi
+
+    @staticmethod
+    def _handle_dims(handle: str, ref_handle: str) -> str:
+        if handle in Rectangle.h_edges or ref_handle in Rectangle.h_edges:
+            return 'x'
+        elif handle in Rectangle.v_edges or ref_handle in Rectangle.v_edges:
+            return 'y'
+        return 'xy'
+
+    def _to_units(self, value: float) -> int:
+        return round(value / self.res)
+
+    """ Constraints """
+
+    def anchor(self, obj: obj_type, dims: str = 'xy') -> 'PlacementSolver':
+        """ Keeps the object at its current location """
+        for dim in dims:
+            self._systems[_dims[dim]].equal(self._get_var(obj, dim), 0, 1, 0)
+        return self
+
+    def align(self,
+              obj: obj_type,
+              handle: str,
+              ref: obj_type,
+              ref_handle: str,
+              offset: Tuple[float, float] = (0, 0),
+              dims: Optional[str] = None
+              ) -> 'PlacementSolver':
+        """
+        Places the handle of obj at the handle of ref plus offset. Edge handles only constrain their own dimension,
+        vertex handles constrain both dimensions unless dims is given
+        """
+        if dims is None:
+            dims = self._handle_dims(handle, ref_handle)
+        for dim in dims:
+            var, ref_var = self._get_var(obj, dim), self._get_var(ref, dim)
+            # 2 * (pos + t) = 2 * (ref_pos + t_ref + offset), where pos is known in half units
+            diff2 = self._handle2(ref, ref_handle, dim) + 2 * self._to_units(offset[_dims[dim]]) - \
+                self._handle2(obj, handle, dim)
+            if diff2 % 2:
+                raise ValueError('Aligning {} of {} to {} of {} requires a position off the grid'.
+                                 format(handle, obj, ref_handle, ref))
+            self._systems[_dims[dim]].equal(var, ref_var, 1, diff2 // 2)
+        return self
+
+    def abut(self, obj: obj_type, ref: obj_type, direction: str = 'right') -> 'PlacementSolver':
+        """ Places obj directly next to ref in the provided direction ('right', 'left', 'top' or 'bottom') """
+        dim, edge, ref_edge, _ = _directions[direction]
+        return self.align(obj, edge, ref, ref_edge, dims=dim)
+
+    def spacing(self,
+                obj: obj_type,
+                ref: obj_type,
+                space: float = 0,
+                direction: str = 'right',
+                max_space: Optional[float] = None
+                ) -> 'PlacementSolver':
+        """
+        Keeps obj at least space (and at most max_space, if provided) away from ref in the provided direction. Only the
+        dimension of the direction is constrained
+        """
+        dim, edge, ref_edge, sign = _directions[direction]
+        system = self._systems[_dims[dim]]
+        var, ref_var = self._get_var(obj, dim), self._get_var(ref, dim)
+        # sign * (edge + t - ref_edge - t_ref) >= space
+        gap = (self._handle2(obj, edge, dim) - self._handle2(ref, ref_edge, dim)) // 2
+        if sign > 0:
+            system.at_least(var, ref_var, self._to_units(space) - gap)
+            if max_space is not None:
+                system.at_least(ref_var, var, gap - self._to_units(max_space))
+        else:
+            system.at_least(ref_var, var, self._to_units(space) + gap)
+            if max_space is not None:
+                system.at_least(var, ref_var, -gap - self._to_units(max_space))
+        return self
+
+    def symmetric(self, obj: obj_type, other: obj_type, axis: float, dim: str = 'x') -> 'PlacementSolver':
+        """ Places the centers of obj and other symmetrically about the line dim = axis """
+        var, other_var = self._get_var(obj, dim), self._get_var(other, dim)
+        # (c_obj + t_obj) + (c_other + t_other) = 2 * axis, with centers known in half units
+        const2 = 4 * self._to_units(axis) - self._handle2(obj, 'c', dim) - self._handle2(other, 'c', dim)
+        if const2 % 2:
+            raise ValueError('{} and {} cannot be placed symmetrically on the grid'.format(obj, other))
+        self._systems[_dims[dim]].equal(var, other_var, -1, const2 // 2)
+        return self
+
+    """ Solution """
+
+    def solve(self, apply: bool = True) -> Dict[int, Tuple[float, float]]:
+        """
+        Solves all constraints and moves every object once
+
+        Parameters
+        ----------
+        apply : bool
+            if False, only compute the translations without moving the objects
+
+        Returns
+        -------
+        translations : Dict[int, Tuple[float, float]]
+            (dx, dy) translation of every constrained object, keyed by id(obj)
+        """
+        values = [system.solve() for system in self._systems]
+        translations = {}
+        for key, (obj, var_x, var_y) in self._vars.items():
+            dx, dy = values[0][var_x], values[1][var_y]
+            translations[key] = (round(dx * self.res, 3), round(dy * self.res, 3))
+            if apply and (dx or dy):
+                self._move(obj, dx, dy)
+        return translations
+
+    def _move(self, obj: obj_type, dx: int, dy: int) -> None:
+        if isinstance(obj, VirtualInst):
+            obj.move(origin=obj.origin + XY([dx * self.res, dy * self.res]))
+            return
+        x0, y0, x1, y1 = (round(obj.ll.x / self.res) + dx, round(obj.ll.y / self.res) + dy,
+                          round(obj.ur.x / self.res) + dx, round(obj.ur.y / self.res) + dy)
+        # Centers are rounded from the coordinates in microns, like Rectangle.update_dict does
+        cx = round(.5 * (round(x0 * self.res, 3) + round(x1 * self.res, 3)) / self.res)
+        cy = round(.5 * (round(y1 * self.res, 3) + round(y0 * self.res, 3)) / self.res)
+        obj.set_units(x0, y0, x1, y1, cx, cy)
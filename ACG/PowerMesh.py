@@ -0,0 +1,184 @@
+"""
+The PowerMesh module builds power grids from regularly spaced straps. The straps of each net on each layer are a single
+RectArray, and since straps span the whole mesh region, all crossings of two strap arrays of the same net form a
+regular grid that is committed as a single ViaArray per metal pair. A mesh with 10^5 crossings therefore only creates a
+few Python objects. Strap and tap locations stay queryable as arrays, and straps are registered as pins of their net.
+"""
+import numpy as np
+from typing import List, Optional, Sequence
+
+from ACG import tech as tech_info
+from ACG.Rectangle import Rectangle
+from ACG.Via import ViaArray
+
+
+class PowerMesh:
+    """
+    Power grid of straps on several layers. Straps of consecutive layers are connected by via arrays wherever straps of
+    the same net cross
+    """
+
+    def __init__(self, gen, region=None, nets: Sequence[str] = ('VDD', 'VSS')):
+        """
+        Parameters
+        ----------
+        gen : AyarLayoutGenerator
+            layout generator that receives the mesh
+        region : Optional[Union[Rectangle, List[List[float]]]]
+            region covered by the mesh. Defaults to the 'bnd' location of the generator
+        nets : Sequence[str]
+            nets of the mesh. Straps on every layer cycle through the nets in this order
+        """
+        self.gen = gen
+        self.nets = list(nets)
+        if region is None:
+            region = gen.loc.get('bnd')
+            if region is None:
+                raise ValueError('Provide a region for a power mesh in a generator without a bnd location')
+        if isinstance(region, Rectangle):
+            region = [[region.ll.x, region.ll.y], [region.ur.x, region.ur.y]]
+        (x0, y0), (x1, y1) = region
+        self.region = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+        self._layers: List[dict] = []
+        self.loc = {
+            'straps': {},  # layer -> net -> RectArray
+            'vias': {},  # '<bottom layer>_<top layer>' -> net -> ViaArray
+        }
+
+    def __repr__(self):
+        return 'PowerMesh(nets={}, layers={})'.format(self.nets, [layer['layer'] for layer in self._layers])
+
+    def export_locations(self) -> dict:
+        return self.loc
+
+    def add_straps(self,
+                   layer: str,
+                   width: float,
+                   pitch: float,
+                   offset: float = 0,
+                   direction: Optional[str] = None
+                   ) -> 'PowerMesh':
+        """
+        Adds a layer of straps to the mesh
+
+        Parameters
+        ----------
+        layer : str
+            layer of the straps
+        width : float
+            width of each strap
+        pitch : float
+            distance between neighboring straps, which belong to consecutive nets
+        offset : float
+            distance from the edge of the region to the first strap
+        direction : Optional[str]
+            'x' for horizontal straps, 'y' for vertical straps. Defaults to the routing direction of the layer
+
+        Returns
+        -------
+        self : PowerMesh
+            the mesh, so that calls can be chained
+        """
+        tech = tech_info.tech_info['metal_tech']
+        if direction is None:
+            direction = tech['dir'][tech['routing'].index(layer)]
+        if direction not in ('x', 'y'):
+            raise ValueError('direction must be either x or y')
+        if pitch < width:
+            raise ValueError('Straps on {} with width {} overlap at pitch {}'.format(layer, width, pitch))
+        self._layers.append(dict(layer=layer, width=width, pitch=pitch, offset=offset, direction=direction,
+                                 index=tech['metals'][layer]['index']))
+        return self
+
+    def generate(self, add_pins: bool = True) -> dict:
+        """
+        Adds all straps and via arrays to the generator
+
+        Parameters
+        ----------
+        add_pins : bool
+            if True, straps are registered as pins of their net in the generator's pin registry
+
+        Returns
+        -------
+        loc : dict
+            the location dict of the mesh
+        """
+        x0, y0, x1, y1 = self.region
+        num_nets = len(self.nets)
+        layers = sorted(self._layers, key=lambda info: info['index'])
+        for info in layers:
+            horizontal = info['direction'] == 'x'
+            lo, hi = (y0, y1) if horizontal else (x0, x1)
+            num = int(np.floor(round((hi - lo - info['offset'] - info['width']) / info['pitch'], 6))) + 1
+            straps = {}
+            for idx, net in enumerate(self.nets):
+                count = -(-(num - idx) // num_nets)
+                if count <= 0:
+                    continue
+                start = lo + info['offset'] + idx * info['pitch']
+                if horizontal:
+                    xy = [[x0, start], [x1, start + info['width']]]
+                    arr = self.gen.add_rect_array(info['layer'], xy, ny=count, spy=num_nets * info['pitch'])
+                else:
+                    xy = [[start, y0], [start + info['width'], y1]]
+                    arr = self.gen.add_rect_array(info['layer'], xy, nx=count, spx=num_nets * info['pitch'])
+                straps[net] = arr
+                if add_pins:
+                    self.gen.pins.add(net, info['layer'], arr.to_array())
+            self.loc['straps'][info['layer']] = straps
+
+        for bot, top in zip(layers[:-1], layers[1:]):
+            if bot['direction'] == top['direction']:
+                raise ValueError('Straps on {} and {} run in the same direction and never cross'.format(
+                    bot['layer'], top['layer']))
+            vias = {}
+            for net in self.nets:
+                bot_arr = self.loc['straps'][bot['layer']].get(net)
+                top_arr = self.loc['straps'][top['layer']].get(net)
+                if bot_arr is None or top_arr is None:
+                    continue
+                # One array is a column of horizontal straps, the other a row of vertical straps
+                horizontal, vertical = (bot_arr, top_arr) if bot['direction'] == 'x' else (top_arr, bot_arr)
+                via = ViaArray(bot_arr, top_arr, nx=vertical.nx, ny=horizontal.ny, spx=vertical.spx,
+                               spy=horizontal.spy)
+                self.gen._db['via'].append(via)
+                vias[net] = via
+            self.loc['vias'][bot['layer'] + '_' + top['layer']] = vias
+        return self.loc
+
+    def get_straps(self, net: str, layer: str) -> np.ndarray:
+        """ Returns all straps of a net on a layer as an (n, 4) array of [x0, y0, x1, y1] in resolution units """
+        arr = self.loc['straps'].get(layer, {}).get(net)
+        return arr.to_array() if arr is not None else np.zeros((0, 4), dtype=np.int64)
+
+    def get_taps(self, net: str, bot_layer: Optional[str] = None, top_layer: Optional[str] = None) -> np.ndarray:
+        """
+        Returns the via regions of a net as an (n, 4) array of [x0, y0, x1, y1] in resolution units, optionally only
+        between two layers
+        """
+        taps = []
+        for name, vias in self.loc['vias'].items():
+            if bot_layer is not None and top_layer is not None and name != bot_layer + '_' + top_layer:
+                continue
+            if net in vias:
+                taps.append(vias[net].to_array())
+        return np.concatenate(taps) if taps else np.zeros((0, 4), dtype=np.int64)
+
+    def get_tap(self, net: str, bot_layer: str, top_layer: str, col: int, row: int) -> Rectangle:
+        """ Returns the via region of one crossing of a net as a virtual Rectangle """
+        via = self.loc['vias'][bot_layer + '_' + top_layer][net]
+        if not (0 <= col < via.nx and 0 <= row < via.ny):
+            raise IndexError('({}, {}) is outside of a {}x{} via array'.format(col, row, via.nx, via.ny))
+        overlap = via.loc['overlap']
+        dx, dy = col * via.spx, row * via.spy
+        return Rectangle([[overlap.ll.x + dx, overlap.ll.y + dy], [overlap.ur.x + dx, overlap.ur.y + dy]],
+                         overlap.lpp, virtual=True)
+
+    def get_nearest_tap(self, net: str, bot_layer: str, top_layer: str, xy) -> Rectangle:
+        """ Returns the via region of a net closest to the provided point """
+        via = self.loc['vias'][bot_layer + '_' + top_layer][net]
+        center = via.loc['overlap'].center
+        col = int(np.clip(round((xy[0] - center.x) / via.spx), 0, via.nx - 1)) if via.spx else 0
+        row = int(np.clip(round((xy[1] - center.y) / via.spy), 0, via.ny - 1)) if via.spy else 0
+        return self.get_tap(net, bot_layer, top_layer, col, row)
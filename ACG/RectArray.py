@@ -0,0 +1,50 @@
+import numpy as np
+
+from ACG.Rectangle import Rectangle
+
+
+class RectArray(Rectangle):
+    """
+    A rectangle repeated nx by ny times with pitch spx and spy, committed as a single arrayed shape. The location dict
+    is the one of the first element at the lower left of the array
+    """
+    __slots__ = ('nx', 'ny', 'spx', 'spy')
+
+    def __init__(self, xy, layer, nx: int = 1, ny: int = 1, spx: float = 0, spy: float = 0, virtual=False):
+        Rectangle.__init__(self, xy, layer, virtual=virtual)
+        if nx < 1 or ny < 1:
+            raise ValueError('Rectangle arrays need at least one element, got nx={}, ny={}'.format(nx, ny))
+        self.nx = nx
+        self.ny = ny
+        self.spx = round(spx, 3)
+        self.spy = round(spy, 3)
+
+    def __repr__(self):
+        return 'RectArray(xy={}, layer={}, nx={}, ny={}, spx={}, spy={})'.format(self.xy, self.layer, self.nx, self.ny,
+                                                                               self.spx, self.spy)
+
+    def __len__(self):
+        return self.nx * self.ny
+
+    def get_rect(self, col: int, row: int = 0, virtual: bool = True) -> Rectangle:
+        """ Returns a Rectangle at the location of one element of the array """
+        if not (0 <= col < self.nx and 0 <= row < self.ny):
+            raise IndexError('({}, {}) is outside of a {}x{} array'.format(col, row, self.nx, self.ny))
+        dx, dy = col * self.spx, row * self.spy
+        return Rectangle([[self.ll.x + dx, self.ll.y + dy], [self.ur.x + dx, self.ur.y + dy]], self.lpp,
+                         virtual=virtual)
+
+    def to_array(self) -> np.ndarray:
+        """ Returns all elements as an (nx * ny, 4) array of [x0, y0, x1, y1] in resolution units """
+        res = self._res
+        base = np.rint(np.array([self.ll.x, self.ll.y, self.ur.x, self.ur.y]) / res).astype(np.int64)
+        cols, rows = np.meshgrid(np.arange(self.nx), np.arange(self.ny))
+        dx = cols.ravel() * round(self.spx / res)
+        dy = rows.ravel() * round(self.spy / res)
+        return base[None, :] + np.stack([dx, dy, dx, dy], axis=1)
+
+    def get_bound(self) -> Rectangle:
+        """ Returns a virtual rectangle enclosing all elements of the array """
+        return Rectangle([[self.ll.x, self.ll.y],
+                          [self.ur.x + (self.nx - 1) * self.spx, self.ur.y + (self.ny - 1) * self.spy]],
+                         self.lpp, virtual=True)
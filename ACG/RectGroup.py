@@ -0,0 +1,261 @@
+"""
+The RectGroup module implements align, stretch and distribute operations on whole groups of rectangles. The coordinates
+of the group are gathered into a single array, all handle and offset computations are performed as vectorized numpy
+operations, and the results are written back to the rectangles in one pass. Every intermediate value is snapped to the
+grid in the same order as Rectangle.align and Rectangle.stretch, so the results are identical to calling those methods
+on each rectangle.
+"""
+import numpy as np
+from typing import List, Optional, Sequence, Tuple, Union
+
+from ACG.Rectangle import Rectangle
+from ACG.XY import XY
+
+ref_type = Union[Rectangle, Sequence[Rectangle], None]
+
+# Column of the coordinate array used by each handle in x and y. 'c' is the center of the rectangle
+_handle_x = {'ll': 'l', 'ul': 'l', 'cl': 'l', 'l': 'l',
+             'lr': 'r', 'ur': 'r', 'cr': 'r', 'r': 'r',
+             'c': 'c', 'ct': 'c', 'cb': 'c'}
+_handle_y = {'ll': 'b', 'lr': 'b', 'cb': 'b', 'b': 'b',
+             'ul': 't', 'ur': 't', 'ct': 't', 't': 't',
+             'c': 'c', 'cl': 'c', 'cr': 'c'}
+
+
+def _snap(values: np.ndarray, res: float = Rectangle._res) -> np.ndarray:
+    """ Rounds coordinates to the grid like the XY setter and getter do """
+    return np.round(np.rint(values / res) * res, 3)
+
+
+def get_coords(rects: Sequence[Rectangle]) -> np.ndarray:
+    """ Returns an (n, 4) array of [x0, y0, x1, y1] coordinates of the rectangles """
+    return np.array([(rect.ll.x, rect.ll.y, rect.ur.x, rect.ur.y) for rect in rects], dtype=float).reshape(-1, 4)
+
+
+def set_coords(rects: Sequence[Rectangle], coords: np.ndarray, res: float = Rectangle._res) -> None:
+    """ Writes an (n, 4) coordinate array back to the rectangles and updates their location dicts """
+    units = np.rint(coords / res).astype(np.int64)
+    # Centers are computed from the coordinates in microns, like Rectangle.update_dict does
+    center_x = np.rint(.5 * (coords[:, 0] + coords[:, 2]) / res).astype(np.int64)
+    center_y = np.rint(.5 * (coords[:, 3] + coords[:, 1]) / res).astype(np.int64)
+    for rect, (x0, y0, x1, y1), cx, cy in zip(rects, units.tolist(), center_x.tolist(), center_y.tolist()):
+        rect.set_units(x0, y0, x1, y1, cx, cy)
+
+
+def _handle_values(coords: np.ndarray, handle: str) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """ Returns the x and y coordinates of a handle for all rectangles. Edges only have one of the two """
+    if handle not in _handle_x and handle not in _handle_y:
+        raise ValueError('{} is not a valid handle'.format(handle))
+    values = []
+    for table, lo, hi in ((_handle_x, 0, 2), (_handle_y, 1, 3)):
+        side = table.get(handle)
+        if side is None:
+            values.append(None)
+        elif side in ('l', 'b'):
+            values.append(coords[:, lo])
+        elif side in ('r', 't'):
+            values.append(coords[:, hi])
+        else:
+            values.append(_snap(.5 * (coords[:, lo] + coords[:, hi])))
+    return values[0], values[1]
+
+
+def _ref_values(ref: ref_type, ref_handle: str, num: int) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """ Returns the x and y coordinates of the reference handle, for a single reference or one per rectangle """
+    if isinstance(ref, Rectangle):
+        value = ref.loc[ref_handle]
+        if isinstance(value, XY):
+            return np.full(num, value.x), np.full(num, value.y)
+        elif ref_handle in Rectangle.h_edges:
+            return np.full(num, value), None
+        return None, np.full(num, value)
+    if len(ref) != num:
+        raise ValueError('{} reference rectangles provided for {} rectangles'.format(len(ref), num))
+    return _handle_values(get_coords(ref), ref_handle)
+
+
+def _get_diff(coords: np.ndarray,
+              handle: str,
+              ref: ref_type,
+              ref_handle: Optional[str],
+              track: Optional[XY],
+              offset) -> Tuple[np.ndarray, np.ndarray]:
+    """ Computes the distance between the target handles and their reference exactly like Rectangle.align """
+    num = len(coords)
+    off_x, off_y = (np.asarray(val, dtype=float) for val in (offset[0], offset[1]))
+    tx, ty = _handle_values(coords, handle)
+    zero = np.zeros(num)
+    if track is not None:
+        if tx is None or ty is None:
+            raise ValueError('Track alignment requires a vertex handle, got {}'.format(handle))
+        diff_x = tx - (track.x - off_x) if track.x != 0 else zero
+        diff_y = ty - (track.y - off_y) if track.y != 0 else zero
+    elif ref is None and ref_handle is None:
+        if tx is None or ty is None:
+            raise ValueError('Alignment to an offset requires a vertex handle, got {}'.format(handle))
+        diff_x = tx - off_x
+        diff_y = ty - off_y
+    elif ref is not None and ref_handle is not None:
+        rx, ry = _ref_values(ref, ref_handle, num)
+        if handle in Rectangle.edges and ref_handle in Rectangle.edges:
+            if handle in Rectangle.v_edges and ref_handle in Rectangle.v_edges:
+                diff_x, diff_y = zero, ty - (ry + off_y)
+            elif handle in Rectangle.h_edges and ref_handle in Rectangle.h_edges:
+                diff_x, diff_y = tx - (rx + off_x), zero
+            else:
+                raise ValueError('{} and {} must both be edge handles to support edge alignment'.
+                                 format(handle, ref_handle))
+        elif tx is None or ty is None or rx is None or ry is None:
+            raise ValueError('{} and {} must both be vertex handles'.format(handle, ref_handle))
+        else:
+            diff_x = tx - (rx + off_x)
+            diff_y = ty - (ry + off_y)
+    else:
+        raise ValueError('Arguments do not specify a valid align operation')
+    return np.broadcast_to(diff_x, (num,)), np.broadcast_to(diff_y, (num,))
+
+
+def _shift(coords: np.ndarray, diff_x: np.ndarray, diff_y: np.ndarray, opt: Tuple[bool, bool]) -> np.ndarray:
+    coords = coords.copy()
+    if opt[0]:
+        coords[:, 0] = _snap(coords[:, 0] - diff_x)
+        coords[:, 2] = _snap(coords[:, 2] - diff_x)
+    if opt[1]:
+        coords[:, 1] = _snap(coords[:, 1] - diff_y)
+        coords[:, 3] = _snap(coords[:, 3] - diff_y)
+    return coords
+
+
+def align_all(rects: Sequence[Rectangle],
+              target_handle: str,
+              ref_rect: ref_type = None,
+              ref_handle: str = None,
+              track: XY = None,
+              align_opt: Tuple[bool, bool] = (True, True),
+              offset=(0, 0)
+              ) -> List[Rectangle]:
+    """
+    Moves every rectangle to co-locate its target handle with the reference handle. Equivalent to calling
+    Rectangle.align on each rectangle with the same arguments
+
+    Parameters
+    ----------
+    rects : Sequence[Rectangle]
+        rectangles to be moved
+    target_handle : str
+        handle of each rectangle to be aligned
+    ref_rect : Union[Rectangle, Sequence[Rectangle], None]
+        a single reference rectangle for all rectangles, or one reference per rectangle
+    ref_handle : str
+        handle of the reference rectangle(s)
+    track : XY
+        track location to align to instead of a reference rectangle
+    align_opt : Tuple[bool, bool]
+        whether to move the rectangles in x and in y
+    offset
+        (x, y) offset from the reference. Each entry may also be an array with one value per rectangle
+
+    Returns
+    -------
+    rects : List[Rectangle]
+        the moved rectangles
+    """
+    rects = list(rects)
+    if not rects:
+        return rects
+    coords = get_coords(rects)
+    diff_x, diff_y = _get_diff(coords, target_handle, ref_rect, ref_handle, track, offset)
+    set_coords(rects, _shift(coords, diff_x, diff_y, align_opt))
+    return rects
+
+
+def stretch_all(rects: Sequence[Rectangle],
+                target_handle: str,
+                ref_rect: ref_type = None,
+                ref_handle: str = None,
+                track: XY = None,
+                stretch_opt: Tuple[bool, bool] = (True, True),
+                offset=(0, 0)
+                ) -> List[Rectangle]:
+    """
+    Stretches every rectangle to co-locate its target handle with the reference handle. Equivalent to calling
+    Rectangle.stretch on each rectangle with the same arguments. See align_all for the parameters
+    """
+    rects = list(rects)
+    if not rects:
+        return rects
+    coords = get_coords(rects)
+    diff_w, diff_h = _get_diff(coords, target_handle, ref_rect, ref_handle, track, offset)
+    if track is None:
+        # First align the target handles, then move the opposite sides back
+        coords = _shift(coords, diff_w, diff_h, stretch_opt)
+
+    side_x = _handle_x.get(target_handle)
+    side_y = _handle_y.get(target_handle)
+    if stretch_opt[0]:
+        if side_x == 'l':
+            coords[:, 2] = _snap(coords[:, 2] + diff_w)
+        elif side_x == 'r':
+            coords[:, 0] = _snap(coords[:, 0] + diff_w)
+        elif side_x == 'c':
+            coords[:, 0] = _snap(coords[:, 0] + .5 * diff_w)
+            coords[:, 2] = _snap(coords[:, 2] + .5 * diff_w)
+    if stretch_opt[1]:
+        if side_y == 'b':
+            coords[:, 3] = _snap(coords[:, 3] + diff_h)
+        elif side_y == 't':
+            coords[:, 1] = _snap(coords[:, 1] + diff_h)
+        elif side_y == 'c':
+            coords[:, 1] = _snap(coords[:, 1] + .5 * diff_h)
+            coords[:, 3] = _snap(coords[:, 3] + .5 * diff_h)
+    set_coords(rects, coords)
+    return rects
+
+
+def distribute(rects: Sequence[Rectangle],
+               pitch: float,
+               dim: str = 'x',
+               handle: str = 'll',
+               start: Optional[float] = None
+               ) -> List[Rectangle]:
+    """
+    Places the rectangles at a constant pitch along one dimension, in the order they are given. The other dimension
+    is left unchanged
+
+    Parameters
+    ----------
+    rects : Sequence[Rectangle]
+        rectangles to be placed
+    pitch : float
+        distance between the handles of consecutive rectangles
+    dim : str
+        'x' to place the rectangles in a row, 'y' to place them in a column
+    handle : str
+        vertex handle of each rectangle placed on the pitch
+    start : Optional[float]
+        location of the handle of the first rectangle. Defaults to its current location
+
+    Returns
+    -------
+    rects : List[Rectangle]
+        the placed rectangles
+    """
+    rects = list(rects)
+    if not rects:
+        return rects
+    if dim not in ('x', 'y'):
+        raise ValueError('dim must be either x or y')
+    coords = get_coords(rects)
+    tx, ty = _handle_values(coords, handle)
+    current = tx if dim == 'x' else ty
+    if current is None:
+        raise ValueError('{} is not a vertex handle'.format(handle))
+    if start is None:
+        start = current[0]
+    targets = _snap(start + pitch * np.arange(len(rects)))
+    if dim == 'x':
+        coords = _shift(coords, tx - targets, np.zeros(len(rects)), (True, False))
+    else:
+        coords = _shift(coords, np.zeros(len(rects)), ty - targets, (False, True))
+    set_coords(rects, coords)
+    return rects
@@ -1,15 +1,39 @@
+import sys
 from ACG.VirtualObj import VirtualObj
 from ACG.XY import XY
-from bag.layout.util import BBox
-from typing import Tuple, Union, Optional
+from ACG.Backend import BBox
+from typing import Tuple, Union, Optional, Dict
 from ACG import tech as tech_info
+from ACG.LayoutStats import LayoutStats
 coord_type = Union[Tuple[float, float], XY]
 
+# Cache of layer purpose pairs, so that all rectangles on the same layer share a single tuple
+_lpp_cache: Dict[Tuple[str, str], Tuple[str, str]] = {}
 
+
+def intern_lpp(layer: str, purpose: str = 'drawing') -> Tuple[str, str]:
+    """ Returns the shared tuple object for the provided layer purpose pair """
+    key = (layer, purpose)
+    try:
+        return _lpp_cache[key]
+    except KeyError:
+        lpp = (sys.intern(layer), sys.intern(purpose))
+        _lpp_cache[key] = lpp
+        return lpp
+
+
+@LayoutStats.register
 class Rectangle(VirtualObj):
     """
     Creates a better rectangle object with stretch and align capabilities
     """
+    __slots__ = ('_ll', '_ur', '_lpp', 'virtual', 'loc')
+
+    # Constants shared by all rectangles
+    _res = .001
+    edges = ('l', 'r', 'b', 't')
+    v_edges = ('t', 'b')
+    h_edges = ('l', 'r')
 
     """ Constructor Methods """
 
@@ -24,35 +48,17 @@ class Rectangle(VirtualObj):
         """
 
         VirtualObj.__init__(self)
+        Rectangle._num_created += 1
 
         # Init internal properties
         self._ll = None
         self._ur = None
-        self._res = .001
         self._lpp: Tuple[str, str] = None
 
         # Init local variables
         self.xy = xy  # property setter creates ll and ur coordinates
         self.layer = layer
         self.virtual: bool = virtual
-        self.loc = {
-            'll': 0,
-            'ur': 0,
-            'ul': 0,
-            'lr': 0,
-            'l': 0,
-            'r': 0,
-            't': 0,
-            'b': 0,
-            'cl': 0,
-            'cr': 0,
-            'ct': 0,
-            'cb': 0,
-            'c': 0
-        }
-        self.edges = ['l', 'r', 'b', 't']
-        self.v_edges = ['t', 'b']
-        self.h_edges = ['l', 'r']
 
         # Init rect locations
         self.update_dict()
@@ -102,12 +108,10 @@ class Rectangle(VirtualObj):
 
     @layer.setter
     def layer(self, value):
-        if isinstance(value, tuple) and len(value) == 2:
-            self._lpp = value
-        elif isinstance(value, list) and len(value) == 2:
-            self._lpp = tuple(value)
+        if isinstance(value, (tuple, list)) and len(value) == 2:
+            self._lpp = intern_lpp(value[0], value[1])
         elif isinstance(value, str):
-            self._lpp = (value, 'drawing')
+            self._lpp = intern_lpp(value)
         else:
             raise ValueError(f"{value} cannot be used as a layer or layer purpose pair")
 
@@ -117,8 +121,8 @@ class Rectangle(VirtualObj):
 
     @lpp.setter
     def lpp(self, value):
-        if len(value == 2):
-            self._lpp = tuple(value)
+        if len(value) == 2:
+            self._lpp = intern_lpp(value[0], value[1])
         else:
             raise ValueError(f"{value} cannot be used as a layer purpose pair")
 
@@ -190,6 +194,33 @@ class Rectangle(VirtualObj):
             'c': XY([.5 * (self.ll.x + self.ur.x), .5 * (self.ur.y + self.ll.y)])
         }
 
+    def set_units(self, x0: int, y0: int, x1: int, y1: int, cx: int, cy: int) -> None:
+        """
+        Sets the corners and center of the rectangle in integer grid units and rebuilds the location dictionary
+        without re-conditioning each coordinate. Used by group operations that compute the values vectorized
+        """
+        res = self._res
+        from_units = XY.from_units
+        ll = self._ll
+        ur = self._ur
+        ll.set_units(x0, y0)
+        ur.set_units(x1, y1)
+        self.loc = {
+            'll': ll,
+            'ur': ur,
+            'ul': from_units(x0, y1, res),
+            'lr': from_units(x1, y0, res),
+            'l': ll.x,
+            'r': ur.x,
+            't': ur.y,
+            'b': ll.y,
+            'cl': from_units(x0, cy, res),
+            'cr': from_units(x1, cy, res),
+            'ct': from_units(cx, y1, res),
+            'cb': from_units(cx, y0, res),
+            'c': from_units(cx, cy, res)
+        }
+
     def set_dim(self, dim: str, size: float) -> 'Rectangle':
         """ Sets either the width or height of the rect to desired value. Maintains center location of rect """
         if dim == 'x':
@@ -0,0 +1,297 @@
+"""
+The RowPlacer module packs standard cells, typically LayoutAbstract masters, into abutting rows. Cell boundaries are
+read once per master and cached, and all legalization (snapping widths to the site, breaking rows and computing the
+abutment offsets and instance origins) is done on integer numpy arrays in units of the grid resolution. Cells can
+optionally be ordered by connectivity first, which keeps connected cells close together and reduces wirelength.
+Consecutive cells of the same master are emitted as a single VirtualInstArray.
+"""
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ACG.VirtualInst import VirtualInst
+from ACG.VirtualInstArray import VirtualInstArray
+
+
+class RowPlacer:
+    """
+    Places standard cells in rows of constant height. Odd rows are mirrored about the x axis so that power rails of
+    neighboring rows abut
+    """
+
+    def __init__(self,
+                 gen,
+                 row_height: Optional[float] = None,
+                 site_width: Optional[float] = None,
+                 row_width: Optional[float] = None,
+                 origin: Tuple[float, float] = (0, 0),
+                 flip_rows: bool = True
+                 ):
+        """
+        Parameters
+        ----------
+        gen : AyarLayoutGenerator
+            layout generator that receives the placed instances
+        row_height : Optional[float]
+            height of each row. Defaults to the common height of all placed cells
+        site_width : Optional[float]
+            placement site width. Cell widths are rounded up to multiples of it. Defaults to the greatest common
+            divisor of all cell widths
+        row_width : Optional[float]
+            maximum width of a row. Defaults to a width that makes the placement roughly square
+        origin : Tuple[float, float]
+            lower left corner of the first row
+        flip_rows : bool
+            if True, every other row is mirrored about the x axis
+        """
+        self.gen = gen
+        self.res = gen._res
+        self.row_height = row_height
+        self.site_width = site_width
+        self.row_width = row_width
+        self.origin = (round(origin[0] / self.res), round(origin[1] / self.res))
+        self.flip_rows = flip_rows
+        self._bounds: Dict[int, np.ndarray] = {}  # id(master) -> [x0, y0, x1, y1] of the boundary in resolution units
+
+        # Results of the last placement, in the order the cells were provided
+        self.locations: Optional[np.ndarray] = None  # (n, 4) placed boundaries in resolution units
+        self.rows: Optional[np.ndarray] = None  # (n,) row index of every cell
+
+    def __repr__(self):
+        return 'RowPlacer(row_height={}, site_width={}, row_width={})'.format(self.row_height, self.site_width,
+                                                                              self.row_width)
+
+    def get_bound(self, master) -> np.ndarray:
+        """ Returns the boundary of a master as [x0, y0, x1, y1] in resolution units, reading it only once """
+        key = id(master)
+        try:
+            return self._bounds[key]
+        except KeyError:
+            pass
+        bnd = master.export_locations().get('bnd')
+        if bnd is None:
+            raise ValueError('{} has no boundary and cannot be placed in a row'.format(master.__class__.__name__))
+        self._bounds[key] = np.rint(np.array([bnd.ll.x, bnd.ll.y, bnd.ur.x, bnd.ur.y]) / self.res).astype(np.int64)
+        return self._bounds[key]
+
+    @staticmethod
+    def order_by_nets(nets: Sequence[Sequence[str]], max_fanout: int = 32) -> np.ndarray:
+        """
+        Orders cells by a breadth first search over their nets (Cuthill-McKee ordering), so that cells sharing a net
+        end up next to each other. Nets with more than max_fanout cells, such as supplies, are ignored
+
+        Parameters
+        ----------
+        nets : Sequence[Sequence[str]]
+            names of the nets connected to each cell
+        max_fanout : int
+            nets connecting more cells than this do not influence the order
+
+        Returns
+        -------
+        order : np.ndarray
+            indices of the cells in placement order
+        """
+        num = len(nets)
+        net_cells: Dict[str, List[int]] = {}
+        for idx, cell_nets in enumerate(nets):
+            for net in cell_nets:
+                net_cells.setdefault(net, []).append(idx)
+        # Each cell refers to the cell lists of its nets instead of building a quadratic adjacency list
+        adjacent: List[List[List[int]]] = [[] for _ in range(num)]
+        for cells in net_cells.values():
+            if 1 < len(cells) <= max_fanout:
+                for idx in cells:
+                    adjacent[idx].append(cells)
+        degree = [sum(len(cells) for cells in adj) for adj in adjacent]
+
+        visited = [False] * num
+        order = []
+        # Start every connected group from its least connected cell
+        for seed in sorted(range(num), key=degree.__getitem__):
+            if visited[seed]:
+                continue
+            visited[seed] = True
+            queue = deque([seed])
+            while queue:
+                idx = queue.popleft()
+                order.append(idx)
+                for cells in adjacent[idx]:
+                    for other in cells:
+                        if not visited[other]:
+                            visited[other] = True
+                            queue.append(other)
+        return np.array(order, dtype=np.int64)
+
+    def place(self,
+              masters: Sequence,
+              nets: Optional[Sequence[Sequence[str]]] = None,
+              inst_names: Optional[Sequence[str]] = None,
+              use_arrays: bool = True,
+              max_fanout: int = 32
+              ) -> List[VirtualInst]:
+        """
+        Places the cells in rows and adds the resulting instances to the generator
+
+        Parameters
+        ----------
+        masters : Sequence
+            master of every cell to be placed
+        nets : Optional[Sequence[Sequence[str]]]
+            names of the nets connected to each cell. If provided, cells are ordered by connectivity and rows are
+            filled in alternating directions so that consecutive cells stay close across row breaks
+        inst_names : Optional[Sequence[str]]
+            name of every instance. Instance arrays are not used when names are provided
+        use_arrays : bool
+            if True, abutting cells of the same master in a row are emitted as one VirtualInstArray
+        max_fanout : int
+            nets connecting more cells than this are ignored for ordering
+
+        Returns
+        -------
+        insts : List[VirtualInst]
+            the created instances and instance arrays
+        """
+        num = len(masters)
+        if num == 0:
+            return []
+        # Gather the cached boundary of every unique master
+        unique: Dict[int, int] = {}
+        unique_masters = []
+        master_idx = np.empty(num, dtype=np.int64)
+        for idx, master in enumerate(masters):
+            key = id(master)
+            if key not in unique:
+                unique[key] = len(unique_masters)
+                unique_masters.append(master)
+            master_idx[idx] = unique[key]
+        bounds = np.stack([self.get_bound(master) for master in unique_masters])
+
+        height = self._get_row_height(bounds)
+        site = self._get_site_width(bounds)
+        widths = -(-(bounds[:, 2] - bounds[:, 0]) // site) * site
+        cell_widths = widths[master_idx]
+
+        order = self.order_by_nets(nets, max_fanout=max_fanout) if nets is not None else np.arange(num)
+        ordered_widths = cell_widths[order]
+        row_width = self._get_row_width(ordered_widths, height, site)
+
+        # Break rows greedily: each row takes as many cells as fit, found with a binary search on the running width
+        ends = np.cumsum(ordered_widths)
+        starts = ends - ordered_widths
+        rows = np.empty(num, dtype=np.int64)
+        x = np.empty(num, dtype=np.int64)
+        first, row = 0, 0
+        while first < num:
+            last = int(np.searchsorted(ends, starts[first] + row_width, side='right'))
+            rows[first:last] = row
+            x[first:last] = starts[first:last] - starts[first]
+            if nets is not None and row % 2:
+                # Fill odd rows from right to left
+                x[first:last] = (ends[last - 1] - starts[first]) - x[first:last] - ordered_widths[first:last]
+            first, row = last, row + 1
+
+        mirrored = (rows % 2 == 1) if self.flip_rows else np.zeros(num, dtype=bool)
+        x += self.origin[0]
+        y = rows * height + self.origin[1]
+        ordered_bounds = bounds[master_idx[order]]
+        origin_x = x - ordered_bounds[:, 0]
+        # Mirrored cells have their boundary at [-y1, -y0] relative to the origin
+        origin_y = np.where(mirrored, y + ordered_bounds[:, 3], y - ordered_bounds[:, 1])
+
+        self.rows = np.empty(num, dtype=np.int64)
+        self.rows[order] = rows
+        self.locations = np.empty((num, 4), dtype=np.int64)
+        self.locations[order] = np.stack([x, y, x + ordered_widths, y + height], axis=1)
+
+        insts = self._create_insts(unique_masters, master_idx[order], order, rows, x, ordered_widths,
+                                   origin_x, origin_y, mirrored, inst_names, use_arrays and inst_names is None)
+        self.gen._db['instance'].extend(insts)
+        return insts
+
+    def _get_row_height(self, bounds: np.ndarray) -> int:
+        if self.row_height is not None:
+            return round(self.row_height / self.res)
+        heights = np.unique(bounds[:, 3] - bounds[:, 1])
+        if len(heights) > 1:
+            raise ValueError('Cells have different heights {}, provide row_height'.format(
+                np.round(heights * self.res, 3).tolist()))
+        return int(heights[0])
+
+    def _get_site_width(self, bounds: np.ndarray) -> int:
+        if self.site_width is not None:
+            return round(self.site_width / self.res)
+        return max(int(np.gcd.reduce(bounds[:, 2] - bounds[:, 0])), 1)
+
+    def _get_row_width(self, widths: np.ndarray, height: int, site: int) -> int:
+        if self.row_width is not None:
+            row_width = round(self.row_width / self.res)
+        else:
+            row_width = int(np.sqrt(widths.sum() * height))
+            row_width = -(-row_width // site) * site
+        if row_width < widths.max():
+            raise ValueError('Row width {} is smaller than the widest cell'.format(round(row_width * self.res, 3)))
+        return row_width
+
+    def _create_insts(self, unique_masters, master_idx, order, rows, x, widths, origin_x, origin_y, mirrored,
+                      inst_names, use_arrays) -> List[VirtualInst]:
+        """ Creates the instances, grouping abutting cells of the same master into arrays if use_arrays is True """
+        res = self.res
+        num = len(order)
+        if use_arrays:
+            # Sort by row and x, then split wherever the master changes or the cells do not abut
+            by_pos = np.lexsort((x, rows))
+            idx_sorted = master_idx[by_pos]
+            x_sorted = x[by_pos]
+            breaks = np.ones(num, dtype=bool)
+            breaks[1:] = (idx_sorted[1:] != idx_sorted[:-1]) | (rows[by_pos][1:] != rows[by_pos][:-1]) | \
+                         (x_sorted[1:] != x_sorted[:-1] + widths[by_pos][:-1])
+            run_starts = np.flatnonzero(breaks)
+            run_lengths = np.diff(np.append(run_starts, num))
+            heads = by_pos[run_starts]
+        else:
+            heads = np.arange(num)
+            run_lengths = np.ones(num, dtype=np.int64)
+
+        insts = []
+        for head, length, ox, oy, flip, master, width in zip(heads.tolist(), run_lengths.tolist(),
+                                                            origin_x[heads].tolist(), origin_y[heads].tolist(),
+                                                            mirrored[heads].tolist(), master_idx[heads].tolist(),
+                                                            widths[heads].tolist()):
+            origin = (round(ox * res, 3), round(oy * res, 3))
+            orient = 'MX' if flip else 'R0'
+            if length > 1:
+                insts.append(VirtualInstArray(unique_masters[master], origin=origin, orient=orient,
+                                              nx=length, spx=round(width * res, 3)))
+            else:
+                name = inst_names[order[head]] if inst_names is not None else None
+                insts.append(VirtualInst(unique_masters[master], origin=origin, orient=orient, inst_name=name))
+        return insts
+
+    def get_wirelength(self, nets: Sequence[Sequence[str]], max_fanout: Optional[int] = None) -> float:
+        """
+        Returns the total half perimeter wirelength of the last placement, measured between cell centers
+
+        Parameters
+        ----------
+        nets : Sequence[Sequence[str]]
+            names of the nets connected to each cell
+        max_fanout : Optional[int]
+            if provided, nets connecting more cells than this are ignored
+        """
+        net_ids: Dict[str, int] = {}
+        pairs = [(net_ids.setdefault(net, len(net_ids)), idx) for idx, cell_nets in enumerate(nets)
+                 for net in cell_nets]
+        if not pairs:
+            return 0.
+        pairs = np.array(pairs, dtype=np.int64)
+        pairs = pairs[np.argsort(pairs[:, 0], kind='stable')]
+        centers = (self.locations[:, :2] + self.locations[:, 2:]) / 2
+        pts = centers[pairs[:, 1]]
+        splits = np.flatnonzero(np.diff(pairs[:, 0])) + 1
+        starts = np.concatenate([[0], splits])
+        counts = np.diff(np.append(starts, len(pairs)))
+        span = np.maximum.reduceat(pts, starts) - np.minimum.reduceat(pts, starts)
+        keep = counts > 1 if max_fanout is None else (counts > 1) & (counts <= max_fanout)
+        return round(float(span[keep].sum()) * self.res, 3)
@@ -0,0 +1,304 @@
+"""
+The ShapeStore module keeps the coordinates of drawn rectangles and vias out of core, for layouts with more shapes than
+fit in memory as Python objects. Coordinates are appended to growable memory-mapped integer arrays in a temporary
+directory on local disk, in units of the grid resolution, and only layer purpose pairs and via types are kept in memory.
+Committing and exporting read the arrays chunk by chunk, so peak memory is bounded by the chunk size rather than by the
+number of shapes. Pages that were already written are flushed to disk by the OS as needed.
+"""
+import os
+import shutil
+import tempfile
+import weakref
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ACG.Rectangle import Rectangle, intern_lpp
+
+lpp_type = Tuple[str, str]
+
+
+class MappedArray:
+    """
+    A two dimensional int64 array backed by a file, which doubles its capacity when it is full. Rows are appended
+    through a small in-memory buffer so that adding single rows does not touch the memory map every time
+    """
+
+    def __init__(self, path: str, width: int, capacity: int = 1 << 16, buffer_size: int = 1 << 12):
+        """
+        Parameters
+        ----------
+        path : str
+            backing file of the array. It is created or truncated
+        width : int
+            number of columns
+        capacity : int
+            number of rows reserved initially
+        buffer_size : int
+            number of single rows collected in memory before they are written to the memory map
+        """
+        self.path = path
+        self.width = width
+        self.buffer_size = buffer_size
+        self._size = 0
+        self._buffer: List[tuple] = []
+        self._map = None
+        self._resize(max(capacity, 1))
+
+    def __repr__(self):
+        return 'MappedArray(path={}, rows={})'.format(self.path, len(self))
+
+    def __len__(self):
+        return self._size + len(self._buffer)
+
+    def _resize(self, capacity: int) -> None:
+        if self._map is not None:
+            self._map.flush()
+            self._map = None
+        with open(self.path, 'ab') as f:
+            f.truncate(capacity * self.width * 8)
+        self._map = np.memmap(self.path, dtype=np.int64, mode='r+', shape=(capacity, self.width))
+
+    def append(self, row: tuple) -> None:
+        """ Appends a single row """
+        self._buffer.append(row)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def extend(self, rows: np.ndarray) -> None:
+        """ Appends an (n, width) array of rows """
+        self.flush()
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1, self.width)
+        end = self._size + len(rows)
+        capacity = len(self._map)
+        if end > capacity:
+            while capacity < end:
+                capacity *= 2
+            self._resize(capacity)
+        self._map[self._size:end] = rows
+        self._size = end
+
+    def flush(self) -> None:
+        """ Writes buffered rows to the memory map """
+        if self._buffer:
+            rows, self._buffer = self._buffer, []
+            self.extend(np.array(rows, dtype=np.int64))
+
+    def view(self) -> np.ndarray:
+        """ Returns all rows as a view into the memory map """
+        self.flush()
+        return self._map[:self._size]
+
+    def chunks(self, chunk_size: int) -> Iterator[np.ndarray]:
+        """ Yields consecutive views of at most chunk_size rows """
+        data = self.view()
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+
+    def close(self) -> None:
+        self._map = None
+        self._buffer = []
+
+
+class ShapeStore:
+    """
+    Out-of-core storage for the drawn rectangles and vias of one layout. Rectangles are stored as rows of
+    [x0, y0, x1, y1, lpp] and vias as rows of [x0, y0, x1, y1, via type, nx, ny, spx, spy], where lpp and via type index
+    into small in-memory tables
+    """
+
+    def __init__(self, directory: Optional[str] = None, res: float = .001, chunk_size: int = 1 << 16):
+        """
+        Parameters
+        ----------
+        directory : Optional[str]
+            directory on local disk that receives the backing files. Defaults to the system temporary directory. The
+            files are deleted when the store is closed or garbage collected
+        res : float
+            grid resolution of the coordinates
+        chunk_size : int
+            number of rows read at once when committing or exporting
+        """
+        self.res = res
+        self.chunk_size = chunk_size
+        self.path = tempfile.mkdtemp(prefix='acg_shapes_', dir=directory)
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.path, ignore_errors=True)
+        self.lpps: List[lpp_type] = []
+        self._lpp_ids: Dict[lpp_type, int] = {}
+        self.via_types: List[Tuple[str, str, Optional[str], bool]] = []  # (bottom layer, top layer, bot_dir, extend)
+        self._via_ids: Dict[tuple, int] = {}
+        self.rects = MappedArray(os.path.join(self.path, 'rect.bin'), 5)
+        self.vias = MappedArray(os.path.join(self.path, 'via.bin'), 9)
+        self._bounds = [None, None, None, None]  # running bounding box of all shapes in resolution units
+
+    def __repr__(self):
+        return 'ShapeStore(path={}, rects={}, vias={})'.format(self.path, len(self.rects), len(self.vias))
+
+    def __len__(self):
+        return len(self.rects) + len(self.vias)
+
+    def close(self) -> None:
+        """ Releases the memory maps and deletes the backing files """
+        self.rects.close()
+        self.vias.close()
+        self._finalizer()
+
+    """ Adding shapes """
+
+    def lpp_id(self, lpp) -> int:
+        lpp = intern_lpp(lpp) if isinstance(lpp, str) else intern_lpp(lpp[0], lpp[1])
+        idx = self._lpp_ids.get(lpp)
+        if idx is None:
+            idx = self._lpp_ids[lpp] = len(self.lpps)
+            self.lpps.append(lpp)
+        return idx
+
+    def via_type_id(self, bot_layer: str, top_layer: str, bot_dir: Optional[str], extend: bool) -> int:
+        key = (bot_layer, top_layer, bot_dir, bool(extend))
+        idx = self._via_ids.get(key)
+        if idx is None:
+            idx = self._via_ids[key] = len(self.via_types)
+            self.via_types.append(key)
+        return idx
+
+    def _update_bounds(self, x0: int, y0: int, x1: int, y1: int) -> None:
+        bounds = self._bounds
+        if bounds[0] is None:
+            self._bounds = [x0, y0, x1, y1]
+        else:
+            self._bounds = [min(bounds[0], x0), min(bounds[1], y0), max(bounds[2], x1), max(bounds[3], y1)]
+
+    def _update_bounds_array(self, coords: np.ndarray) -> None:
+        if len(coords):
+            self._update_bounds(*coords[:, :2].min(axis=0).tolist(), *coords[:, 2:4].max(axis=0).tolist())
+
+    def add_rect(self, rect: Rectangle) -> None:
+        """ Stores the coordinates of a rectangle. The Rectangle object itself is not referenced """
+        ll, ur = rect.ll, rect.ur
+        self.rects.append((ll._x, ll._y, ur._x, ur._y, self.lpp_id(rect.lpp)))
+        self._update_bounds(ll._x, ll._y, ur._x, ur._y)
+
+    def add_rects(self, lpp, coords: np.ndarray) -> None:
+        """ Stores an (n, 4) array of [x0, y0, x1, y1] rectangles in resolution units on one layer purpose pair """
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, 4)
+        if len(coords) == 0:
+            return
+        lpp_col = np.full((len(coords), 1), self.lpp_id(lpp), dtype=np.int64)
+        self.rects.extend(np.concatenate([coords, lpp_col], axis=1))
+        self._update_bounds_array(coords)
+
+    def add_via(self, via) -> None:
+        """ Stores every metal pair of a ViaStack or ViaArray """
+        overlap = via.loc['overlap']
+        x0, y0, x1, y1 = overlap.ll._x, overlap.ll._y, overlap.ur._x, overlap.ur._y
+        if hasattr(via, 'nx'):
+            array = (via.nx, via.ny, round(via.spx / self.res), round(via.spy / self.res))
+        else:
+            array = (1, 1, 0, 0)
+        for bot_layer, top_layer in via.metal_pairs:
+            self.vias.append((x0, y0, x1, y1, self.via_type_id(bot_layer, top_layer, via.bot_dir, via.extend)) + array)
+        self._update_bounds(x0, y0, x1 + (array[0] - 1) * array[2], y1 + (array[1] - 1) * array[3])
+
+    def add_vias(self, bot_layer: str, top_layer: str, bot_dir: Optional[str], extend: bool,
+                 coords: np.ndarray) -> None:
+        """ Stores an (n, 4) array of via regions in resolution units between two adjacent metal layers """
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, 4)
+        if len(coords) == 0:
+            return
+        rows = np.zeros((len(coords), 9), dtype=np.int64)
+        rows[:, :4] = coords
+        rows[:, 4] = self.via_type_id(bot_layer, top_layer, bot_dir, extend)
+        rows[:, 5:7] = 1
+        self.vias.extend(rows)
+        self._update_bounds_array(coords)
+
+    """ Reading shapes """
+
+    def get_bound(self, layer='OUTLINE') -> Optional[Rectangle]:
+        """ Returns a virtual rectangle enclosing all stored shapes, or None if the store is empty """
+        if self._bounds[0] is None:
+            return None
+        x0, y0, x1, y1 = (round(val * self.res, 3) for val in self._bounds)
+        return Rectangle([[x0, y0], [x1, y1]], layer, virtual=True)
+
+    @staticmethod
+    def _group(chunk: np.ndarray, column: int) -> Iterator[Tuple[int, np.ndarray]]:
+        """ Splits a chunk of rows by the value of one column """
+        keys = chunk[:, column]
+        if len(keys) and (keys == keys[0]).all():
+            yield int(keys[0]), chunk
+            return
+        order = np.argsort(keys, kind='stable')
+        chunk = chunk[order]
+        keys = keys[order]
+        starts = np.flatnonzero(np.diff(keys)) + 1
+        for rows in np.split(chunk, starts):
+            yield int(rows[0, column]), rows
+
+    def iter_rects(self) -> Iterator[Tuple[lpp_type, np.ndarray]]:
+        """ Yields (lpp, (n, 4) coordinates) chunk by chunk. A layer purpose pair can appear in several chunks """
+        for chunk in self.rects.chunks(self.chunk_size):
+            for lpp, rows in self._group(chunk, 4):
+                yield self.lpps[lpp], rows[:, :4]
+
+    def iter_vias(self) -> Iterator[Tuple[Tuple[str, str, Optional[str], bool], np.ndarray]]:
+        """
+        Yields ((bottom layer, top layer, bot_dir, extend), (n, 8) rows) chunk by chunk. Rows contain the via region
+        [x0, y0, x1, y1] followed by the array size and pitch [nx, ny, spx, spy] in resolution units
+        """
+        for chunk in self.vias.chunks(self.chunk_size):
+            for via_type, rows in self._group(chunk, 4):
+                yield self.via_types[via_type], np.delete(rows, 4, axis=1)
+
+    def commit_rects(self, backend) -> int:
+        """ Streams all stored rectangles to a layout backend and returns their number """
+        for lpp, coords in self.iter_rects():
+            backend.add_rects(lpp, coords, self.res)
+        return len(self.rects)
+
+    def commit_vias(self, backend) -> int:
+        """ Streams all stored vias to a layout backend and returns their number """
+        for (bot_layer, top_layer, bot_dir, extend), rows in self.iter_vias():
+            backend.add_vias(bot_layer, top_layer, bot_dir, extend, rows, self.res)
+        return len(self.vias)
+
+    def iter_tables(self) -> Iterator:
+        """ Yields the stored shapes as one ShapeTable per chunk, in the layer conventions of ShapeTable """
+        from ACG.ShapeTable import ShapeTable
+
+        for chunk in self.rects.chunks(self.chunk_size):
+            yield ShapeTable(chunk[:, :4], chunk[:, 4], self.lpps, res=self.res)
+        names = [('V' + bot_layer + '_' + top_layer, 'via') for bot_layer, top_layer, _, _ in self.via_types]
+        for via_type, rows in self.iter_vias():
+            nx, ny, spx, spy = (rows[:, col] for col in range(4, 8))
+            if (nx == 1).all() and (ny == 1).all():
+                coords = rows[:, :4]
+            else:
+                # Expand via arrays into one region per element
+                count = nx * ny
+                idx = np.repeat(np.arange(len(rows)), count)
+                element = np.arange(len(idx)) - np.repeat(np.cumsum(count) - count, count)
+                dx = (element % nx[idx]) * spx[idx]
+                dy = (element // nx[idx]) * spy[idx]
+                coords = rows[idx, :4] + np.stack([dx, dy, dx, dy], axis=1)
+            yield ShapeTable.from_arrays({names[self._via_ids[via_type]]: [coords]}, res=self.res)
+
+    def write_parquet(self, path: str, **kwargs) -> None:
+        """
+        Writes all stored shapes to a Parquet file with the schema of ShapeTable.write_parquet, one row group per chunk.
+        Keyword arguments are passed to pyarrow.parquet.ParquetWriter
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        from ACG.ShapeTable import ShapeTable
+
+        # Dictionaries differ between chunks, so layer and purpose are stored as plain strings. The schema is fixed up
+        # front so that an empty store still writes a valid, empty file
+        schema = pa.schema([(name, pa.int64()) for name in ShapeTable.columns] +
+                           [('layer', pa.string()), ('purpose', pa.string())], metadata={'res': str(self.res)})
+        with pq.ParquetWriter(path, schema, **kwargs) as writer:
+            for table in self.iter_tables():
+                batch = table.to_arrow()
+                batch = pa.RecordBatch.from_arrays(
+                    [batch.column(idx) for idx in range(4)] +
+                    [batch.column(idx).cast(pa.string()) for idx in range(4, 6)], schema=schema)
+                writer.write_table(pa.Table.from_batches([batch], schema=schema))
@@ -0,0 +1,249 @@
+"""
+The ShapeTable module exports the shapes of a layout as columnar arrays for analysis and downstream tools. Shapes are
+stored as one integer coordinate array in units of the grid resolution, grouped by layer, with every coordinate column
+contiguous in memory. Per-layer arrays are returned as NumPy views into that array, and Arrow record batches wrap the
+same buffers without copying them. Parquet files are written through Arrow.
+
+pyarrow is only required for the Arrow and Parquet methods, and is imported when they are called.
+"""
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ACG.VirtualInst import transform_rect_array
+
+lpp_type = Tuple[str, str]
+
+
+class ShapeTable:
+    """
+    Rectangles of a layout grouped by layer purpose pair. coords is a (4, n) array whose rows are the x0, y0, x1 and
+    y1 columns in resolution units
+    """
+    columns = ('x0', 'y0', 'x1', 'y1')
+
+    def __init__(self, coords: np.ndarray, layer_ids: np.ndarray, layers: List[lpp_type], res: float = .001):
+        """
+        Parameters
+        ----------
+        coords : np.ndarray
+            (n, 4) array of [x0, y0, x1, y1] in resolution units
+        layer_ids : np.ndarray
+            (n,) index into layers of every shape
+        layers : List[Tuple[str, str]]
+            layer purpose pairs of the table
+        res : float
+            grid resolution of the coordinates
+        """
+        self.res = res
+        self.layers = list(layers)
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, 4)
+        layer_ids = np.asarray(layer_ids, dtype=np.int32)
+        order = np.argsort(layer_ids, kind='stable')
+        self.layer_ids = layer_ids[order]
+        # Column-major storage keeps every coordinate column contiguous for zero-copy export
+        self.coords = np.ascontiguousarray(coords[order].T)
+        bounds = np.searchsorted(self.layer_ids, np.arange(len(self.layers) + 1))
+        self._slices = {lpp: (int(bounds[idx]), int(bounds[idx + 1])) for idx, lpp in enumerate(self.layers)}
+
+    def __repr__(self):
+        return 'ShapeTable({})'.format({'{}:{}'.format(*lpp): stop - start
+                                        for lpp, (start, stop) in self._slices.items() if stop > start})
+
+    def __len__(self):
+        return self.coords.shape[1]
+
+    @classmethod
+    def empty(cls, res: float = .001) -> 'ShapeTable':
+        return cls(np.zeros((0, 4), dtype=np.int64), np.zeros(0, dtype=np.int32), [], res=res)
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[lpp_type, Iterable[np.ndarray]], res: float = .001) -> 'ShapeTable':
+        """ Creates a table from (n, 4) coordinate arrays grouped by layer purpose pair """
+        layers, coords, layer_ids = [], [], []
+        for lpp, lpp_arrays in arrays.items():
+            for arr in lpp_arrays:
+                arr = np.asarray(arr, dtype=np.int64).reshape(-1, 4)
+                if len(arr) == 0:
+                    continue
+                if not layers or layers[-1] != lpp:
+                    layers.append(lpp)
+                coords.append(arr)
+                layer_ids.append(np.full(len(arr), len(layers) - 1, dtype=np.int32))
+        if not coords:
+            return cls.empty(res=res)
+        return cls(np.concatenate(coords), np.concatenate(layer_ids), layers, res=res)
+
+    @classmethod
+    def from_generator(cls, gen, include_virtual: bool = False) -> 'ShapeTable':
+        """
+        Exports the shapes drawn by a generator itself. Rectangles and rectangle arrays are stored on their layer
+        purpose pair, and vias as their overlap region on ('V<bottom>_<top>', 'via')
+
+        Parameters
+        ----------
+        gen : AyarLayoutGenerator
+            generator whose shapes are exported
+        include_virtual : bool
+            if True, virtual rectangles are exported as well
+        """
+        arrays: Dict[lpp_type, list] = {}
+        rects: Dict[lpp_type, list] = {}
+        for rect in gen._db['rect']:
+            if include_virtual or rect.virtual is False:
+                rects.setdefault(rect.lpp, []).append((rect.ll._x, rect.ll._y, rect.ur._x, rect.ur._y))
+        for lpp, coords in rects.items():
+            arrays.setdefault(lpp, []).append(np.array(coords, dtype=np.int64))
+        for rect_array in gen._db['rect_array']:
+            if include_virtual or rect_array.virtual is False:
+                arrays.setdefault(rect_array.lpp, []).append(rect_array.to_array())
+        for via in gen._db['via']:
+            if hasattr(via, 'to_array'):
+                overlap = via.to_array()
+            else:
+                rect = via.loc['overlap']
+                overlap = np.array([[rect.ll._x, rect.ll._y, rect.ur._x, rect.ur._y]], dtype=np.int64)
+            for bot_layer, top_layer in via.metal_pairs:
+                arrays.setdefault(('V' + bot_layer + '_' + top_layer, 'via'), []).append(overlap)
+        for via in gen._db['prim_via']:
+            rect = via.loc['overlap']
+            arrays.setdefault((via.via_id, 'via'), []).append(
+                np.array([[rect.ll._x, rect.ll._y, rect.ur._x, rect.ur._y]], dtype=np.int64))
+        table = cls.from_arrays(arrays, res=gen._res)
+        if getattr(gen, 'shapes', None) is not None and len(gen.shapes):
+            # Shapes in the out-of-core store are read chunk by chunk, use ShapeStore.write_parquet to avoid loading
+            # them all at once
+            table = cls.concat([table] + list(gen.shapes.iter_tables()), res=gen._res)
+        return table
+
+    @classmethod
+    def concat(cls, tables: Iterable['ShapeTable'], res: float = .001) -> 'ShapeTable':
+        """ Merges several tables into one """
+        arrays: Dict[lpp_type, list] = {}
+        for table in tables:
+            for lpp in table.layers:
+                arrays.setdefault(lpp, []).append(table[lpp])
+        return cls.from_arrays(arrays, res=res)
+
+    """ Access """
+
+    def _lpp(self, layer) -> lpp_type:
+        return (layer, 'drawing') if isinstance(layer, str) else tuple(layer)
+
+    def __contains__(self, layer) -> bool:
+        return self._lpp(layer) in self._slices
+
+    def __getitem__(self, layer) -> np.ndarray:
+        """ Returns an (n, 4) view of the shapes on a layer. A str selects the 'drawing' purpose """
+        start, stop = self._slices.get(self._lpp(layer), (0, 0))
+        return self.coords[:, start:stop].T
+
+    def items(self):
+        """ Yields (lpp, shapes) for every layer purpose pair """
+        for lpp in self.layers:
+            yield lpp, self[lpp]
+
+    def column(self, name: str, layer=None) -> np.ndarray:
+        """ Returns a contiguous view of one coordinate column, optionally for a single layer """
+        values = self.coords[self.columns.index(name)]
+        if layer is None:
+            return values
+        start, stop = self._slices.get(self._lpp(layer), (0, 0))
+        return values[start:stop]
+
+    def area(self, layer=None) -> float:
+        """ Returns the summed area of the shapes in square microns. Overlaps are counted multiple times """
+        x0, y0, x1, y1 = (self.column(name, layer) for name in self.columns)
+        return float(((x1 - x0) * (y1 - y0)).sum()) * self.res ** 2
+
+    """ Hierarchy """
+
+    def transform(self, origin: Tuple[int, int], orient: str) -> 'ShapeTable':
+        """ Returns a new table with all shapes moved by an instance transformation in resolution units """
+        return ShapeTable(transform_rect_array(self.coords.T, origin, orient), self.layer_ids, self.layers,
+                          res=self.res)
+
+    def tile(self, offsets: np.ndarray) -> 'ShapeTable':
+        """ Returns a new table with a copy of every shape shifted by each (dx, dy) offset in resolution units """
+        offsets = np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+        shift = np.concatenate([offsets, offsets], axis=1)[:, None, :]
+        coords = (self.coords.T[None, :, :] + shift).reshape(-1, 4)
+        return ShapeTable(coords, np.tile(self.layer_ids, len(offsets)), self.layers, res=self.res)
+
+    """ Arrow and Parquet """
+
+    def to_arrow(self, layer=None):
+        """
+        Returns the shapes as a pyarrow RecordBatch with the coordinate columns and dictionary encoded 'layer' and
+        'purpose' columns. Coordinate buffers are shared with this table, not copied
+
+        Parameters
+        ----------
+        layer : Optional[Union[str, Tuple[str, str]]]
+            if provided, only export the shapes of this layer
+        """
+        import pyarrow as pa
+
+        if layer is None:
+            start, stop = 0, len(self)
+        else:
+            start, stop = self._slices.get(self._lpp(layer), (0, 0))
+        arrays = [pa.array(self.coords[idx, start:stop]) for idx in range(4)]
+        ids = pa.array(self.layer_ids[start:stop])
+        arrays.append(pa.DictionaryArray.from_arrays(ids, pa.array([lpp[0] for lpp in self.layers], pa.string())))
+        arrays.append(pa.DictionaryArray.from_arrays(ids, pa.array([lpp[1] for lpp in self.layers], pa.string())))
+        return pa.RecordBatch.from_arrays(arrays, names=list(self.columns) + ['layer', 'purpose'])
+
+    def write_parquet(self, path: str, **kwargs) -> None:
+        """ Writes the shapes to a Parquet file. Keyword arguments are passed to pyarrow.parquet.write_table """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_batches([self.to_arrow()])
+        table = table.replace_schema_metadata({'res': str(self.res)})
+        pq.write_table(table, path, **kwargs)
+
+    @classmethod
+    def read_parquet(cls, path: str) -> 'ShapeTable':
+        """ Reads a table written by write_parquet """
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path)
+        metadata = table.schema.metadata or {}
+        res = float(metadata.get(b'res', b'.001'))
+        coords = np.stack([table.column(name).to_numpy() for name in cls.columns], axis=1)
+        # Parquet stores the layer and purpose dictionaries independently, so layer purpose pairs are rebuilt
+        layer = table.column('layer').combine_chunks()
+        purpose = table.column('purpose').combine_chunks()
+        if not hasattr(layer, 'dictionary'):
+            layer, purpose = layer.dictionary_encode(), purpose.dictionary_encode()
+        pairs = np.stack([layer.indices.to_numpy(), purpose.indices.to_numpy()], axis=1)
+        unique, layer_ids = np.unique(pairs, axis=0, return_inverse=True)
+        layer_names, purpose_names = layer.dictionary.to_pylist(), purpose.dictionary.to_pylist()
+        lpps = [(layer_names[lay], purpose_names[pur]) for lay, pur in unique.tolist()]
+        return cls(coords, layer_ids.ravel(), lpps, res=res)
+
+
+def flatten_shapes(gen, include_virtual: bool = False, _memo: Optional[Dict[int, ShapeTable]] = None) -> ShapeTable:
+    """
+    Exports the shapes of a generator and of all of its instances, transformed to the top level. The flattened table of
+    every master is computed once, and then transformed (and tiled for instance arrays) for each of its instances.
+    Masters that are not ACG generators contribute no shapes
+    """
+    memo = {} if _memo is None else _memo
+    key = id(gen)
+    if key in memo:
+        return memo[key]
+    tables = [ShapeTable.from_generator(gen, include_virtual=include_virtual)]
+    for inst in gen._db['instance']:
+        if not hasattr(inst.master, '_db'):
+            continue
+        master_table = flatten_shapes(inst.master, include_virtual=include_virtual, _memo=memo)
+        if len(master_table) == 0:
+            continue
+        res = inst.master._res
+        table = master_table.transform((round(inst.origin.x / res), round(inst.origin.y / res)), inst.orient)
+        if hasattr(inst, 'nx') and len(inst) > 1:
+            table = table.tile(inst._offsets(res))
+        tables.append(table)
+    memo[key] = tables[0] if len(tables) == 1 else ShapeTable.concat(tables, res=gen._res)
+    return memo[key]
@@ -0,0 +1,157 @@
+"""
+The SimData module gives lazy access to simulation results saved as HDF5 files. Files are only opened when a dataset is
+read, and a small LRU cache limits how many of them are open at once. Datasets are returned as handles that read only
+the requested slice: contiguous datasets are memory mapped directly, while chunked or compressed datasets are read
+chunk by chunk through h5py.
+
+The number of files kept open is set by the 'ACG_SIM_OPEN_FILES' environment variable and defaults to 8.
+"""
+import os
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class SimFileCache:
+    """
+    LRU cache of open HDF5 files. The least recently used file is closed when more than max_open files are open
+    """
+
+    def __init__(self, max_open: int = 8):
+        self.max_open = max_open
+        self._files = OrderedDict()
+
+    def __len__(self):
+        return len(self._files)
+
+    def get(self, fname: str):
+        """ Returns the open h5py file for fname, opening it if needed """
+        # h5py is a BAG dependency, only import it when results are actually read
+        import h5py
+
+        try:
+            f = self._files[fname]
+            self._files.move_to_end(fname)
+            return f
+        except KeyError:
+            pass
+        f = h5py.File(fname, 'r')
+        self._files[fname] = f
+        while len(self._files) > self.max_open:
+            _, old = self._files.popitem(last=False)
+            old.close()
+        return f
+
+    def close(self, fname: Optional[str] = None) -> None:
+        """ Closes the provided file, or all files if fname is None """
+        names = list(self._files) if fname is None else [fname]
+        for name in names:
+            f = self._files.pop(name, None)
+            if f is not None:
+                f.close()
+
+
+file_cache = SimFileCache(max_open=int(os.environ.get('ACG_SIM_OPEN_FILES', 8)))
+
+
+class LazyDataset:
+    """
+    Handle to a single dataset of a simulation result file. Indexing it reads only the selected elements, and
+    np.asarray reads the whole dataset
+    """
+    __slots__ = ('fname', 'name', 'shape', 'dtype', 'sweep_params', '_offset', '_mmap')
+
+    def __init__(self, fname: str, name: str, shape: Tuple[int, ...], dtype: np.dtype,
+                 sweep_params: Optional[List[str]], offset: Optional[int]):
+        self.fname = fname
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+        self.sweep_params = sweep_params
+        self._offset = offset  # Byte offset of contiguous, uncompressed data in the file, None otherwise
+        self._mmap = None
+
+    def __repr__(self):
+        return 'LazyDataset(name={}, shape={}, dtype={})'.format(self.name, self.shape, self.dtype)
+
+    def __len__(self):
+        return self.shape[0] if self.shape else 1
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    @property
+    def data(self):
+        """ Returns a memory map of contiguous datasets, or the h5py dataset for chunked/compressed ones """
+        if self._offset is not None:
+            if self._mmap is None:
+                self._mmap = np.memmap(self.fname, dtype=self.dtype, mode='r', offset=self._offset, shape=self.shape)
+            return self._mmap
+        return file_cache.get(self.fname)[self.name]
+
+    def __getitem__(self, item):
+        return self.data[item]
+
+    def __array__(self, dtype=None, copy=None):
+        arr = np.asarray(self.data[()])
+        if dtype is not None:
+            return arr.astype(dtype)
+        # Contiguous datasets are read-only views of the memory map unless a copy is requested
+        return arr.copy() if copy else arr
+
+
+class LazySimResults(Mapping):
+    """
+    Results of one simulation file with the same keys as bag.data.load_sim_file: one entry per dataset, and a
+    'sweep_params' dict mapping each output to the names of the sweep variables of its axes. Only the file structure is
+    read when the handle is created
+    """
+
+    def __init__(self, fname: str):
+        self.fname = fname
+        self.sweep_params: Dict[str, List[str]] = {}
+        self._datasets: Dict[str, LazyDataset] = {}
+        f = file_cache.get(fname)
+        for name, dset in f.items():
+            swp = None
+            if 'sweep_params' in dset.attrs:
+                swp = [val.decode('utf-8') if isinstance(val, bytes) else str(val)
+                       for val in dset.attrs['sweep_params']]
+                self.sweep_params[name] = swp
+            offset = None
+            if dset.chunks is None and dset.compression is None and dset.dtype.kind in 'biufc':
+                offset = dset.id.get_offset()
+            self._datasets[name] = LazyDataset(fname, name, dset.shape, dset.dtype, swp, offset)
+
+    def __repr__(self):
+        return 'LazySimResults(fname={}, datasets={})'.format(self.fname, list(self._datasets))
+
+    def __getitem__(self, key):
+        if key == 'sweep_params':
+            return self.sweep_params
+        return self._datasets[key]
+
+    def __iter__(self):
+        yield from self._datasets
+        yield 'sweep_params'
+
+    def __len__(self):
+        return len(self._datasets) + 1
+
+    def load(self, name: str) -> np.ndarray:
+        """ Reads a whole dataset into memory """
+        return np.asarray(self._datasets[name])
+
+
+def load_sim_file(fname: str) -> dict:
+    """
+    Reads every dataset of a simulation file into memory. Returns the same structure as bag.data.load_sim_file, which
+    it replaces when BAG is not available
+    """
+    results = LazySimResults(fname)
+    data = {name: np.array(results[name]) for name in results if name != 'sweep_params'}
+    data['sweep_params'] = dict(results.sweep_params)
+    return data
@@ -0,0 +1,160 @@
+"""
+The Sweep module describes parameter sweeps for layout generation. A sweep is built from a base parameter dict and a
+set of swept values (as a grid, zipped lists, random samples or any iterator of parameter dicts), and produces its points
+lazily so that sweeps of any size can be generated with constant memory. Duplicate points are dropped.
+
+Swept parameter names may use '.' to address nested dicts, e.g. 'tx_params.nf'.
+"""
+import copy
+import random
+import hashlib
+import itertools
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from ACG.Backend import freeze_params
+
+
+def set_param(params: dict, key: str, value: Any) -> None:
+    """ Sets a parameter in a nested dict, where '.' in key separates the nesting levels """
+    *path, last = key.split('.')
+    for name in path:
+        params = params.setdefault(name, {})
+    params[last] = value
+
+
+class ParamSweep:
+    """
+    Lazily produces unique parameter dicts from a sweep description
+    """
+
+    def __init__(self,
+                 points: Callable[[], Iterator[dict]],
+                 num_points: Optional[int] = None,
+                 dedup: bool = True
+                 ):
+        """
+        Parameters
+        ----------
+        points : Callable[[], Iterator[dict]]
+            function returning a new iterator over the raw sweep points
+        num_points : Optional[int]
+            number of raw points, if known in advance
+        dedup : bool
+            if True, points with the same parameters as a previous point are skipped
+        """
+        self._points = points
+        self.num_points = num_points
+        self.dedup = dedup
+
+    def __repr__(self):
+        return 'ParamSweep(num_points={})'.format(self.num_points)
+
+    def __iter__(self) -> Iterator[dict]:
+        if not self.dedup:
+            yield from self._points()
+            return
+        # Only a digest of each point is kept, so memory stays small for very large sweeps
+        seen = set()
+        for params in self._points():
+            digest = hashlib.sha1(repr(freeze_params(params)).encode('utf-8')).digest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+            yield params
+
+    @staticmethod
+    def _apply(base: dict, values: Dict[str, Any]) -> dict:
+        params = copy.deepcopy(base)
+        for key, val in values.items():
+            set_param(params, key, val)
+        return params
+
+    @classmethod
+    def grid(cls, base: dict, axes: Dict[str, List[Any]], dedup: bool = True) -> 'ParamSweep':
+        """ Sweeps the cartesian product of all axes. The last axis varies fastest """
+        keys = list(axes)
+        num_points = 1
+        for key in keys:
+            num_points *= len(axes[key])
+
+        def points():
+            for values in itertools.product(*(axes[key] for key in keys)):
+                yield cls._apply(base, dict(zip(keys, values)))
+
+        return cls(points, num_points=num_points, dedup=dedup)
+
+    @classmethod
+    def zip(cls, base: dict, axes: Dict[str, List[Any]], dedup: bool = True) -> 'ParamSweep':
+        """ Sweeps all axes together, which must have the same length """
+        keys = list(axes)
+        lengths = {len(axes[key]) for key in keys}
+        if len(lengths) > 1:
+            raise ValueError('zip sweep axes must have the same length, got {}'.format(
+                {key: len(axes[key]) for key in keys}))
+
+        def points():
+            for values in zip(*(axes[key] for key in keys)):
+                yield cls._apply(base, dict(zip(keys, values)))
+
+        return cls(points, num_points=lengths.pop() if lengths else 0, dedup=dedup)
+
+    @classmethod
+    def random(cls,
+               base: dict,
+               axes: Dict[str, Any],
+               num_points: int,
+               seed: Optional[int] = None,
+               dedup: bool = True
+               ) -> 'ParamSweep':
+        """
+        Samples num_points random points. A list axis is sampled uniformly from its values, and a [low, high] tuple
+        axis uniformly from the range (integers if both bounds are integers). The same seed gives the same points
+        """
+        def sample(rng, axis):
+            if isinstance(axis, tuple):
+                low, high = axis
+                if isinstance(low, int) and isinstance(high, int):
+                    return rng.randint(low, high)
+                return rng.uniform(low, high)
+            return rng.choice(axis)
+
+        def points():
+            rng = random.Random(seed)
+            for _ in range(num_points):
+                yield cls._apply(base, {key: sample(rng, axis) for key, axis in axes.items()})
+
+        return cls(points, num_points=num_points, dedup=dedup)
+
+    @classmethod
+    def from_iter(cls, params_iter: Iterable[dict], dedup: bool = True) -> 'ParamSweep':
+        """ Wraps any iterable of parameter dicts. An iterator can only be swept once """
+        num_points = len(params_iter) if hasattr(params_iter, '__len__') else None
+        return cls(lambda: iter(params_iter), num_points=num_points, dedup=dedup)
+
+    @classmethod
+    def from_spec(cls, base: dict, spec: dict) -> 'ParamSweep':
+        """
+        Creates a sweep from a spec file entry such as {'type': 'grid', 'params': {'nf': [2, 4, 8]}}. Random sweeps
+        also read 'num_points' and 'seed'. Ranges of random sweeps are given as {'range': [low, high]}
+        """
+        sweep_type = spec.get('type', 'grid')
+        axes = spec['params']
+        dedup = spec.get('dedup', True)
+        if sweep_type == 'grid':
+            return cls.grid(base, axes, dedup=dedup)
+        elif sweep_type == 'zip':
+            return cls.zip(base, axes, dedup=dedup)
+        elif sweep_type == 'random':
+            axes = {key: tuple(axis['range']) if isinstance(axis, dict) else axis for key, axis in axes.items()}
+            return cls.random(base, axes, spec['num_points'], seed=spec.get('seed'), dedup=dedup)
+        raise ValueError('{} is not a valid sweep type'.format(sweep_type))
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """ Yields lists of at most size consecutive elements """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
@@ -1,3 +1,4 @@
+import numpy as np
 from ACG.VirtualObj import VirtualObj
 from ACG.Rectangle import Rectangle
 from ACG import tech as tech_info
@@ -17,6 +18,14 @@ class ViaStack(VirtualObj):
     Generally if the user does not call any special properties, the first option will be used to ensure
     DRC compliance. Note that the added options may or may not satisfy DRC constraints.
     """
+    __slots__ = ('rect1', 'rect2', 'size', 'bot_dir', 'metal_pairs', 'extend', 'loc')
+
+    # Get process specific data
+    tech_prop = tech_info.tech_info['metal_tech']
+    routing = tech_prop['routing']
+    metals = tech_prop['metals']
+    vias = tech_prop['vias']
+    dir = tech_prop['dir']
 
     def __init__(self,
                  rect1: Rectangle,
@@ -56,13 +65,6 @@ class ViaStack(VirtualObj):
             'rect_list': []
         }
 
-        # Get process specific data
-        self.tech_prop = tech_info.tech_info['metal_tech']
-        self.routing = self.tech_prop['routing']
-        self.metals = self.tech_prop['metals']
-        self.vias = self.tech_prop['vias']
-        self.dir = self.tech_prop['dir']
-
         # Generate the actual via stack
         self.compute_via()
 
@@ -167,10 +169,68 @@ class ViaStack(VirtualObj):
         raise NotImplemented('Remove enclosure is currently not supported with via stacks')
 
 
+class ViaArray(ViaStack):
+    """
+    A via stack between two rectangles repeated nx by ny times with pitch spx and spy, committed as one via array per
+    metal pair. The location dict describes the first element at the lower left of the array
+    """
+    __slots__ = ('nx', 'ny', 'spx', 'spy')
+
+    def __init__(self,
+                 rect1: Rectangle,
+                 rect2: Rectangle,
+                 nx: int = 1,
+                 ny: int = 1,
+                 spx: float = 0,
+                 spy: float = 0,
+                 size=(None, None),
+                 extend=False,
+                 ):
+        """
+        Parameters
+        ----------
+        rect1 : Rectangle
+            One of the Rectangles connected by the first via stack of the array
+        rect2 : Rectangle
+            One of the Rectangles connected by the first via stack of the array
+        nx : int
+            number of columns
+        ny : int
+            number of rows
+        spx : float
+            column pitch
+        spy : float
+            row pitch
+        size : (int, int)
+            Tuple representing the via array size of each element in the (x, y) dimension
+        extend : bool
+            Whether the overlap region can be extended to meet the via enclosure rules
+        """
+        ViaStack.__init__(self, rect1, rect2, size=size, extend=extend)
+        self.nx = nx
+        self.ny = ny
+        self.spx = round(spx, 3)
+        self.spy = round(spy, 3)
+
+    def __len__(self):
+        return self.nx * self.ny
+
+    def to_array(self) -> np.ndarray:
+        """ Returns the overlap regions of all elements as an (nx * ny, 4) array of [x0, y0, x1, y1] in resolution units """
+        overlap = self.loc['overlap']
+        res = overlap._res
+        base = np.rint(np.array([overlap.ll.x, overlap.ll.y, overlap.ur.x, overlap.ur.y]) / res).astype(np.int64)
+        cols, rows = np.meshgrid(np.arange(self.nx), np.arange(self.ny))
+        dx = cols.ravel() * round(self.spx / res)
+        dy = rows.ravel() * round(self.spy / res)
+        return base[None, :] + np.stack([dx, dy, dx, dy], axis=1)
+
+
 class Via(VirtualObj):
     """
     A class that wraps the functionality of adding primitive via types to the layout
     """
+    __slots__ = ('bbox', 'size', 'loc', 'via_id', 'location', 'sp_rows', 'sp_cols', 'enc_bot', 'enc_top', 'orient')
 
     # Get process specific data
     tech_prop = tech_info.tech_info['metal_tech']
@@ -1,36 +1,153 @@
+import numpy as np
+from collections.abc import Mapping
 from ACG.VirtualObj import VirtualObj
 from ACG.XY import XY
+from ACG.LayoutStats import LayoutStats
 
-from typing import Optional, Tuple, Union
+from typing import Optional, Tuple, Union, Dict
 point_type = Union[float, int]
 coord_type = Union[Tuple[point_type, point_type], XY]
 
+# Sign of the x and y axis after applying each orientation. Used to compose orientations down the hierarchy
+_orient_sign = {'R0': (1, 1), 'MX': (1, -1), 'MY': (-1, 1), 'R180': (-1, -1)}
+_sign_orient = {sign: orient for orient, sign in _orient_sign.items()}
 
+
+def compose_orient(outer: str, inner: str) -> str:
+    """ Returns the orientation of an inner instance after it is placed inside an outer instance """
+    outer_x, outer_y = _orient_sign[outer]
+    inner_x, inner_y = _orient_sign[inner]
+    return _sign_orient[(outer_x * inner_x, outer_y * inner_y)]
+
+
+def transform_rect_array(rects: np.ndarray, origin: Tuple[int, int], orient: str) -> np.ndarray:
+    """
+    Applies an instance transformation to an (n, 4) array of [x0, y0, x1, y1] rectangles in resolution units.
+    Coordinates are re-ordered so that x0 <= x1 and y0 <= y1 still holds after mirroring
+    """
+    sign_x, sign_y = _orient_sign[orient]
+    rects = np.asarray(rects, dtype=np.int64)
+    xs = rects[:, 0::2] * sign_x + origin[0]
+    ys = rects[:, 1::2] * sign_y + origin[1]
+    return np.stack([xs.min(axis=1), ys.min(axis=1), xs.max(axis=1), ys.max(axis=1)], axis=1)
+
+
+def transform_location(value, origin: XY, orient: str):
+    """
+    Returns a copy of the provided location object shifted by origin/orient. Nested VirtualInsts are not moved;
+    a new VirtualInst with the composed transformation is returned instead
+    """
+    if isinstance(value, list):
+        return [transform_location(elem, origin, orient) for elem in value]
+    elif isinstance(value, VirtualInst):
+        return VirtualInst(value.master,
+                           origin=value.origin.shift_origin(origin=origin, orient=orient),
+                           orient=compose_orient(orient, value.orient),
+                           inst_name=value.inst_name)
+    return value.shift_origin(origin=origin, orient=orient)
+
+
+class InstLocations(Mapping):
+    """
+    Location dictionary of a VirtualInst. Locations are only transformed from the master when they are read, and the
+    transformed objects are cached until the instance is moved. Moving an instance therefore only marks the cache as
+    dirty instead of transforming every location exported by its master
+    """
+    __slots__ = ('_inst', '_cache')
+
+    def __init__(self, inst: 'VirtualInst'):
+        self._inst = inst
+        self._cache = {}
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def __getitem__(self, key):
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        master_locs = self._master_locations()
+        if key not in master_locs and isinstance(key, str) and '/' in key:
+            # Hierarchical path into nested instances, e.g. 'sub_inst/pin'
+            value = self._inst.get_path(key)
+        else:
+            value = master_locs[key]
+            if value is None:
+                print('{} is not a valid location object'.format(key))
+                raise KeyError(key)
+            value = transform_location(value, self._inst.origin, self._inst.orient)
+        self._cache[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        """ Stores a location on the instance. Like all transformed locations, it is cleared when the inst moves """
+        self._cache[key] = value
+
+    def __contains__(self, key):
+        if key in self._cache or self._master_locations().get(key) is not None:
+            return True
+        if isinstance(key, str) and '/' in key:
+            try:
+                self[key]
+            except (KeyError, IndexError, TypeError, ValueError):
+                return False
+            return True
+        return False
+
+    def __iter__(self):
+        master_locs = self._master_locations()
+        for key, value in master_locs.items():
+            if value is not None:
+                yield key
+        for key in self._cache:
+            if key not in master_locs:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def _master_locations(self) -> dict:
+        try:
+            return self._inst.master.export_locations()
+        except AttributeError:
+            print(f"{self._inst.master.__class__.__name__} is not an ACG class, and does not have a location dict")
+            return {}
+
+    def invalidate(self) -> None:
+        """ Marks all transformed locations as dirty. They will be recomputed the next time they are read """
+        if self._cache:
+            self._cache = {}
+
+
+@LayoutStats.register
 class VirtualInst(VirtualObj):
     """
     A class to enable movement/access of low level instances without directly accessing the master
     class
     """
+    __slots__ = ('_origin', '_orient', 'master', 'inst_name', 'loc', '_obs', '_pins')
     edges = ('l', 'b', 'r', 't')
     vertices = ('ll', 'lr', 'ur', 'ul', 'c', 'cl', 'cb', 'cr', 'ct')
     valid_orientation = ('R0', 'MX', 'MY', 'R180')
 
     def __init__(self, master, origin=(0, 0), orient='R0', inst_name=None):
-        VirtualObj.__init__(self)
+        VirtualInst._num_created += 1
 
         # Init internal properties
         self._origin = None
         self._orient = None
 
+        # Locations are transformed lazily when they are read
+        self.loc = InstLocations(self)
+        self._obs = (None, {})  # (transformation key, projected blockage arrays)
+        self._pins = (None, None)  # (transformation key, transformed pin registry)
+
         # Init local variables
         self.master = master
         self.origin = origin
         self.orient = orient
         self.inst_name = inst_name
-        self.loc = {}
-
-        # Init locations
-        self.export_locations()
 
     def __repr__(self):
         temp = 'VirtualInst(master={}, origin={}, orient={})'
@@ -49,6 +166,7 @@ class VirtualInst(VirtualObj):
     @origin.setter
     def origin(self, xy: coord_type) -> None:
         self._origin = XY(xy)  # feed it into XY class to check/condition input
+        self.loc.invalidate()
 
     @property
     def orient(self) -> str:
@@ -58,42 +176,103 @@ class VirtualInst(VirtualObj):
     def orient(self, value: str):
         if value in VirtualInst.valid_orientation:
             self._orient = value
+            self.loc.invalidate()
         else:
             raise ValueError('{} is not a valid orientation'.format(value))
 
     """ Utility Methods """
 
-    def export_locations(self) -> dict:
-        """ Recursively shift all of the elements in the location dictionary """
-        self.loc = {}
+    def __getitem__(self, item):
+        """ Allows for access of items inside the location dictionary without typing .loc[item] """
+        return self.loc[str(item)]
+
+    def export_locations(self) -> InstLocations:
+        """ Returns the location dictionary. Master locations are shifted to this instance when they are read """
+        return self.loc
+
+    def get_obs(self) -> Dict[str, np.ndarray]:
+        """
+        Returns the blockages of the master projected to this instance, as per-layer (n, 4) arrays of [x0, y0, x1, y1]
+        in resolution units. No Rectangle objects are created, and the result is cached until the instance moves
+        """
+        key = (self.origin.x, self.origin.y, self.orient)
+        if self._obs[0] == key:
+            return self._obs[1]
         try:
-            old_db = self.master.export_locations()
+            master_obs = self.master.get_obstructions()
+            res = self.master._res
         except AttributeError:
-            print(f"{self.master.__class__.__name__} is not an ACG class, and does not have a location dict")
-            old_db = {}
-        for key in old_db:
-            # Iterate over all relevant locations in master
-            if isinstance(old_db[key], list):
-                # If its a list, init an empty list and iterate
-                self.loc[key] = []
-                for elem in old_db[key]:
-                    self.loc[key].append(elem.shift_origin(origin=self.origin, orient=self.orient))
-            elif old_db[key] is None:
-                print('{} is not a valid location object'.format(key))
-                print(old_db[key])
-            else:
-                # If its not a list
-                self.loc[key] = old_db[key].shift_origin(origin=self.origin, orient=self.orient)
-        return self.loc
+            # Masters that are not ACG generators have no blockage information
+            master_obs, res = {}, .001
+        origin = (round(self.origin.x / res), round(self.origin.y / res))
+        obs = {layer: transform_rect_array(rects, origin, self.orient) for layer, rects in master_obs.items()}
+        self._obs = (key, obs)
+        return obs
+
+    def get_pin_registry(self, prefix: Optional[str] = None):
+        """
+        Returns the pin registry of the master transformed to this instance, or None if the master has no pins. The
+        transformation is vectorized per net and layer, and cached until the instance moves. If prefix is provided,
+        nets are renamed to '<prefix>/<net>'
+        """
+        try:
+            registry = self.master.get_pin_registry()
+            res = self.master._res
+        except AttributeError:
+            return None
+        key = (self.origin.x, self.origin.y, self.orient, registry.version)
+        if self._pins[0] != key:
+            origin = (round(self.origin.x / res), round(self.origin.y / res))
+            self._pins = (key, registry.transform(origin, self.orient))
+        return self._pins[1] if prefix is None else self._pins[1].prefix(prefix + '/')
+
+    def get_path(self, path: str):
+        """
+        Returns the location at the end of a hierarchical path such as 'sub_inst/pin' or 'row/3/pin', shifted to this
+        instance. Only the transformations of the instances along the path are composed; none of the intermediate
+        location dicts are materialized. A new location object is returned on every call, reading the path through
+        loc caches it on this instance until it moves
+
+        Parameters
+        ----------
+        path : str
+            '/' separated location keys. Integer segments index into lists of locations
+
+        Returns
+        -------
+        location
+            the transformed location object
+        """
+        master = self.master
+        origin = self.origin
+        orient = self.orient
+        segments = path.split('/')
+        value = None
+        idx = 0
+        while idx < len(segments):
+            value = master.export_locations()[segments[idx]]
+            idx += 1
+            # Integer segments select an element of a list of locations
+            while isinstance(value, list) and idx < len(segments) and segments[idx].lstrip('-').isdigit():
+                value = value[int(segments[idx])]
+                idx += 1
+            if idx < len(segments):
+                if not isinstance(value, VirtualInst):
+                    raise KeyError('{} in {} is not an instance'.format(segments[idx - 1], path))
+                # Compose the transformation of the nested instance with the current one
+                origin = value.origin.shift_origin(origin=origin, orient=orient)
+                orient = compose_orient(orient, value.orient)
+                master = value.master
+        if value is None:
+            raise KeyError(path)
+        return transform_location(value, origin, orient)
 
     def move(self, origin=None, orient=None) -> 'VirtualInst':
-        """ Set the origin and orientation to new values """
+        """ Set the origin and orientation to new values. Locations are recomputed the next time they are read """
         if origin is not None:
             self.origin = origin
         if orient is not None:
             self.orient = orient
-        # Update locations
-        self.export_locations()
         return self
 
     def shift_origin(self, origin=None, orient=None) -> 'VirtualInst':
@@ -135,6 +314,6 @@ class VirtualInst(VirtualObj):
             self.origin.x -= diff.x
         if align_opt[1]:
             self.origin.y -= diff.y
-        # Update locations
-        self.export_locations()
+        # Mark locations as dirty
+        self.loc.invalidate()
         return self
@@ -0,0 +1,80 @@
+import numpy as np
+from typing import Dict, Iterator, Optional
+
+from ACG.PinRegistry import PinRegistry
+from ACG.VirtualInst import VirtualInst
+from ACG.Rectangle import Rectangle
+from ACG.XY import XY
+
+
+class VirtualInstArray(VirtualInst):
+    """
+    An instance arrayed nx by ny times with pitch spx and spy, committed as a single BAG instance array. The location
+    dict is the one of the first element at the origin; use get_inst to access the other elements
+    """
+    __slots__ = ('nx', 'ny', 'spx', 'spy')
+
+    def __init__(self, master, origin=(0, 0), orient='R0', inst_name=None,
+                 nx: int = 1, ny: int = 1, spx: float = 0, spy: float = 0):
+        VirtualInst.__init__(self, master, origin=origin, orient=orient, inst_name=inst_name)
+        if nx < 1 or ny < 1:
+            raise ValueError('Instance arrays need at least one element, got nx={}, ny={}'.format(nx, ny))
+        self.nx = nx
+        self.ny = ny
+        self.spx = round(spx, 3)
+        self.spy = round(spy, 3)
+
+    def __repr__(self):
+        temp = 'VirtualInstArray(master={}, origin={}, orient={}, nx={}, ny={}, spx={}, spy={})'
+        return temp.format(self.master.__class__.__name__, self.origin, self.orient, self.nx, self.ny, self.spx,
+                           self.spy)
+
+    def __len__(self):
+        return self.nx * self.ny
+
+    def __iter__(self) -> Iterator[VirtualInst]:
+        for row in range(self.ny):
+            for col in range(self.nx):
+                yield self.get_inst(col, row)
+
+    def get_inst(self, col: int, row: int = 0) -> VirtualInst:
+        """ Returns a VirtualInst at the location of one element of the array """
+        if not (0 <= col < self.nx and 0 <= row < self.ny):
+            raise IndexError('({}, {}) is outside of a {}x{} array'.format(col, row, self.nx, self.ny))
+        return VirtualInst(self.master,
+                           origin=self.origin + XY([col * self.spx, row * self.spy]),
+                           orient=self.orient,
+                           inst_name=self.inst_name)
+
+    def _offsets(self, res: float) -> np.ndarray:
+        """ Returns the (nx * ny, 2) offsets of all elements from the origin in resolution units """
+        cols, rows = np.meshgrid(np.arange(self.nx), np.arange(self.ny))
+        return np.stack([cols.ravel() * round(self.spx / res), rows.ravel() * round(self.spy / res)], axis=1)
+
+    def get_obs(self) -> Dict[str, np.ndarray]:
+        """ Returns the projected blockages of all elements of the array """
+        obs = VirtualInst.get_obs(self)
+        if len(self) == 1:
+            return obs
+        shift = np.tile(self._offsets(getattr(self.master, '_res', .001)), 2)[:, None, :]
+        return {layer: (rects[None, :, :] + shift).reshape(-1, 4) for layer, rects in obs.items()}
+
+    def get_pin_registry(self, prefix: Optional[str] = None):
+        """
+        Returns the pin registry of all elements of the array. If prefix is provided, the nets of each element are
+        renamed to '<prefix><<idx>>/<net>', e.g. 'X0<3>/VDD', with elements numbered along x first. An array with a
+        single element is named '<prefix>/<net>' like a plain instance
+        """
+        registry = VirtualInst.get_pin_registry(self)
+        if registry is None or len(self) == 1:
+            return registry if registry is None or prefix is None else registry.prefix(prefix + '/')
+        offsets = self._offsets(registry.res)
+        if prefix is None:
+            return registry.tile(offsets)
+        return PinRegistry.merge((registry.tile(offset).prefix('{}<{}>/'.format(prefix, idx))
+                                  for idx, offset in enumerate(offsets)), res=registry.res)
+
+    def get_bound(self, bound: Rectangle) -> Rectangle:
+        """ Returns the enclosure of the provided bound of the first element repeated over the whole array """
+        last = bound.shift_origin(origin=((self.nx - 1) * self.spx, (self.ny - 1) * self.spy))
+        return bound.get_enclosure(last)
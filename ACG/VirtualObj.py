@@ -3,8 +3,11 @@ import abc
 
 class VirtualObj(metaclass=abc.ABCMeta):
     """
-    Abstract class for creation of primitive objects
+    Abstract class for creation of primitive objects. Subclasses declare __slots__ to keep per-object memory low, and
+    must include 'loc' in their slots if they store a location dictionary
     """
+    __slots__ = ()
+
     def __init__(self):
         self.loc = {}
 
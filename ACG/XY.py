@@ -3,20 +3,24 @@ import numpy as np
 # ACG imports
 from ACG.VirtualObj import VirtualObj
 from ACG.PrimitiveUtil import Mt
+from ACG.LayoutStats import LayoutStats
 
 
+@LayoutStats.register
 class XY(VirtualObj):
     """
     Primitive class to describe a single coordinate on xy plane and various associated utility functions
     Keeps all coordinates on the grid
     """
+    __slots__ = ('_res', '_x', '_y')
 
     def __init__(self,
                  xy,
                  res=.001  # type: float
                  ):
 
-        VirtualObj.__init__(self)
+        # XY does not store a location dictionary, so VirtualObj's constructor is not called
+        XY._num_created += 1
         # Set the resolution of the grid
         self._res = res
         # Create the internal x and y variable names
@@ -36,6 +40,21 @@ class XY(VirtualObj):
         else:
             raise TypeError('{} type does not represent a valid xy coordinate description'.format(type(xy)))
 
+    @classmethod
+    def from_units(cls, x: int, y: int, res: float = .001) -> 'XY':
+        """ Creates a coordinate directly from integer grid units, skipping input conditioning """
+        obj = cls.__new__(cls)
+        XY._num_created += 1
+        obj._res = res
+        obj._x = x
+        obj._y = y
+        return obj
+
+    def set_units(self, x: int, y: int) -> None:
+        """ Sets the coordinate directly in integer grid units """
+        self._x = x
+        self._y = y
+
     """ Magic methods """
 
     def __repr__(self):
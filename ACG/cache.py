@@ -0,0 +1,44 @@
+"""
+When imported, this module determines where ACG stores on-disk caches. The location is specified by the
+'ACG_CACHE_DIR' environment variable and defaults to ~/.cache/acg
+"""
+import os
+import json
+import hashlib
+import tempfile
+
+cache_root = os.path.expanduser(os.environ.get('ACG_CACHE_DIR', os.path.join('~', '.cache', 'acg')))
+
+
+def get_cache_dir(name: str) -> str:
+    """ Returns the path to the named cache directory, creating it if needed """
+    path = os.path.join(cache_root, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def hash_key(*parts) -> str:
+    """ Returns a stable hex digest of the provided key parts """
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def read_json(path: str):
+    """ Returns the content of a JSON cache file, or None if it does not exist or cannot be read """
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path: str, content) -> None:
+    """ Atomically writes content to a JSON cache file, so that concurrent readers never see a partial file """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(content, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,153 @@
+"""
+test_abstract_library.py
+
+Checks the shared abstract library lookup, and that the obstacle index of a layout built from LEF obstructions of
+mirrored and arrayed instances answers region queries like a brute-force overlap check. Run with ACG_BACKEND=memory so
+that no BAG project is required.
+"""
+import os
+import random
+import tempfile
+import numpy as np
+import yaml
+from ACG.AbstractLibrary import AbstractLibrary
+from ACG.AyarLayoutGenerator import AyarLayoutGenerator, LayoutAbstract
+
+lef = '''MACRO BLOCK
+  SIZE 2 BY 3 ;
+  PIN A
+    PORT
+      LAYER M1 ;
+        RECT 0.1 0.1 0.3 0.5 ;
+    END
+  END A
+  OBS
+    LAYER M1 ;
+      RECT 0.5 0.2 1.5 0.6 ;
+      RECT 0.2 1 0.4 2.8 ;
+    LAYER M2 ;
+      RECT 0 2 2 2.4 ;
+  END
+END BLOCK
+END LIBRARY
+'''
+
+# origin, orient and array size of every instance of BLOCK
+placements = [((0, 0), 'R0', 1), ((5, 0), 'MY', 1), ((0, 10), 'MX', 1), ((8, 8), 'R180', 1), ((0, 12), 'R0', 3)]
+array_pitch = 2.5
+orient_sign = {'R0': (1, 1), 'MX': (1, -1), 'MY': (-1, 1), 'R180': (-1, -1)}
+
+
+class ObstacleTop(AyarLayoutGenerator):
+    """ Places LEF abstracts in every orientation and one instance array """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(lef_file='LEF file of the abstracts')
+
+    def layout_procedure(self):
+        master = self.new_template(params=dict(libname='lib', cellname='BLOCK', lef_file=self.params['lef_file']),
+                                   temp_cls=LayoutAbstract)
+        for idx, (loc, orient, num) in enumerate(placements):
+            self.add_instance(master, inst_name='X{}'.format(idx), loc=loc, orient=orient, nx=num, spx=array_pitch)
+        self.add_rect(layer='M1', xy=[[20, 20], [21, 21]])
+
+
+def expected_obstructions(layer, res=.001):
+    """ Transforms the obstructions of BLOCK by hand for every placed instance """
+    cell = {'M1': [(.5, .2, 1.5, .6), (.2, 1, .4, 2.8)], 'M2': [(0, 2, 2, 2.4)]}[layer]
+    rects = []
+    for (x, y), orient, num in placements:
+        sx, sy = orient_sign[orient]
+        for col in range(num):
+            dx = x + col * array_pitch
+            for x0, y0, x1, y1 in cell:
+                xs, ys = (dx + sx * x0, dx + sx * x1), (y + sy * y0, y + sy * y1)
+                rects.append([round(min(xs) / res), round(min(ys) / res), round(max(xs) / res), round(max(ys) / res)])
+    return sorted(rects)
+
+
+def brute_force(rects, region, spacing, res=.001):
+    """ Rectangles overlapping the region grown by spacing, without touching it """
+    (x0, y0), (x1, y1) = region
+    space = round(spacing / res)
+    x0, y0, x1, y1 = round(x0 / res) - space, round(y0 / res) - space, round(x1 / res) + space, round(y1 / res) + space
+    return sorted(rect for rect in rects if rect[0] < x1 and rect[2] > x0 and rect[1] < y1 and rect[3] > y0)
+
+
+def test_lookup(directory):
+    """ Libraries are shared until their source changes, and cells are looked up by name """
+    lef_file = os.path.join(directory, 'lookup.lef')
+    with open(lef_file, 'w') as f:
+        f.write(lef)
+    lib = AbstractLibrary.from_lef(lef_file)
+    assert AbstractLibrary.from_lef(lef_file) is lib
+    assert 'BLOCK' in lib and 'NAND' not in lib and len(lib) == 1
+    assert lib['BLOCK'] is lib['BLOCK'] and lib['BLOCK'].size_xy == [[0, 0], [2, 3]]
+    try:
+        lib['NAND']
+    except KeyError:
+        pass
+    else:
+        raise AssertionError('missing cells should raise KeyError')
+
+    # A modified file is parsed again
+    with open(lef_file, 'w') as f:
+        f.write(lef.replace('END LIBRARY', 'MACRO NAND\n  SIZE 1 BY 3 ;\nEND NAND\nEND LIBRARY'))
+    os.utime(lef_file, (os.path.getmtime(lef_file) + 10,) * 2)
+    new_lib = AbstractLibrary.from_lef(lef_file)
+    assert new_lib is not lib and new_lib.cell_names == ['BLOCK', 'NAND']
+
+    # Yaml libraries are parsed again when cells are added, and are loaded from the disk cache in a new process
+    lib_dir = os.path.join(directory, 'yaml', 'cells')
+    os.makedirs(lib_dir)
+    with open(os.path.join(lib_dir, 'INV.yaml'), 'w') as f:
+        yaml.safe_dump({'size': [[0, 0], [1, 2]], 'pins': {'A': {'m1': [[[0, 0], [.1, .1]]]}}}, f)
+    lib = AbstractLibrary.from_yaml_root(os.path.join(directory, 'yaml'), 'cells')
+    assert lib.cell_names == ['INV'] and lib['INV'].pins['A']['M1'].tolist() == [[0, 0, 100, 100]]
+    with open(os.path.join(lib_dir, 'BUF.yaml'), 'w') as f:
+        yaml.safe_dump({'size': [[0, 0], [2, 2]]}, f)
+    os.utime(lib_dir, (os.path.getmtime(lib_dir) + 10,) * 2)
+    lib = AbstractLibrary.from_yaml_root(os.path.join(directory, 'yaml'), 'cells')
+    assert sorted(lib.cell_names) == ['BUF', 'INV']
+    AbstractLibrary._libraries.clear()
+    cached = AbstractLibrary.from_yaml_root(os.path.join(directory, 'yaml'), 'cells')
+    assert isinstance(cached.coords, np.memmap) and cached.index == lib.index
+
+
+if __name__ == '__main__':
+    os.environ['ACG_BACKEND'] = 'memory'
+    from ACG import cache
+    from ACG.AyarDesignManager import AyarDesignManager
+
+    cache.cache_root = tempfile.mkdtemp(prefix='acg_cache_')
+    directory = tempfile.mkdtemp(prefix='acg_test_')
+    test_lookup(directory)
+
+    lef_file = os.path.join(directory, 'block.lef')
+    with open(lef_file, 'w') as f:
+        f.write(lef)
+    ADM = AyarDesignManager(None, 'ACG/tests/specs/TestHeadless.yaml')
+    top = ADM.tdb.new_template(params={'lef_file': lef_file}, temp_cls=ObstacleTop)
+
+    # Obstructions of every instance are projected through its transformation
+    index = top.get_obstacle_index(include_shapes=False)
+    assert sorted(index.layers) == ['M1', 'M2']
+    for layer in ('M1', 'M2'):
+        assert sorted(index[layer].tolist()) == expected_obstructions(layer), layer
+    assert len(top.get_obstacle_index()['M1']) == len(index['M1']) + 1
+
+    # Region queries match a brute-force overlap check
+    rng = random.Random(0)
+    for _ in range(500):
+        layer = rng.choice(('M1', 'M2', 'm1'))
+        x, y = rng.uniform(-10, 15), rng.uniform(-5, 20)
+        region = [[round(x, 3), round(y, 3)], [round(x + rng.uniform(0, 4), 3), round(y + rng.uniform(0, 4), 3)]]
+        spacing = rng.choice((0, .1, .25))
+        result = sorted(index.query(layer, region, spacing=spacing).tolist())
+        assert result == brute_force(expected_obstructions(layer.upper()), region, spacing), (layer, region, spacing)
+        assert index.is_blocked(layer, region, spacing=spacing) == bool(result)
+    print('abstract library and obstacle index tests passed')
@@ -0,0 +1,119 @@
+"""
+test_cadence_batch_import.py
+
+Exercises batch Cadence layout import against a local stand-in for the SKILL interface. Run with ACG_BACKEND=memory so
+that no BAG project or Virtuoso session is required.
+"""
+import os
+import re
+import tempfile
+import yaml
+from ACG.AyarLayoutGenerator import AyarLayoutGenerator
+
+
+class LocalSkill:
+    """ Stand-in for BAG's SKILL interface that serves layouts from a dict instead of Virtuoso """
+
+    def __init__(self, layouts: dict):
+        self.layouts = layouts
+        self.num_evals = 0
+        self.view_dir = tempfile.mkdtemp(prefix='acg_views_')
+        for libname, cellname in layouts:
+            with open(self._view_path(libname, cellname), 'w') as f:
+                f.write('layout')
+
+    def _view_path(self, libname, cellname):
+        return os.path.join(self.view_dir, '{}_{}.oa'.format(libname, cellname))
+
+    def _eval_skill(self, expr: str):
+        self.num_evals += 1
+        for libname, cellname, fname in re.findall(r'parse_cad_layout\( "(\S+)" "(\S+)" "(\S+)" \)', expr):
+            with open(fname, 'w') as f:
+                yaml.safe_dump(self.layouts[(libname, cellname)], f)
+        paths = ['"{}"'.format(self._view_path(libname, cellname)) if (libname, cellname) in self.layouts else 'nil'
+                 for libname, cellname in re.findall(r'ddGetObj\( "(\S+)" "(\S+)" "layout" "layout.oa" \)', expr)]
+        if expr.startswith('list('):
+            return '({})'.format(' '.join(paths))
+        elif paths:
+            return paths[0]
+        return 't'
+
+
+class LocalProject:
+    """ Stand-in for a BagProject that only provides the SKILL interface """
+
+    def __init__(self, layouts: dict):
+        self.impl_db = LocalSkill(layouts)
+
+
+def make_layout(cellname, width):
+    return {
+        'cell_name': cellname,
+        'rects': {
+            0: {'layer': 'prBoundary drawing', 'bBox': [[0, 0], [width, 1]]},
+            1: {'layer': 'M1 drawing', 'bBox': [[.1, .1], [.2, .9]]},
+        },
+        'labels': {
+            0: {'layer': 'M1 pin', 'xy': [.15, .5], 'label': 'A'},
+        }
+    }
+
+
+class CadenceBatchImportTest(AyarLayoutGenerator):
+    """ Imports several macros in one call and abuts them in a row """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            libname='library to import the cells from',
+            cellnames='names of cells to import'
+        )
+
+    def layout_procedure(self):
+        cells = [(self.params['libname'], cellname) for cellname in self.params['cellnames']]
+        masters = self.import_cadence_layouts(cells)
+        prev = None
+        for cell in cells:
+            inst = self.add_instance(masters[cell], inst_name=cell[1])
+            if prev is not None:
+                inst.align('ll', ref_rect=prev.loc['bnd'], ref_handle='lr')
+            prev = inst
+        self.loc['last_pin'] = prev.loc['A']
+
+
+def test_disk_cache_hit():
+    """ A layout read back from the disk cache must equal a fresh import, including its integer keys """
+    from ACG import cache
+    from ACG.CadenceImport import CadenceLayoutImporter
+
+    cache.cache_root = tempfile.mkdtemp(prefix='acg_cache_')
+    layouts = {('Sandbox', 'cached'): make_layout('cached', 2)}
+    skill = LocalSkill(layouts)
+    fresh = CadenceLayoutImporter(skill._eval_skill).import_layout('Sandbox', 'cached')
+    num_evals = skill.num_evals
+    CadenceLayoutImporter._mem_cache.clear()
+    cached = CadenceLayoutImporter(skill._eval_skill).import_layout('Sandbox', 'cached')
+    assert skill.num_evals == num_evals, 'the layout should be read from the disk cache'
+    assert cached == fresh, (cached, fresh)
+    assert list(cached['rects']) == [0, 1]
+
+
+if __name__ == '__main__':
+    os.environ['ACG_BACKEND'] = 'memory'
+    from ACG.AyarDesignManager import AyarDesignManager
+
+    test_disk_cache_hit()
+
+    spec_file = 'ACG/tests/specs/TestCadenceBatchImport.yaml'
+    layouts = {('Sandbox', 'macro{}'.format(idx)): make_layout('macro{}'.format(idx), idx + 1) for idx in range(4)}
+    prj = LocalProject(layouts)
+    ADM = AyarDesignManager(prj, spec_file)
+    ADM.generate_layout()
+    # One round-trip to resolve the view paths and one to dump all four layouts
+    assert prj.impl_db.num_evals == 2
+    top = ADM.tdb.cells['BatchImportTest']
+    assert top.loc['last_pin'].ll.x == 6.1
+    print(top.backend.db['instance'])
@@ -0,0 +1,65 @@
+"""
+test_density_fill.py
+
+Fills a sparse layer with DensityFill and checks the spacing to existing shapes and the resulting window densities. Run
+with ACG_BACKEND=memory so that no BAG project is required.
+"""
+import numpy as np
+from ACG.AyarLayoutGenerator import AyarLayoutGenerator
+from ACG.DensityFill import DensityFill, DensityMap
+
+rules = dict(min_density=.3, window=10, step=5, fill_size=.5, fill_space=.2, spacing=.3)
+
+
+class TestDensityFill(AyarLayoutGenerator):
+    """ Draws a few wires and a dense block on M1, then fills the layer """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            size='width and height of the filled region'
+        )
+
+    def layout_procedure(self):
+        size = self.params['size']
+        self.loc['bnd'] = self.add_rect(layer='M1', xy=[[0, 0], [size, size]], virtual=True)
+        self.add_rect(layer='M1', xy=[[0, 0], [8, 8]])
+        for idx in range(5):
+            self.add_rect(layer='M1', xy=[[2 + 5 * idx, 12.05], [2.1 + 5 * idx, 25]])
+        self.add_rect(layer='M1', xy=[[10, 3], [28, 3.2]])
+        self.obstacles = self.get_obstacle_index()['M1'].copy()
+        self.fill = DensityFill(self, 'M1', **rules)
+        self.arrays = self.fill.generate()
+
+
+def fill_rects(arrays):
+    return np.concatenate([array.to_array() for array in arrays])
+
+
+if __name__ == '__main__':
+    import os
+    os.environ['ACG_BACKEND'] = 'memory'
+    from ACG.AyarDesignManager import AyarDesignManager
+
+    ADM = AyarDesignManager(None, 'ACG/tests/specs/TestHeadless.yaml')
+    top = ADM.tdb.new_template(params={'size': 30}, temp_cls=TestDensityFill)
+    res = top._res
+    obstacles, fill = top.obstacles, fill_rects(top.arrays)
+    assert len(top.fill.get_low_windows(top.fill.before)) > 0, 'the layout should start under-dense'
+
+    # Fill must keep the spacing to every existing shape
+    space = round(rules['spacing'] / res)
+    gap_x = np.maximum(fill[:, None, 0] - obstacles[None, :, 2], obstacles[None, :, 0] - fill[:, None, 2])
+    gap_y = np.maximum(fill[:, None, 1] - obstacles[None, :, 3], obstacles[None, :, 1] - fill[:, None, 3])
+    assert np.all(np.maximum(gap_x, gap_y) >= space), 'fill violates the spacing to existing shapes'
+
+    # Every window reaches the target density, measured independently of the fill's own density map
+    dmap = DensityMap(np.concatenate([obstacles, fill]), top.fill.before.region, top.fill.pixel)
+    window, step = top.fill._pixels(rules['window']), top.fill._pixels(rules['step'])
+    density = dmap.window_density(window, step)
+    assert density.min() >= rules['min_density'], density.min()
+    print('{} fill shapes in {} arrays, density {:.3f} -> {:.3f}, minimum window density {:.3f}'.format(
+        len(fill), len(top.arrays), top.fill.before.density, dmap.density, density.min()))
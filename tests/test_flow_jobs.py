@@ -0,0 +1,161 @@
+"""
+test_flow_jobs.py
+
+Runs simulations, LVS and PEX through AyarDesignManager against a local stand-in project, and checks the concurrency
+limit, that a failing job does not cancel the others, and that verification results are cached. Run with
+ACG_BACKEND=memory so that no BAG project or Virtuoso session is required.
+"""
+import os
+import re
+import asyncio
+import tempfile
+
+# Results saved by simulate, keyed by file name
+saved = {}
+
+
+class LocalTestbench:
+    """ Stand-in for a BAG testbench whose simulation only sleeps """
+
+    def __init__(self, prj, cell_name):
+        self.prj = prj
+        self.cell_name = cell_name
+        self.sim_envs = None
+        self.save_dir = None
+
+    def set_parameter(self, key, val):
+        pass
+
+    def set_simulation_view(self, lib_name, cell_name, view_name):
+        pass
+
+    def set_simulation_environments(self, sim_envs):
+        self.sim_envs = list(sim_envs)
+
+    def update_testbench(self):
+        pass
+
+    async def async_run_simulation(self):
+        await self.prj.run('sim', self.cell_name)
+        self.save_dir = (self.cell_name, tuple(self.sim_envs))
+
+
+class LocalSkill:
+    """ Stand-in for BAG's SKILL interface that returns the view files of a cell """
+
+    def __init__(self):
+        self.view_dir = tempfile.mkdtemp(prefix='acg_views_')
+
+    def view_path(self, cell_name):
+        return os.path.join(self.view_dir, cell_name + '.oa')
+
+    def write_view(self, cell_name, content):
+        with open(self.view_path(cell_name), 'w') as f:
+            f.write(content)
+
+    def _eval_skill(self, expr):
+        cell_name = re.search(r'list\(list\("\S+" "(\S+)"\)\)', expr).group(1)
+        return '("{}")'.format(self.view_path(cell_name))
+
+
+class LocalProject:
+    """ Stand-in for a BagProject whose jobs sleep, and which records how many jobs run at the same time """
+
+    def __init__(self, failing=()):
+        self.impl_db = LocalSkill()
+        self.failing = set(failing)
+        self.active = 0
+        self.max_active = 0
+        self.runs = []
+
+    async def run(self, kind, name):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(.02)
+            if kind == 'sim' and name in self.failing:
+                raise RuntimeError('simulation of {} failed'.format(name))
+        finally:
+            self.active -= 1
+        self.runs.append((kind, name))
+        return name not in self.failing, '{}_{}.log'.format(kind, name)
+
+    def configure_testbench(self, lib_name, cell_name):
+        return LocalTestbench(self, cell_name)
+
+    async def async_run_lvs(self, lib_name, cell_name):
+        return await self.run('lvs', cell_name)
+
+    async def async_run_rcx(self, lib_name, cell_name, create_schematic=True):
+        return await self.run('pex', cell_name)
+
+
+def test_simulate(ADM, prj):
+    """ Simulations run at most sim_concurrency at a time, and a failing one does not cancel the others """
+    data_dir = tempfile.mkdtemp(prefix='acg_test_')
+    tb_info = dict(tb_sim_params={}, view_name='schematic', sim_envs=['tt', 'ff'], data_dir=data_dir)
+    ADM.specs['tb_params'] = {'tb_{}'.format(idx): dict(tb_info) for idx in range(5)}
+    ADM.specs['tb_params']['tb_4']['split_envs'] = True
+    results = ADM.simulate(max_concurrency=2)
+    assert prj.max_active == 2
+    assert ADM.sim_results['tb_1'].status == 'error' and 'simulation of tb_1 failed' in ADM.sim_results['tb_1'].error
+    assert sorted(results) == ['tb_0', 'tb_2', 'tb_3', 'tb_4']
+    assert results['tb_0'] == ('tb_0', ('tt', 'ff'))
+    # Corners of a split testbench are simulated one after another
+    assert results['tb_4'] == {'tt': ('tb_4', ('tt',)), 'ff': ('tb_4', ('ff',))}
+    assert sorted(saved) == sorted([os.path.join(data_dir, 'tb_{}.hdf5'.format(idx)) for idx in (0, 2, 3)] +
+                                   [os.path.join(data_dir, 'tb_4_{}.hdf5'.format(env)) for env in ('tt', 'ff')])
+
+
+def test_verification(ADM, prj):
+    """ LVS and PEX respect the concurrency limit, and only cells that passed with the same content are skipped """
+    cells = ['cell_{}'.format(idx) for idx in range(4)]
+    for cell_name in cells:
+        prj.impl_db.write_view(cell_name, cell_name)
+    prj.max_active = 0
+    results = ADM.run_LVS(cells, max_concurrency=3)
+    assert prj.max_active == 3
+    assert [results[cell_name].status for cell_name in cells] == ['passed', 'failed', 'passed', 'passed']
+    assert results['cell_1'].log_path == 'lvs_cell_1.log'
+
+    # A second run with unchanged inputs is a cache hit, except for the failed cell
+    del prj.runs[:]
+    results = ADM.run_LVS(cells, max_concurrency=3)
+    assert [results[cell_name].status for cell_name in cells] == ['cached', 'failed', 'cached', 'cached']
+    assert results['cell_0'].log_path == 'lvs_cell_0.log'
+    assert prj.runs == [('lvs', 'cell_1')]
+
+    # Editing a cell runs it again, and PEX results are cached separately from LVS results
+    prj.impl_db.write_view('cell_2', 'edited')
+    del prj.runs[:]
+    results = ADM.run_LVS(cells, use_cache=True)
+    assert results['cell_2'].status == 'passed' and sorted(prj.runs) == [('lvs', 'cell_1'), ('lvs', 'cell_2')]
+    ADM.run_PEX(cells)
+    del prj.runs[:]
+    results = ADM.run_PEX(cells)
+    assert [results[cell_name].status for cell_name in cells] == ['cached', 'failed', 'cached', 'cached']
+    assert prj.runs == [('pex', 'cell_1')]
+
+    # Without the cache every cell is run
+    del prj.runs[:]
+    ADM.run_LVS(cells, use_cache=False)
+    assert sorted(prj.runs) == [('lvs', cell_name) for cell_name in cells]
+
+
+if __name__ == '__main__':
+    os.environ['ACG_BACKEND'] = 'memory'
+    import importlib
+    from ACG import cache
+    from ACG.AyarDesignManager import AyarDesignManager
+
+    cache.cache_root = tempfile.mkdtemp(prefix='acg_cache_')
+    # Results are normally read from the simulator output and written to HDF5 by BAG
+    adm_module = importlib.import_module('ACG.AyarDesignManager')
+    adm_module.load_sim_results = lambda save_dir: save_dir
+    adm_module.save_sim_results = lambda results, fname: saved.update({fname: results})
+
+    prj = LocalProject(failing=['tb_1', 'cell_1'])
+    ADM = AyarDesignManager(prj, 'ACG/tests/specs/TestHeadless.yaml')
+    test_simulate(ADM, prj)
+    test_verification(ADM, prj)
+    print('flow job tests passed')
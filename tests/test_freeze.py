@@ -0,0 +1,74 @@
+"""
+test_freeze.py
+
+Checks that freezing shapes during layout_procedure commits the same layout as committing everything at the end, with
+and without a shape store. Run with ACG_BACKEND=memory so that no BAG project is required.
+"""
+from ACG.AyarLayoutGenerator import AyarLayoutGenerator
+
+
+class FreezeTest(AyarLayoutGenerator):
+    """ Draws rectangles, rectangle arrays and vias, freezing them as requested by the params """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            freeze='if True, freeze shapes while drawing them',
+            store='if True, enable the shape store',
+            num='number of wires'
+        )
+
+    def layout_procedure(self):
+        if self.params['store']:
+            self.use_shape_store(chunk_size=3)
+        # A small chunk size forces several intermediate commits
+        self.freeze_chunk_size = 4
+        self.loc['bnd'] = self.add_rect(layer='M1', xy=[[-1, -1], [20, 5]], virtual=True)
+        self.loc['wires'] = []
+        for idx in range(self.params['num']):
+            wire = self.add_rect(layer='M1', xy=[[idx, 0], [idx + .2, 2]])
+            strap = self.add_rect(layer='M2', xy=[[idx - .1, 1], [idx + .3, 1.2]])
+            via = self.connect_wires(wire, strap)
+            self.loc['wires'].append(wire)
+            if self.params['freeze'] and idx % 2:
+                self.freeze([wire, strap, via])
+        self.loc['array'] = self.add_rect_array(layer='M3', xy=[[0, 3], [.1, 3.1]], nx=5, ny=2, spx=.3, spy=.4)
+        self.loc['virtual'] = self.add_rect(layer='M1', xy=[[25, 25], [26, 26]], virtual=True)
+        if self.params['freeze']:
+            self.freeze([self.loc['array'], self.loc['virtual']])
+
+        # Handles kept in the location dict still resolve after their shapes were frozen
+        last = self.add_rect(layer='M2')
+        last.align('ll', ref_rect=self.loc['wires'][1], ref_handle='ur')
+        last.stretch('ur', ref_rect=self.loc['wires'][3], ref_handle='ur')
+        self.loc['last'] = last
+        if self.params['freeze']:
+            self.freeze()
+
+
+def committed(gen):
+    db = gen.backend.db
+    return sorted(db['rect']), sorted(db['via']), gen.prim_bound_box.get_bounds()
+
+
+if __name__ == '__main__':
+    import os
+    os.environ['ACG_BACKEND'] = 'memory'
+    from ACG.AyarDesignManager import AyarDesignManager
+
+    ADM = AyarDesignManager(None, 'ACG/tests/specs/TestHeadless.yaml')
+    results = {}
+    for freeze in (False, True):
+        for store in (False, True):
+            gen = ADM.tdb.new_template(params={'freeze': freeze, 'store': store, 'num': 9}, temp_cls=FreezeTest)
+            last = gen.loc['last']
+            assert (last.ll.x, last.ll.y, last.ur.x, last.ur.y) == (1.2, 2, 3.2, 2)
+            results[(freeze, store)] = committed(gen)
+    reference = results[(False, False)]
+    assert len(reference[0]) == 9 * 2 + 2 and len(reference[1]) == 9
+    for key, result in results.items():
+        assert result == reference, 'freeze={}, store={} committed a different layout'.format(*key)
+    print('freeze commits identical layouts')
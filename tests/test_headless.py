@@ -0,0 +1,67 @@
+"""
+test_headless.py
+
+Exercises the in-memory ACG backend. Run with ACG_BACKEND=memory so that no BAG project is required.
+"""
+from ACG.AyarLayoutGenerator import AyarLayoutGenerator
+
+
+class HeadlessUnit(AyarLayoutGenerator):
+    """ Simple master with a single rectangle and a boundary """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            layer='layer of the unit rectangle'
+        )
+
+    def layout_procedure(self):
+        self.loc['bnd'] = self.add_rect(layer=self.params['layer'], xy=[[0, 0], [1, 1]], virtual=True)
+        self.loc['pin'] = self.add_rect(layer=self.params['layer'], xy=[[.2, .2], [.4, .4]])
+
+
+class TestHeadless(AyarLayoutGenerator):
+    """ Places two instances of the same master and connects their pins """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            bot_layer='name of the bottom layer',
+            top_layer='name of the top layer'
+        )
+
+    def layout_procedure(self):
+        print('--- Running headless test ---')
+        master = self.new_template(params={'layer': self.params['bot_layer']}, temp_cls=HeadlessUnit)
+        master2 = self.new_template(params={'layer': self.params['bot_layer']}, temp_cls=HeadlessUnit)
+        assert master is master2, 'identical masters should be cached'
+
+        inst0 = self.add_instance(master, inst_name='X0')
+        inst1 = self.add_instance(master, inst_name='X1')
+        inst1.align('ll', ref_rect=inst0.loc['bnd'], ref_handle='lr')
+
+        strap = self.add_rect(layer=self.params['top_layer'])
+        strap.align('cl', ref_rect=inst0.loc['pin'], ref_handle='c')
+        strap.stretch('cr', ref_rect=inst1.loc['pin'], ref_handle='c')
+        self.connect_wires(inst0.loc['pin'], strap)
+        self.connect_wires(inst1.loc['pin'], strap)
+
+
+if __name__ == '__main__':
+    import os
+    os.environ['ACG_BACKEND'] = 'memory'
+    from ACG.AyarDesignManager import AyarDesignManager
+
+    spec_file = 'ACG/tests/specs/TestHeadless.yaml'
+    ADM = AyarDesignManager(None, spec_file)
+    ADM.generate_layout()
+    top = ADM.tdb.cells['HeadlessTest']
+    assert len(top.backend.db['instance']) == 2
+    assert len(top.backend.db['via']) == 2
+    print(top.backend.db)
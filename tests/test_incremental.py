@@ -0,0 +1,109 @@
+"""
+test_incremental.py
+
+Checks that incremental layout generation only regenerates the cells whose parameters, generator sources or outputs
+changed. The generators are written to a temporary package so that their sources can be edited. Run with
+ACG_BACKEND=memory so that no BAG project is required.
+"""
+import os
+import sys
+import tempfile
+
+top_source = '''
+from ACG.AyarLayoutGenerator import AyarLayoutGenerator
+import inc_sub_a
+import inc_sub_b
+
+
+class IncTop(AyarLayoutGenerator):
+    """ Places one instance of the sub-generator selected by the params """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(sub='a or b', width='width of the sub-generator rectangle')
+
+    def layout_procedure(self):
+        sub_cls = inc_sub_a.IncSub if self.params['sub'] == 'a' else inc_sub_b.IncSub
+        self.add_instance(self.new_template(params={'width': self.params['width']}, temp_cls=sub_cls))
+'''
+
+sub_source = '''
+from ACG.AyarLayoutGenerator import AyarLayoutGenerator
+
+
+class IncSub(AyarLayoutGenerator):
+    """ Single rectangle """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(width='width of the rectangle')
+
+    def layout_procedure(self):
+        self.add_rect(layer='M1', xy=[[0, 0], [self.params['width'], 1]])
+'''
+
+names = {'cell_a0': dict(sub='a', width=1), 'cell_a1': dict(sub='a', width=2), 'cell_b0': dict(sub='b', width=1)}
+
+
+def write_module(src_dir, name, source, mtime):
+    """ Writes a module with an explicit modification time, so that edits are seen even within the mtime resolution """
+    path = os.path.join(src_dir, name + '.py')
+    with open(path, 'w') as f:
+        f.write(source)
+    os.utime(path, (mtime, mtime))
+
+
+def generate(ADM, params, **kwargs):
+    """ Runs generate_layout and returns the names of the cells that were written """
+    ADM.tdb.cells.clear()
+    ADM.generate_layout(params, sorted(names), **kwargs)
+    return set(ADM.tdb.cells)
+
+
+if __name__ == '__main__':
+    os.environ['ACG_BACKEND'] = 'memory'
+    # The manifest is kept in the cache directory when there is no library path
+    os.environ['ACG_CACHE_DIR'] = tempfile.mkdtemp(prefix='acg_test_')
+    src_dir = tempfile.mkdtemp(prefix='acg_test_')
+    write_module(src_dir, 'inc_top', top_source, 1e9)
+    write_module(src_dir, 'inc_sub_a', sub_source, 1e9)
+    write_module(src_dir, 'inc_sub_b', sub_source, 1e9)
+    sys.path.insert(0, src_dir)
+    from ACG.AyarDesignManager import AyarDesignManager
+
+    ADM = AyarDesignManager(None, 'ACG/tests/specs/TestHeadless.yaml')
+    ADM.specs.update(incremental=True, impl_lib='IncrementalTest', layout_package='inc_top', layout_class='IncTop')
+    params = [names[name] for name in sorted(names)]
+
+    # The first run generates everything, and a second unchanged run skips every cell
+    assert generate(ADM, params) == set(names)
+    assert generate(ADM, params) == set()
+
+    # Editing the parameters of one cell only regenerates that cell
+    params[1] = dict(sub='a', width=3)
+    assert generate(ADM, params) == {'cell_a1'}
+    assert generate(ADM, params) == set()
+
+    # Editing the source of a sub-generator only regenerates the cells that use it
+    write_module(src_dir, 'inc_sub_b', sub_source + '\n# edited\n', 2e9)
+    assert generate(ADM, params) == {'cell_b0'}
+    assert generate(ADM, params) == set()
+
+    # Editing the top generator regenerates every cell
+    write_module(src_dir, 'inc_top', top_source + '\n# edited\n', 2e9)
+    assert generate(ADM, params) == set(names)
+
+    # A cell missing from the library is generated again
+    ADM.tdb.cell_names.discard('cell_a0')
+    assert generate(ADM, params) == {'cell_a0'}
+
+    # force regenerates every cell
+    assert generate(ADM, params, force=True) == set(names)
+    assert generate(ADM, params) == set()
+    print('incremental generation tests passed')
@@ -0,0 +1,76 @@
+"""
+test_layout_snapshot.py
+
+Round-trips a layout through LayoutSnapshot and checks that the restored layout commits the same shapes and instances.
+Run with ACG_BACKEND=memory so that no BAG project is required.
+"""
+from ACG.AyarLayoutGenerator import AyarLayoutGenerator
+
+
+class SnapshotUnit(AyarLayoutGenerator):
+    """ Master with a boundary and a pin, defined in the test script so that it cannot be imported by name """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            width='width of the unit'
+        )
+
+    def layout_procedure(self):
+        self.loc['bnd'] = self.add_rect(layer='M1', xy=[[0, 0], [self.params['width'], 1]], virtual=True)
+        self.loc['pin'] = self.add_rect(layer='M1', xy=[[.2, .2], [.4, .4]])
+
+
+class SnapshotTop(AyarLayoutGenerator):
+    """ Draws a small layout, or restores the state saved from a previous instance """
+    saved = None
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            restore='if True, load the saved state instead of drawing'
+        )
+
+    def resolve_master(self, module, qualname, params):
+        classes = {cls.__qualname__: cls for cls in (SnapshotUnit, SnapshotTop)}
+        return self.new_template(params=params, temp_cls=classes[qualname])
+
+    def layout_procedure(self):
+        if self.params['restore']:
+            self.load_state(SnapshotTop.saved, resolve_master=self.resolve_master)
+            return
+        master = self.new_template(params={'width': 1}, temp_cls=SnapshotUnit)
+        inst0 = self.add_instance(master, inst_name='X0')
+        inst1 = self.add_instance(master, inst_name='X1', nx=2, spx=1.5)
+        inst1.align('ll', ref_rect=inst0.loc['bnd'], ref_handle='lr')
+        strap = self.add_rect(layer='M2')
+        strap.align('cl', ref_rect=inst0.loc['pin'], ref_handle='c')
+        strap.stretch('cr', ref_rect=inst1.loc['pin'], ref_handle='c')
+        self.loc['strap'] = strap
+        self.loc['via'] = self.connect_wires(inst0.loc['pin'], strap)
+        self.add_rect_array(layer='M3', xy=[[0, 2], [.1, 2.1]], nx=4, ny=2, spx=.2, spy=.3)
+        self.add_pin('A', strap)
+        SnapshotTop.saved = self.dump_state()
+
+
+if __name__ == '__main__':
+    import os
+    os.environ['ACG_BACKEND'] = 'memory'
+    from ACG.AyarDesignManager import AyarDesignManager
+
+    ADM = AyarDesignManager(None, 'ACG/tests/specs/TestHeadless.yaml')
+    drawn = ADM.tdb.new_template(params={'restore': False}, temp_cls=SnapshotTop)
+    restored = ADM.tdb.new_template(params={'restore': True}, temp_cls=SnapshotTop)
+    assert restored is not drawn
+    # Masters of instances are resolved to the same cached templates, so the committed databases compare equal
+    assert restored.backend.db == drawn.backend.db, (restored.backend.db, drawn.backend.db)
+    assert len(drawn.backend.db['instance']) == 2 and len(drawn.backend.db['via']) == 1
+    assert restored.loc['strap'].ll.xy == drawn.loc['strap'].ll.xy
+    assert restored.pins.nets == ['A']
+    print('LayoutSnapshot round trip passed')
@@ -0,0 +1,77 @@
+"""
+test_layout_stats.py
+
+Generates a small hierarchy and checks the shape and object counts recorded in LayoutStats, and the statistics reported
+by AyarDesignManager. Run with ACG_BACKEND=memory so that no BAG project is required.
+"""
+import json
+import os
+import tempfile
+from ACG.AyarLayoutGenerator import AyarLayoutGenerator
+
+
+class StatsUnit(AyarLayoutGenerator):
+    """ Two drawn rectangles connected by a via, a virtual boundary and a rectangle array """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict()
+
+    def layout_procedure(self):
+        self.loc['bnd'] = self.add_rect(layer='M1', xy=[[0, 0], [2, 2]], virtual=True)
+        wire = self.add_rect(layer='M1', xy=[[.1, .1], [.3, 1.9]])
+        strap = self.add_rect(layer='M2', xy=[[0, .5], [2, .7]])
+        self.connect_wires(wire, strap)
+        self.add_rect_array(layer='M3', xy=[[0, 0], [.1, .1]], nx=4, ny=2, spx=.5, spy=.5)
+
+
+class StatsTop(AyarLayoutGenerator):
+    """ Two instances and an instance array of StatsUnit, and one strap """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict()
+
+    def layout_procedure(self):
+        unit = self.new_template(params={}, temp_cls=StatsUnit)
+        self.add_instance(unit, inst_name='X0')
+        self.add_instance(unit, inst_name='X1', loc=(3, 0))
+        self.add_instance(unit, inst_name='XA', loc=(0, 3), nx=3, spx=3)
+        self.add_rect(layer='M4', xy=[[0, 0], [9, .2]])
+
+
+if __name__ == '__main__':
+    os.environ['ACG_BACKEND'] = 'memory'
+    from ACG.AyarDesignManager import AyarDesignManager
+
+    ADM = AyarDesignManager(None, 'ACG/tests/specs/TestHeadless.yaml')
+    ADM.specs.update(layout_package='tests.test_layout_stats', layout_class='StatsTop')
+    ADM.generate_layout(cell_name_list=['StatsTop'])
+    top = ADM.tdb.cells['StatsTop']
+    unit = top._db['instance'][0].master
+
+    # Shapes are counted when they are committed, an array counts as one drawn shape
+    assert unit.stats.counts == {'virtual_rect': 1, 'rect': 3, 'instance': 0, 'via': 1, 'prim_via': 0}
+    assert top.stats.counts == {'virtual_rect': 0, 'rect': 1, 'instance': 3, 'via': 0, 'prim_via': 0}
+    # Object counts are inclusive: the unit master is created inside the layout_procedure of the top cell
+    assert unit.stats.objects['VirtualInst'] == 0 and top.stats.objects['VirtualInst'] == 3
+    assert top.stats.objects['Rectangle'] >= unit.stats.objects['Rectangle'] + 1 >= 6
+    assert set(top.stats.times) >= {'layout_procedure', 'commit_rect', 'commit_inst', 'commit_via'}
+    assert top.stats.times['layout_procedure'] >= unit.stats.times['layout_procedure'] > 0
+
+    # The design manager reports the stats of every generated cell and their sum
+    stats = ADM.get_layout_stats()
+    assert list(stats['cells']) == ['StatsTop'] and stats['cells']['StatsTop'] == top.stats.to_dict()
+    assert stats['total']['counts'] == top.stats.counts
+    assert stats['batch_layout']['times']['batch_layout'] > 0
+    path = os.path.join(tempfile.mkdtemp(prefix='acg_test_'), 'stats.json')
+    ADM.dump_layout_stats(path)
+    with open(path) as f:
+        assert json.load(f)['cells']['StatsTop']['counts']['instance'] == 3
+    print('layout stats tests passed')
@@ -0,0 +1,59 @@
+"""
+test_layout_sweep.py
+
+Generates a layout sweep with the in-memory backend and checks the cell names, duplicate removal, and that finished
+masters are freed between chunks. Run with ACG_BACKEND=memory so that no BAG project is required.
+"""
+import gc
+import weakref
+from ACG.AyarLayoutGenerator import AyarLayoutGenerator
+from ACG.Sweep import ParamSweep
+
+# Every master that was created, so that the test can check which ones are still alive
+created = weakref.WeakSet()
+
+
+class SweepUnit(AyarLayoutGenerator):
+    """ Single rectangle whose size is set by the params """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            width='width of the rectangle',
+            idx='index of the unit, also a name used by the cell name format'
+        )
+
+    def layout_procedure(self):
+        created.add(self)
+        self.loc['bnd'] = self.add_rect(layer='M1', xy=[[0, 0], [self.params['width'], 1]])
+
+
+if __name__ == '__main__':
+    import os
+    os.environ['ACG_BACKEND'] = 'memory'
+    from ACG.AyarDesignManager import AyarDesignManager
+
+    ADM = AyarDesignManager(None, 'ACG/tests/specs/TestHeadless.yaml')
+    ADM.specs['layout_package'] = 'tests.test_layout_sweep'
+    ADM.specs['layout_class'] = 'SweepUnit'
+
+    # The repeated point is skipped, and the idx of the sweep overrides the idx param in the cell name
+    sweep = ParamSweep.from_iter([dict(width=.1 * (num + 1), idx=100 + num) for num in range(7)] +
+                                 [dict(width=.1, idx=100)])
+    progress = []
+    names = ADM.generate_layout_sweep(sweep, cell_name_fmt='unit_{idx}_{width:.1f}', chunk_size=3,
+                                      progress=lambda done, total: progress.append(done))
+    assert names == ['unit_{}_{:.1f}'.format(num, .1 * (num + 1)) for num in range(7)], names
+    assert progress == [3, 6, 7]
+
+    # Written masters are dropped after each chunk, but their names are kept
+    assert ADM.tdb.cells == {} and ADM.tdb._master_lookup == {}
+    assert ADM.tdb.cell_names == set(names)
+    assert ADM._existing_cells('layout', names + ['missing']) == set(names)
+    gc.collect()
+    assert len(created) == 0, '{} masters are still alive after the sweep'.format(len(created))
+    assert sorted(ADM.layout_stats) == sorted(names)
+    print('layout sweep tests passed')
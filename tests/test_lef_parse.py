@@ -0,0 +1,107 @@
+"""
+test_lef_parse.py
+
+Parses an inline LEF file with LefParser and AbstractLibrary.from_lef, and checks the boundaries, pins and
+obstructions of its macros. Only uses the abstract library, so no BAG project is required.
+"""
+import os
+import tempfile
+import numpy as np
+from ACG.AbstractLibrary import AbstractLibrary
+from ACG.LefParse import LefParser
+
+lef = '''VERSION 5.8 ;
+BUSBITCHARS "[]" ;
+UNITS
+  DATABASE MICRONS 1000 ;
+END UNITS
+LAYER M1
+  TYPE ROUTING ;
+  WIDTH 0.1 ;
+END M1
+SITE core
+  SIZE 0.2 BY 1.2 ;
+END core
+
+MACRO INV  # a comment with ; END INV inside
+  CLASS CORE ;
+  ORIGIN 0.5 0.25 ;
+  SIZE 2 BY 1.5 ;
+  SYMMETRY X Y ;
+  PIN A
+    DIRECTION INPUT ;
+    PORT
+      LAYER M1 ;
+        RECT -0.4 -0.2 -0.3 0.8 ;
+        POLYGON 0 0 0.2 0 0.2 0.4 0.1 0.4 0.1 0.2 0 0.2 ;
+    END
+  END A
+  PIN VDD
+    USE POWER ;
+    PORT
+      LAYER m2 ;
+        RECT ITERATE 0 0 0.1 0.1 DO 3 BY 2 STEP 0.5 0.3 ;
+    END
+    PORT
+      LAYER M1 ;
+        RECT MASK 1 1 1 1.1 1.1 ;
+    END
+  END VDD
+  OBS
+    LAYER M1 ;
+      RECT 0.6 0.6 0.9 0.9 ;
+    LAYER M2 ;
+      RECT 1 0 1.2 0.2 ;
+  END
+END INV
+
+MACRO TAP
+  SIZE 0.4 BY 1.5 ;
+END TAP
+END LIBRARY
+'''
+
+
+def test_parser(lef_file):
+    """ Macros are yielded in file order, shifted by their ORIGIN, with polygons as bounding boxes """
+    macros = list(LefParser(lef_file).iter_macros())
+    assert [name for name, _ in macros] == ['INV', 'TAP']
+    inv = macros[0][1]
+    assert inv['size'] == [[0, 0], [2, 1.5]]
+    assert sorted(inv['pins']) == ['A', 'VDD']
+    assert np.allclose(inv['pins']['A']['M1'], [[[.1, .05], [.2, 1.05]], [[.5, .25], [.7, .65]]])
+    assert np.allclose(inv['pins']['VDD']['m2'], [[[.5 + .5 * i, .25 + .3 * j], [.6 + .5 * i, .35 + .3 * j]]
+                                                  for i in range(3) for j in range(2)])
+    assert np.allclose(inv['pins']['VDD']['M1'], [[[1.5, 1.25], [1.6, 1.35]]])
+    assert np.allclose(inv['obs']['M1'], [[[1.1, .85], [1.4, 1.15]]])
+    assert np.allclose(inv['obs']['M2'], [[[1.5, .25], [1.7, .45]]])
+    assert macros[1][1] == {'size': [[0, 0], [.4, 1.5]], 'pins': {}, 'obs': {}}
+
+
+def test_library(lef_file):
+    """ The cached LEF library matches a library built directly from the parsed macros """
+    lib = AbstractLibrary.from_lef(lef_file)
+    direct = AbstractLibrary.from_cells(LefParser(lef_file).iter_macros())
+    assert lib.cell_names == direct.cell_names == ['INV', 'TAP']
+    assert lib.index == direct.index and np.array_equal(lib.coords, direct.coords)
+
+    inv = lib['INV']
+    assert inv.size_xy == [[0, 0], [2, 1.5]]
+    assert inv.size.tolist() == [0, 0, 2000, 1500]
+    # Layer names are upper-cased
+    assert sorted(inv.pins['VDD']) == ['M1', 'M2'] and len(inv.pins['VDD']['M2']) == 6
+    assert inv.pins['A']['M1'].tolist() == [[100, 50, 200, 1050], [500, 250, 700, 650]]
+    assert inv.to_xy(inv.obs['M2']) == [(1.5, .25, 1.7, .45)]
+    assert lib['TAP'].pins == {} and lib['TAP'].obs == {}
+
+
+if __name__ == '__main__':
+    from ACG import cache
+
+    cache.cache_root = tempfile.mkdtemp(prefix='acg_cache_')
+    lef_file = os.path.join(tempfile.mkdtemp(prefix='acg_test_'), 'cells.lef')
+    with open(lef_file, 'w') as f:
+        f.write(lef)
+    test_parser(lef_file)
+    test_library(lef_file)
+    print('LEF parser tests passed')
@@ -0,0 +1,108 @@
+"""
+test_pin_registry.py
+
+Exercises PinRegistry directly and through the hierarchical pin registry of a generator with mirrored, nested and
+arrayed instances. Run with ACG_BACKEND=memory so that no BAG project is required.
+"""
+import numpy as np
+from ACG.AyarLayoutGenerator import AyarLayoutGenerator
+from ACG.PinRegistry import PinRegistry
+
+
+class PinLeaf(AyarLayoutGenerator):
+    """ Cell with an A pin on M1 and a VDD pin on M2 """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict()
+
+    def layout_procedure(self):
+        self.loc['bnd'] = self.add_rect(layer='M1', xy=[[0, 0], [1, 1]], virtual=True)
+        self.loc['A'] = self.add_pin('A', self.add_rect(layer='M1', xy=[[.1, .2], [.3, .5]]))
+        self.loc['VDD'] = self.add_pin('VDD', self.add_rect(layer='M2', xy=[[0, .9], [1, 1]]))
+
+
+class PinMid(AyarLayoutGenerator):
+    """ Places one mirrored leaf """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict()
+
+    def layout_procedure(self):
+        leaf = self.new_template(params={}, temp_cls=PinLeaf)
+        self.loc['u'] = self.add_instance(leaf, inst_name='u', loc=(2, 0), orient='MY')
+
+
+class PinTop(AyarLayoutGenerator):
+    """ Places a mirrored PinMid, an array of leaves and an unnamed leaf """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict()
+
+    def layout_procedure(self):
+        mid = self.new_template(params={}, temp_cls=PinMid)
+        leaf = self.new_template(params={}, temp_cls=PinLeaf)
+        self.loc['m'] = self.add_instance(mid, inst_name='m', loc=(5, 5), orient='MX')
+        self.loc['r'] = self.add_instance(leaf, inst_name='r', loc=(0, 10), nx=3, spx=2)
+        self.loc['x'] = self.add_instance(leaf, loc=(10, 0))
+        self.add_pin('A', self.add_rect(layer='M1', xy=[[20, 20], [21, 21]]))
+
+
+def units(rect, res=.001):
+    return [round(rect.ll.x / res), round(rect.ll.y / res), round(rect.ur.x / res), round(rect.ur.y / res)]
+
+
+def test_registry():
+    """ Adding, querying by region, and empty input """
+    registry = PinRegistry()
+    registry.add('A', 'm1', [[0, 0], [1, 1]])
+    registry.add('A', 'M1', np.array([[5000, 0, 6000, 1000]]))
+    registry.add('B', 'M2', [[0, 0], [2, 2]])
+    registry.add('B', 'M2', [])
+    registry.add('B', 'M2', np.zeros((0, 4), dtype=np.int64))
+    assert registry.nets == ['A', 'B'] and registry.layers == ['M1', 'M2'] and len(registry) == 3
+    assert registry.query(net='A', layer='M1', region=[[4, 0], [4.5, .5]]).tolist() == []
+    assert registry.query(net='A', region=[[4, 0], [5, .5]]).tolist() == [[5000, 0, 6000, 1000]]
+    assert sorted(registry.query_nets(region=[[.5, .5], [.6, .6]])) == ['A', 'B']
+
+
+if __name__ == '__main__':
+    import os
+    os.environ['ACG_BACKEND'] = 'memory'
+    from ACG.AyarDesignManager import AyarDesignManager
+
+    test_registry()
+
+    ADM = AyarDesignManager(None, 'ACG/tests/specs/TestHeadless.yaml')
+    top = ADM.tdb.new_template(params={}, temp_cls=PinTop)
+    assert top.get_pin_registry().nets == ['A', 'X0/A', 'X0/VDD', 'm/u/A', 'm/u/VDD', 'r<0>/A', 'r<0>/VDD',
+                                           'r<1>/A', 'r<1>/VDD', 'r<2>/A', 'r<2>/VDD']
+    assert top.get_pin_registry(hierarchical=False).nets == ['A']
+
+    # Pins through MX and MY instances match the location of the same shape read through the hierarchy
+    assert top.find_pins(net='m/u/A').tolist() == [units(top.loc['m']['u/A'])]
+    # MY at (2, 0) maps x to 2 - x, then MX at (5, 5) maps y to 5 - y and x to x + 5
+    assert top.find_pins(net='m/u/A').tolist() == [[6700, 4500, 6900, 4800]]
+    assert top.find_pins(net='r<2>/A').tolist() == [[4100, 10200, 4300, 10500]]
+
+    # Region queries only return pins overlapping the region
+    assert top.find_pins(layer='M1', region=[[0, 9], [3, 11]]).tolist() == [[100, 10200, 300, 10500],
+                                                                          [2100, 10200, 2300, 10500]]
+    assert top.find_pins(net='X0/VDD', region=[[0, 0], [1, 1]]).tolist() == []
+
+    # Moving an instance invalidates the cached registry
+    top.loc['x'].move(origin=(12, 1))
+    assert top.find_pins(net='X0/A').tolist() == [[12100, 1200, 12300, 1500]]
+    assert top.find_pins(net='X0/A').tolist() == [units(top.loc['x']['A'])]
+    print('PinRegistry tests passed')
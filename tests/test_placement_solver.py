@@ -0,0 +1,83 @@
+"""
+test_placement_solver.py
+
+Exercises PlacementSolver on bare rectangles. Run with ACG_BACKEND=memory so that no BAG project is required.
+"""
+from ACG.Rectangle import Rectangle
+from ACG.PlacementSolver import PlacementSolver
+
+
+def bounds(rect):
+    return [round(rect.ll.x, 3), round(rect.ll.y, 3), round(rect.ur.x, 3), round(rect.ur.y, 3)]
+
+
+def test_left_of_anchor():
+    """ b starts on top of the anchored a and has to move left """
+    a = Rectangle(xy=[[0, 0], [1, 1]], layer='M1')
+    b = Rectangle(xy=[[0, 0], [1, 1]], layer='M1')
+    PlacementSolver().anchor(a).spacing(b, a, .5, 'left').solve()
+    assert bounds(a) == [0, 0, 1, 1]
+    assert bounds(b) == [-1.5, 0, -.5, 1], bounds(b)
+
+
+def test_bottom_of_anchor():
+    a = Rectangle(xy=[[0, 0], [1, 1]], layer='M1')
+    b = Rectangle(xy=[[0, .5], [1, 1.5]], layer='M1')
+    PlacementSolver().anchor(a).spacing(b, a, .2, 'bottom').solve()
+    assert bounds(a) == [0, 0, 1, 1]
+    assert bounds(b) == [0, -1.2, 1, -.2], bounds(b)
+
+
+def test_max_space():
+    """ c starts far to the right of d and is pulled back within max_space """
+    c = Rectangle(xy=[[10, 0], [11, 1]], layer='M1')
+    d = Rectangle(xy=[[0, 0], [1, 1]], layer='M1')
+    PlacementSolver().anchor(d).spacing(c, d, 0, 'right', max_space=1).solve()
+    assert bounds(d) == [0, 0, 1, 1]
+    assert bounds(c) == [2, 0, 3, 1], bounds(c)
+
+    # Without an anchor the constraint is also satisfied, no matter which object moves
+    c = Rectangle(xy=[[10, 0], [11, 1]], layer='M1')
+    d = Rectangle(xy=[[0, 0], [1, 1]], layer='M1')
+    PlacementSolver().spacing(c, d, 0, 'right', max_space=1).solve()
+    assert 0 <= round(c.ll.x - d.ur.x, 3) <= 1, (bounds(c), bounds(d))
+
+
+def test_unconstrained_objects_stay():
+    a = Rectangle(xy=[[0, 0], [1, 1]], layer='M1')
+    b = Rectangle(xy=[[5, 0], [6, 1]], layer='M1')
+    translations = PlacementSolver().anchor(a).spacing(b, a, 1, 'right').solve()
+    assert translations[id(b)] == (0, 0)
+    assert bounds(b) == [5, 0, 6, 1]
+
+
+def test_conflict():
+    a = Rectangle(xy=[[0, 0], [1, 1]], layer='M1')
+    b = Rectangle(xy=[[4, 0], [5, 1]], layer='M1')
+    solver = PlacementSolver().anchor(a).anchor(b).spacing(b, a, 5, 'right')
+    try:
+        solver.solve()
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('spacing between anchored objects should conflict')
+
+    # A positive cycle between free objects is infeasible as well
+    c = Rectangle(xy=[[0, 0], [1, 1]], layer='M1')
+    d = Rectangle(xy=[[2, 0], [3, 1]], layer='M1')
+    solver = PlacementSolver().spacing(d, c, 1, 'right').spacing(c, d, 1, 'right')
+    try:
+        solver.solve()
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('cyclic spacing constraints should be infeasible')
+
+
+if __name__ == '__main__':
+    test_left_of_anchor()
+    test_bottom_of_anchor()
+    test_max_space()
+    test_unconstrained_objects_stay()
+    test_conflict()
+    print('PlacementSolver tests passed')
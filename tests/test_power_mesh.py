@@ -0,0 +1,97 @@
+"""
+test_power_mesh.py
+
+Builds a three layer power mesh and checks the strap pitch and count on every layer, and that the via arrays cover
+exactly the crossings of straps of the same net. Run with ACG_BACKEND=memory so that no BAG project is required.
+"""
+from ACG.AyarLayoutGenerator import AyarLayoutGenerator
+from ACG.PowerMesh import PowerMesh
+
+# layer, width, pitch, offset, direction
+strap_layers = [('M2', .2, 1, .5, 'x'), ('M3', .3, 1.5, .2, 'y'), ('M4', .4, 2, 0, 'x')]
+region = (0, 0, 10, 8)
+
+
+class PowerMeshTest(AyarLayoutGenerator):
+    """ Covers the boundary with a VDD/VSS mesh on M2, M3 and M4 """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict()
+
+    def layout_procedure(self):
+        self.loc['bnd'] = self.add_rect(layer='M1', xy=[region[:2], region[2:]], virtual=True)
+        self.mesh = PowerMesh(self)
+        # Layers are added out of order, the mesh sorts them by their index in the layer stack
+        for layer, width, pitch, offset, _ in reversed(strap_layers):
+            self.mesh.add_straps(layer, width, pitch, offset=offset)
+        self.mesh.generate()
+
+
+def expected_straps(width, pitch, offset, direction, res=.001):
+    """ Lists every strap of a layer by stepping through the region, as [x0, y0, x1, y1] in resolution units """
+    x0, y0, x1, y1 = (round(val / res) for val in region)
+    lo, hi = (y0, y1) if direction == 'x' else (x0, x1)
+    width, pitch = round(width / res), round(pitch / res)
+    straps = []
+    start = lo + round(offset / res)
+    while start + width <= hi:
+        straps.append([x0, start, x1, start + width] if direction == 'x' else [start, y0, start + width, y1])
+        start += pitch
+    return straps
+
+
+def crossings(bot, top):
+    """ Intersections of every pair of overlapping straps, found by brute force """
+    result = []
+    for b in bot:
+        for t in top:
+            box = [max(b[0], t[0]), max(b[1], t[1]), min(b[2], t[2]), min(b[3], t[3])]
+            if box[0] < box[2] and box[1] < box[3]:
+                result.append(box)
+    return sorted(result)
+
+
+if __name__ == '__main__':
+    import os
+    os.environ['ACG_BACKEND'] = 'memory'
+    from ACG.AyarDesignManager import AyarDesignManager
+
+    ADM = AyarDesignManager(None, 'ACG/tests/specs/TestHeadless.yaml')
+    top = ADM.tdb.new_template(params={}, temp_cls=PowerMeshTest)
+    mesh = top.mesh
+
+    # Straps alternate between the nets at the layer pitch, so each net repeats at twice the pitch
+    straps = {}
+    for layer, width, pitch, offset, direction in strap_layers:
+        every = expected_straps(width, pitch, offset, direction)
+        straps[layer] = {'VDD': every[0::2], 'VSS': every[1::2]}
+        for net in ('VDD', 'VSS'):
+            assert sorted(mesh.get_straps(net, layer).tolist()) == straps[layer][net], (layer, net)
+    assert [len(straps[layer]['VDD']) + len(straps[layer]['VSS']) for layer in ('M2', 'M3', 'M4')] == [8, 7, 4]
+    for layer, _, pitch, _, direction in strap_layers:
+        arr = mesh.loc['straps'][layer]['VDD']
+        count, step = (arr.ny, arr.spy) if direction == 'x' else (arr.nx, arr.spx)
+        assert (count, step) == (len(straps[layer]['VDD']), 2 * pitch), layer
+
+    # Vias are placed at every crossing of straps of the same net, and nowhere else
+    for bot, top_layer in (('M2', 'M3'), ('M3', 'M4')):
+        for net in ('VDD', 'VSS'):
+            expected = crossings(straps[bot][net], straps[top_layer][net])
+            assert sorted(mesh.get_taps(net, bot, top_layer).tolist()) == expected, (bot, top_layer, net)
+    assert len(mesh.get_taps('VDD')) == 4 * 4 + 4 * 2
+    assert len(top._db['via']) == 4
+
+    # Single taps are looked up by index or by position
+    tap = mesh.get_tap('VSS', 'M2', 'M3', col=1, row=2)
+    assert [tap.ll.x, tap.ll.y, tap.ur.x, tap.ur.y] == [4.7, 5.5, 5, 5.7]
+    tap = mesh.get_nearest_tap('VDD', 'M3', 'M4', (6.5, 100))
+    assert [tap.ll.x, tap.ll.y, tap.ur.x, tap.ur.y] == [6.2, 4, 6.5, 4.4]
+
+    # Straps are registered as pins of their net
+    assert sorted(top.get_pin_registry(hierarchical=False).nets) == ['VDD', 'VSS']
+    assert len(top.find_pins(net='VSS', layer='M3')) == 3
+    print('PowerMesh tests passed')
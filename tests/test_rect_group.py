@@ -0,0 +1,96 @@
+"""
+test_rect_group.py
+
+Checks that the vectorized RectGroup operations give exactly the same results as calling Rectangle.align and
+Rectangle.stretch on every rectangle. Only uses Rectangle objects, so no BAG project is required.
+"""
+import random
+from ACG.Rectangle import Rectangle
+from ACG.RectGroup import align_all, stretch_all, distribute
+from ACG.XY import XY
+
+vertices = ('ll', 'ul', 'lr', 'ur', 'c', 'cl', 'cr', 'ct', 'cb')
+edge_pairs = (('l', 'l'), ('l', 'r'), ('r', 'l'), ('r', 'r'), ('b', 'b'), ('b', 't'), ('t', 'b'), ('t', 't'))
+
+
+def random_rect(rng):
+    x0, y0 = rng.randint(-5000, 5000) * .001, rng.randint(-5000, 5000) * .001
+    return Rectangle(xy=[[x0, y0], [x0 + rng.randint(1, 3001) * .001, y0 + rng.randint(1, 3001) * .001]], layer='M1')
+
+
+def state(rect):
+    """ Coordinates and every handle of the location dict """
+    values = [rect.ll.xy, rect.ur.xy]
+    for handle in vertices + Rectangle.edges:
+        value = rect.loc[handle]
+        values.append(value.xy if isinstance(value, XY) else value)
+    return values
+
+
+def random_case(rng):
+    """ Returns the arguments of one align or stretch call """
+    kind = rng.choice(('vertex', 'edge', 'offset', 'track'))
+    kwargs = dict(offset=(rng.randint(-2000, 2000) * .001, rng.randint(-2000, 2000) * .001))
+    if kind == 'vertex':
+        kwargs.update(target_handle=rng.choice(vertices), ref_handle=rng.choice(vertices))
+    elif kind == 'edge':
+        kwargs['target_handle'], kwargs['ref_handle'] = rng.choice(edge_pairs)
+    elif kind == 'offset':
+        kwargs.update(target_handle=rng.choice(vertices))
+    else:
+        track = rng.choice(((rng.randint(1, 5000) * .001, 0), (0, rng.randint(1, 5000) * .001),
+                            (rng.randint(1, 5000) * .001, rng.randint(1, 5000) * .001)))
+        kwargs.update(target_handle=rng.choice(vertices), track=XY(track))
+    return kind, kwargs
+
+
+def check(method, group_method, opt_name, trials=300, num=6, seed=0):
+    rng = random.Random(seed)
+    for trial in range(trials):
+        kind, kwargs = random_case(rng)
+        kwargs[opt_name] = (rng.random() < .7, rng.random() < .7)
+        rects = [random_rect(rng) for _ in range(num)]
+        expected = [rect.copy() for rect in rects]
+        if kind in ('vertex', 'edge'):
+            if rng.random() < .5:
+                refs = [random_rect(rng) for _ in range(num)]
+                group_ref = refs
+            else:
+                refs = [random_rect(rng)] * num
+                group_ref = refs[0]
+            for rect, ref in zip(expected, refs):
+                getattr(rect, method)(ref_rect=ref, **kwargs)
+            group_method(rects, ref_rect=group_ref, **kwargs)
+        else:
+            for rect in expected:
+                getattr(rect, method)(**kwargs)
+            group_method(rects, **kwargs)
+        for idx, (rect, ref) in enumerate(zip(rects, expected)):
+            assert state(rect) == state(ref), '{} trial {} ({}, {}) rect {}: {} != {}'.format(
+                method, trial, kind, kwargs, idx, state(rect), state(ref))
+
+
+def check_distribute(trials=100, seed=1):
+    rng = random.Random(seed)
+    for trial in range(trials):
+        rects = [random_rect(rng) for _ in range(5)]
+        expected = [rect.copy() for rect in rects]
+        pitch = rng.randint(1, 4000) * .001
+        dim, handle = rng.choice(('x', 'y')), rng.choice(vertices)
+        start = rng.choice((None, rng.randint(-3000, 3000) * .001))
+        distribute(rects, pitch, dim=dim, handle=handle, start=start)
+        first = expected[0].loc[handle].x if dim == 'x' else expected[0].loc[handle].y
+        origin = first if start is None else start
+        for idx, rect in enumerate(expected):
+            target = origin + idx * pitch
+            offset = (target, 0) if dim == 'x' else (0, target)
+            rect.align(handle, offset=offset, align_opt=(dim == 'x', dim == 'y'))
+        for rect, ref in zip(rects, expected):
+            assert state(rect) == state(ref), 'distribute trial {}: {} != {}'.format(trial, state(rect), state(ref))
+
+
+if __name__ == '__main__':
+    check('align', align_all, 'align_opt')
+    check('stretch', stretch_all, 'stretch_opt')
+    check_distribute()
+    print('RectGroup matches Rectangle.align and Rectangle.stretch')
@@ -0,0 +1,88 @@
+"""
+test_row_placer.py
+
+Places a shuffled chain of cells with RowPlacer and checks legality and wirelength. Run with ACG_BACKEND=memory so that
+no BAG project is required.
+"""
+import random
+import numpy as np
+from ACG.AyarLayoutGenerator import AyarLayoutGenerator
+from ACG.RowPlacer import RowPlacer
+
+
+class RowUnit(AyarLayoutGenerator):
+    """ Standard cell stand-in with a boundary of the provided width and a height of 1 """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            width='width of the cell'
+        )
+
+    def layout_procedure(self):
+        self.loc['bnd'] = self.add_rect(layer='M1', xy=[[0, 0], [self.params['width'], 1]], virtual=True)
+
+
+def check_legal(placer, num, row_width):
+    """ Cells must not overlap, and every cell must lie inside its row """
+    locs = placer.locations
+    assert locs.shape == (num, 4)
+    height = round(1 / placer.res)
+    assert np.all(locs[:, 1] == placer.rows * height)
+    assert np.all(locs[:, 3] - locs[:, 1] == height)
+    assert np.all(locs[:, 0] >= 0) and np.all(locs[:, 2] <= round(row_width / placer.res))
+    for row in np.unique(placer.rows):
+        cells = locs[placer.rows == row]
+        cells = cells[np.argsort(cells[:, 0])]
+        assert np.all(cells[1:, 0] >= cells[:-1, 2]), 'cells overlap in row {}'.format(row)
+
+
+class TestRowPlacer(AyarLayoutGenerator):
+    """ Places the same shuffled chain of cells in input order and ordered by connectivity """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            num='number of cells',
+            row_width='width of every row'
+        )
+
+    def layout_procedure(self):
+        num, row_width = self.params['num'], self.params['row_width']
+        units = [self.new_template(params={'width': width}, temp_cls=RowUnit) for width in (1, 2)]
+        rng = random.Random(0)
+        masters = [units[rng.randrange(2)] for _ in range(num)]
+        # Cell k of the chain connects to cells k - 1 and k + 1, and the chain is placed in shuffled order
+        perm = list(range(num))
+        rng.shuffle(perm)
+        nets = [['n{}'.format(perm[idx]), 'n{}'.format(perm[idx] + 1)] for idx in range(num)]
+
+        plain = RowPlacer(self, row_width=row_width)
+        insts = plain.place(masters)
+        assert sum(len(inst) if hasattr(inst, 'nx') else 1 for inst in insts) == num
+        check_legal(plain, num, row_width)
+        plain_hpwl = plain.get_wirelength(nets)
+
+        ordered = RowPlacer(self, row_width=row_width, origin=(0, 100))
+        ordered.place(masters, nets=nets)
+        ordered.locations[:, 1::2] -= round(100 / ordered.res)
+        check_legal(ordered, num, row_width)
+        ordered_hpwl = ordered.get_wirelength(nets)
+        assert ordered_hpwl <= plain_hpwl, (ordered_hpwl, plain_hpwl)
+        self.hpwl = (plain_hpwl, ordered_hpwl)
+
+
+if __name__ == '__main__':
+    import os
+    os.environ['ACG_BACKEND'] = 'memory'
+    from ACG.AyarDesignManager import AyarDesignManager
+
+    ADM = AyarDesignManager(None, 'ACG/tests/specs/TestHeadless.yaml')
+    top = ADM.tdb.new_template(params={'num': 200, 'row_width': 20}, temp_cls=TestRowPlacer)
+    print('HPWL in input order {}, ordered by nets {}'.format(*top.hpwl))
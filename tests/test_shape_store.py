@@ -0,0 +1,73 @@
+"""
+test_shape_store.py
+
+Exercises the memory-mapped ShapeStore without a layout generator. Run with ACG_BACKEND=memory so that no BAG project
+is required.
+"""
+import os
+import tempfile
+import numpy as np
+from ACG.Backend import MemoryBackend
+from ACG.Rectangle import Rectangle
+from ACG.ShapeStore import MappedArray, ShapeStore
+
+
+def test_mapped_array_growth():
+    """ Rows appended past the initial capacity are kept, in order """
+    path = os.path.join(tempfile.mkdtemp(prefix='acg_test_'), 'rows.bin')
+    array = MappedArray(path, 3, capacity=4, buffer_size=3)
+    for idx in range(10):
+        array.append((idx, 2 * idx, 3 * idx))
+    array.extend(np.arange(21).reshape(7, 3) + 100)
+    assert len(array) == 17
+    expected = np.concatenate([np.array([(idx, 2 * idx, 3 * idx) for idx in range(10)]),
+                               np.arange(21).reshape(7, 3) + 100])
+    assert np.array_equal(array.view(), expected)
+    assert os.path.getsize(path) >= 17 * 3 * 8
+    assert [len(chunk) for chunk in array.chunks(5)] == [5, 5, 5, 2]
+    array.close()
+
+
+def test_commit():
+    """ Stored rectangles and vias are committed like the shapes they were created from, across chunks """
+    store = ShapeStore(chunk_size=2)
+    store.add_rect(Rectangle([[0, 0], [1, .5]], 'M1'))
+    store.add_rects(('M2', 'drawing'), np.array([[0, 0, 100, 200], [300, 0, 400, 200], [0, 500, 100, 600]]))
+    store.add_rect(Rectangle([[1, 1], [2, 2]], 'M1'))
+    store.add_vias('M1', 'M2', 'y', False, np.array([[0, 0, 50, 50], [100, 0, 150, 50]]))
+    assert len(store.rects) == 5 and len(store.vias) == 2
+    bound = store.get_bound()
+    assert (bound.ll.x, bound.ll.y, bound.ur.x, bound.ur.y) == (0, 0, 2, 2)
+
+    backend = MemoryBackend(None)
+    assert store.commit_rects(backend) == 5
+    assert store.commit_vias(backend) == 2
+    assert sorted(backend.db['rect']) == [
+        (('M1', 'drawing'), 0, 0, 1, .5),
+        (('M1', 'drawing'), 1, 1, 2, 2),
+        (('M2', 'drawing'), 0, 0, .1, .2),
+        (('M2', 'drawing'), 0, .5, .1, .6),
+        (('M2', 'drawing'), .3, 0, .4, .2),
+    ]
+    assert backend.db['via'] == [('M1', 'M2', 0, 0, .05, .05, 'y', False), ('M1', 'M2', .1, 0, .15, .05, 'y', False)]
+    store.close()
+
+
+def test_empty_parquet():
+    """ An empty store still writes a file with the schema of ShapeTable """
+    from ACG.ShapeTable import ShapeTable
+
+    path = os.path.join(tempfile.mkdtemp(prefix='acg_test_'), 'empty.parquet')
+    store = ShapeStore()
+    store.write_parquet(path)
+    assert os.path.isfile(path)
+    table = ShapeTable.read_parquet(path)
+    assert len(table) == 0 and table.res == store.res
+    store.close()
+
+
+if __name__ == '__main__':
+    test_mapped_array_growth()
+    test_commit()
+    test_empty_parquet()
+    print('ShapeStore tests passed')
@@ -0,0 +1,87 @@
+"""
+test_shape_table.py
+
+Round-trips ShapeTable through Arrow and Parquet: Arrow export must share the coordinate buffers of the table, and
+Parquet files with several row groups or no rows must read back unchanged. Only uses the table itself, so no BAG project
+is required.
+"""
+import os
+import tempfile
+import numpy as np
+import pyarrow.parquet as pq
+from ACG.ShapeStore import ShapeStore
+from ACG.ShapeTable import ShapeTable
+
+
+def make_table(num=20, seed=0):
+    """ Random shapes spread over three layer purpose pairs """
+    rng = np.random.default_rng(seed)
+    lpps = [('M1', 'drawing'), ('M2', 'drawing'), ('M1', 'pin')]
+    arrays = {}
+    for idx, lpp in enumerate(lpps):
+        ll = rng.integers(-5000, 5000, size=(num + idx, 2))
+        arrays[lpp] = [np.concatenate([ll, ll + rng.integers(1, 500, size=(num + idx, 2))], axis=1)]
+    return ShapeTable.from_arrays(arrays, res=.001)
+
+
+def same_shapes(table, other):
+    """ True if both tables have the same shapes on every layer purpose pair, in the same order """
+    return (table.res == other.res and sorted(table.layers) == sorted(other.layers) and
+            all(np.array_equal(table[lpp], other[lpp]) for lpp in table.layers))
+
+
+def test_arrow_zero_copy():
+    """ Coordinate columns of the record batch point into the buffers of the table """
+    table = make_table()
+    batch = table.to_arrow()
+    assert batch.num_rows == len(table) == 63
+    for idx, name in enumerate(ShapeTable.columns):
+        column = batch.column(name)
+        assert column.buffers()[1].address == table.coords[idx].ctypes.data, name
+        assert np.shares_memory(column.to_numpy(zero_copy_only=True), table.coords)
+    # A single layer is a slice of the same buffers
+    start = table._slices[('M2', 'drawing')][0]
+    batch = table.to_arrow(('M2', 'drawing'))
+    assert batch.num_rows == 21 and set(batch.column('layer').to_pylist()) == {'M2'}
+    address = batch.column('x0').buffers()[1].address + batch.column('x0').offset * 8
+    assert address == table.coords[0].ctypes.data + start * 8
+    assert np.array_equal(batch.column('y1').to_numpy(), table[('M2', 'drawing')][:, 3])
+
+
+def test_parquet_row_groups(directory):
+    """ Files with several row groups read back unchanged, from a table and from a chunked shape store """
+    table = make_table()
+    path = os.path.join(directory, 'table.parquet')
+    table.write_parquet(path, row_group_size=10)
+    assert pq.ParquetFile(path).num_row_groups == 7
+    assert same_shapes(ShapeTable.read_parquet(path), table)
+
+    store = ShapeStore(chunk_size=8)
+    for lpp, shapes in table.items():
+        store.add_rects(lpp, shapes)
+    path = os.path.join(directory, 'store.parquet')
+    store.write_parquet(path)
+    assert pq.ParquetFile(path).num_row_groups > 1
+    assert same_shapes(ShapeTable.read_parquet(path), table)
+    store.close()
+
+
+def test_empty(directory):
+    """ An empty table exports an empty batch and round-trips through Parquet """
+    table = ShapeTable.empty(res=.005)
+    assert len(table) == 0 and table.layers == [] and table.area() == 0
+    assert table[('M1', 'drawing')].shape == (0, 4)
+    batch = table.to_arrow()
+    assert batch.num_rows == 0 and batch.schema.names == list(ShapeTable.columns) + ['layer', 'purpose']
+    path = os.path.join(directory, 'empty.parquet')
+    table.write_parquet(path)
+    other = ShapeTable.read_parquet(path)
+    assert len(other) == 0 and other.layers == [] and other.res == .005
+
+
+if __name__ == '__main__':
+    directory = tempfile.mkdtemp(prefix='acg_test_')
+    test_arrow_zero_copy()
+    test_parquet_row_groups(directory)
+    test_empty(directory)
+    print('ShapeTable tests passed')
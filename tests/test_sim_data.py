@@ -0,0 +1,90 @@
+"""
+test_sim_data.py
+
+Writes a small simulation result file and reads it back lazily and eagerly, both directly and through
+AyarDesignManager.load_sim_data. Run with ACG_BACKEND=memory so that no BAG project is required.
+"""
+import os
+import tempfile
+import h5py
+import numpy as np
+from ACG.SimData import LazySimResults, SimFileCache, load_sim_file
+
+contiguous = np.arange(24, dtype=np.float64).reshape(2, 3, 4)
+chunked = np.arange(100, dtype=np.int32).reshape(10, 10)
+
+
+def write_results(path):
+    """ Writes a contiguous dataset with sweep parameters, a compressed chunked dataset and a scalar """
+    with h5py.File(path, 'w') as f:
+        dset = f.create_dataset('vout', data=contiguous)
+        dset.attrs['sweep_params'] = [b'corner', b'temp', b'freq']
+        dset = f.create_dataset('ibias', data=chunked, chunks=(3, 3), compression='gzip')
+        dset.attrs['sweep_params'] = [b'vin', b'time']
+        f.create_dataset('gain', data=3.5)
+
+
+def test_lazy(path):
+    """ Contiguous datasets are memory mapped, chunked ones are read through h5py, and slices match numpy """
+    results = LazySimResults(path)
+    assert sorted(results) == ['gain', 'ibias', 'sweep_params', 'vout']
+    assert results['sweep_params'] == {'vout': ['corner', 'temp', 'freq'], 'ibias': ['vin', 'time']}
+
+    vout = results['vout']
+    assert vout.shape == (2, 3, 4) and vout.dtype == np.float64 and len(vout) == 2
+    assert isinstance(vout.data, np.memmap)
+    assert np.array_equal(vout[1, :, 2:], contiguous[1, :, 2:])
+    assert np.array_equal(np.asarray(vout), contiguous)
+
+    ibias = results['ibias']
+    assert not isinstance(ibias.data, np.memmap)
+    assert np.array_equal(ibias[2:5, 7], chunked[2:5, 7])
+    assert np.array_equal(results.load('ibias'), chunked)
+
+    gain = results['gain']
+    assert gain.shape == () and gain.ndim == 0 and float(gain[()]) == 3.5
+
+
+def test_eager(path):
+    """ Eager loading returns independent arrays with the layout of bag.data.load_sim_file """
+    data = load_sim_file(path)
+    assert sorted(data) == ['gain', 'ibias', 'sweep_params', 'vout']
+    assert data['sweep_params']['ibias'] == ['vin', 'time']
+    assert type(data['vout']) is np.ndarray and np.array_equal(data['vout'], contiguous)
+    assert np.array_equal(data['ibias'], chunked) and data['gain'] == 3.5
+    data['vout'][0, 0, 0] = -1
+    assert LazySimResults(path)['vout'][0, 0, 0] == 0
+
+
+def test_file_cache(paths):
+    """ The least recently used file is closed once more than max_open files are open """
+    cache = SimFileCache(max_open=2)
+    for path in paths:
+        cache.get(path)
+    cache.get(paths[1])
+    assert len(cache) == 2 and list(cache._files) == [paths[2], paths[1]]
+    cache.close()
+    assert len(cache) == 0
+
+
+if __name__ == '__main__':
+    os.environ['ACG_BACKEND'] = 'memory'
+    from ACG.AyarDesignManager import AyarDesignManager
+
+    data_dir = tempfile.mkdtemp(prefix='acg_test_')
+    paths = [os.path.join(data_dir, 'tb_{}.hdf5'.format(idx)) for idx in range(3)]
+    for path in paths:
+        write_results(path)
+    test_lazy(paths[0])
+    test_eager(paths[0])
+    test_file_cache(paths)
+
+    # load_sim_data reads the results of every TB without BAG, lazily or eagerly
+    ADM = AyarDesignManager(None, 'ACG/tests/specs/TestHeadless.yaml')
+    ADM.specs['tb_params'] = {'tb_{}'.format(idx): {'data_dir': data_dir} for idx in range(2)}
+    lazy = ADM.load_sim_data(lazy=True)
+    eager = ADM.load_sim_data()
+    assert sorted(lazy) == sorted(eager) == ['tb_0', 'tb_1']
+    assert isinstance(lazy['tb_1'], LazySimResults)
+    assert np.array_equal(eager['tb_1']['vout'], np.asarray(lazy['tb_1']['vout']))
+    print('SimData tests passed')
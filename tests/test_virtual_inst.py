@@ -0,0 +1,180 @@
+"""
+test_virtual_inst.py
+
+Checks that the lazily transformed locations of VirtualInst are recomputed after the instance moves, and that locations
+read directly or through hierarchical paths match the master locations transformed by hand. Run with ACG_BACKEND=memory
+so that no BAG project is required.
+"""
+from ACG.AyarLayoutGenerator import AyarLayoutGenerator
+
+orient_sign = {'R0': (1, 1), 'MX': (1, -1), 'MY': (-1, 1), 'R180': (-1, -1)}
+
+
+class InstLeaf(AyarLayoutGenerator):
+    """ Boundary, a pin and a list of rectangles """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict()
+
+    def layout_procedure(self):
+        self.loc['bnd'] = self.add_rect(layer='M1', xy=[[0, 0], [2, 1]], virtual=True)
+        self.loc['pin'] = self.add_rect(layer='M1', xy=[[.1, .2], [.4, .3]])
+        self.loc['fingers'] = [self.add_rect(layer='M2', xy=[[.5 * idx, 0], [.5 * idx + .1, 1]]) for idx in range(3)]
+
+
+class InstTop(AyarLayoutGenerator):
+    """ Two leaves """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict()
+
+    def layout_procedure(self):
+        leaf = self.new_template(params={}, temp_cls=InstLeaf)
+        self.loc['a'] = self.add_instance(leaf, inst_name='a')
+        self.loc['b'] = self.add_instance(leaf, inst_name='b', loc=(10, 0))
+
+
+class InstMid(AyarLayoutGenerator):
+    """ Row of leaves in different orientations """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict()
+
+    def layout_procedure(self):
+        leaf = self.new_template(params={}, temp_cls=InstLeaf)
+        self.loc['row'] = [self.add_instance(leaf, loc=loc, orient=orient) for loc, orient in row]
+
+
+class InstRoot(AyarLayoutGenerator):
+    """ Places a mirrored InstMid inside a mirrored inner InstRoot """
+
+    def __init__(self, temp_db, lib_name, params, used_names, **kwargs):
+        AyarLayoutGenerator.__init__(self, temp_db, lib_name, params, used_names, **kwargs)
+
+    @classmethod
+    def get_params_info(cls):
+        return dict(
+            inner='if True, place InstMid, otherwise place an inner InstRoot that contains it'
+        )
+
+    def layout_procedure(self):
+        if self.params['inner']:
+            mid = self.new_template(params={}, temp_cls=InstMid)
+            self.loc['m'] = self.add_instance(mid, inst_name='m', loc=mid_loc, orient=mid_orient)
+        else:
+            inner = self.new_template(params={'inner': True}, temp_cls=InstRoot)
+            self.loc['t'] = self.add_instance(inner, inst_name='t', loc=top_loc, orient=top_orient)
+
+
+# Transformations along the path 't/m/row/<idx>' of InstRoot
+row = [((0, 0), 'R0'), ((3, 1), 'MX'), ((7, 0), 'MY'), ((9, 2), 'R180')]
+mid_loc, mid_orient = (20, 5), 'MY'
+top_loc, top_orient = (-4, 3), 'MX'
+
+
+def transform(xy, origin, orient):
+    """ Transforms [[x0, y0], [x1, y1]] by an instance origin and orientation, returning sorted corners """
+    sx, sy = orient_sign[orient]
+    (x0, y0), (x1, y1) = xy
+    xs, ys = (origin[0] + sx * x0, origin[0] + sx * x1), (origin[1] + sy * y0, origin[1] + sy * y1)
+    return [round(min(xs), 3), round(min(ys), 3), round(max(xs), 3), round(max(ys), 3)]
+
+
+def compose(xy, transforms):
+    """ Applies (origin, orient) transformations from the innermost instance outwards """
+    for origin, orient in transforms:
+        x0, y0, x1, y1 = transform(xy, origin, orient)
+        xy = [[x0, y0], [x1, y1]]
+    return [xy[0][0], xy[0][1], xy[1][0], xy[1][1]]
+
+
+def coords(rect):
+    return [round(rect.ll.x, 3), round(rect.ll.y, 3), round(rect.ur.x, 3), round(rect.ur.y, 3)]
+
+
+def check_locations(inst, origin, orient):
+    """ Every location of the instance matches the master location transformed by hand """
+    master = inst.master.loc
+    for key in ('bnd', 'pin'):
+        expected = transform([[master[key].ll.x, master[key].ll.y], [master[key].ur.x, master[key].ur.y]], origin,
+                             orient)
+        assert coords(inst.loc[key]) == expected, (key, origin, orient, coords(inst.loc[key]), expected)
+    for finger, master_finger in zip(inst.loc['fingers'], master['fingers']):
+        expected = transform([[master_finger.ll.x, master_finger.ll.y], [master_finger.ur.x, master_finger.ur.y]],
+                             origin, orient)
+        assert coords(finger) == expected
+
+
+if __name__ == '__main__':
+    import os
+    os.environ['ACG_BACKEND'] = 'memory'
+    from ACG.AyarDesignManager import AyarDesignManager
+
+    ADM = AyarDesignManager(None, 'ACG/tests/specs/TestHeadless.yaml')
+    top = ADM.tdb.new_template(params={}, temp_cls=InstTop)
+    inst = top.loc['b']
+    check_locations(inst, (10, 0), 'R0')
+
+    # Locations are cached until the instance moves
+    pin = inst.loc['pin']
+    assert inst.loc['pin'] is pin and inst['pin'] is pin
+    inst.loc['extra'] = pin
+    assert 'extra' in inst.loc and sorted(inst.loc) == ['bnd', 'extra', 'fingers', 'pin']
+
+    inst.move(origin=(1, 2), orient='MY')
+    assert inst.loc['pin'] is not pin and 'extra' not in inst.loc
+    check_locations(inst, (1, 2), 'MY')
+    inst.move(orient='R180')
+    check_locations(inst, (1, 2), 'R180')
+
+    inst.shift_origin(origin=(.5, -1))
+    check_locations(inst, (1.5, 1), 'R180')
+    inst.shift_origin(origin=(0, 1), orient='MX')
+    check_locations(inst, (1.5, 2), 'MX')
+
+    # Aligning the lower left corner of the boundary to the upper right corner of the other leaf
+    ref = top.loc['a']
+    fingers = inst.loc['fingers']
+    inst.align('ll', ref_rect=ref.loc['bnd'], ref_handle='ur')
+    assert inst.loc['fingers'] is not fingers
+    assert coords(inst.loc['bnd'])[:2] == [2, 1]
+    # MX maps the boundary [0, 2] x [0, 1] to [0, 2] x [-1, 0], so the origin sits at the top edge of the boundary
+    check_locations(inst, (2, 2), 'MX')
+    # Only x moves: the boundary center lands at 1.25, 1 to the right of the pin center, so the origin is at .25
+    inst.align('c', ref_rect=ref.loc['pin'], ref_handle='c', align_opt=(True, False), offset=(1, 0))
+    check_locations(inst, (.25, 2), 'MX')
+
+    # Hierarchical paths through mirrored instances compose the transformations of every instance along the path
+    root = ADM.tdb.new_template(params={'inner': False}, temp_cls=InstRoot)
+    leaf = root.loc['t'].master.loc['m'].master.loc['row'][0].master.loc
+    for idx, (loc, orient) in enumerate(row):
+        transforms = [(loc, orient), (mid_loc, mid_orient), (top_loc, top_orient)]
+        pin = root.loc['t']['m/row/{}/pin'.format(idx)]
+        expected = compose([[leaf['pin'].ll.x, leaf['pin'].ll.y], [leaf['pin'].ur.x, leaf['pin'].ur.y]], transforms)
+        assert coords(pin) == expected, (idx, coords(pin), expected)
+        # The same location read one level at a time
+        assert coords(root.loc['t']['m']['row'][idx]['pin']) == expected
+        finger = leaf['fingers'][2]
+        assert coords(root.loc['t']['m/row/{}/fingers/2'.format(idx)]) == compose(
+            [[finger.ll.x, finger.ll.y], [finger.ur.x, finger.ur.y]], transforms)
+
+    # Paths cached on the outer instance are recomputed when it moves
+    path = 'm/row/1/pin'
+    before = root.loc['t'][path]
+    root.loc['t'].move(origin=(0, 0), orient='R0')
+    expected = compose([[leaf['pin'].ll.x, leaf['pin'].ll.y], [leaf['pin'].ur.x, leaf['pin'].ur.y]],
+                       [row[1], (mid_loc, mid_orient)])
+    assert root.loc['t'][path] is not before and coords(root.loc['t'][path]) == expected
+    print('VirtualInst location tests passed')